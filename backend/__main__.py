@@ -0,0 +1,7 @@
+# backend/__main__.py
+# Entry point for `python -m backend ...` (the velocity2 CLI).
+import sys
+
+from backend.cli import main
+
+sys.exit(main())
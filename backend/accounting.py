@@ -0,0 +1,298 @@
+# backend/accounting.py
+import contextvars
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend.config import process_singleton
+from backend.profiling import get_profiler, job_thread
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTING_DIR = Path(os.getenv("ACCOUNTING_DIR", os.path.join(os.getenv("MEDIA_ROOT", "media"), "accounting")))
+# Finished ledgers kept in memory for the API; the JSONL files keep everything.
+ACCOUNTING_MAX_JOBS = int(os.getenv("ACCOUNTING_MAX_JOBS", "10000"))
+# Price per generated second by provider, e.g. {"luma": 0.05, "runway": 0.1}; unknown = 0.
+PROVIDER_PRICES: Dict[str, float] = json.loads(os.getenv("PROVIDER_PRICES", "{}") or "{}")
+
+
+class Ledger:
+    """
+    Usage of one job: LLM tokens, provider seconds and polls, wall time per
+    stage. Shared by every thread working on the job (it travels in a
+    contextvar, like the job deadline), so all updates take a lock.
+    """
+
+    def __init__(self, kind: str, job_id: Optional[str] = None):
+        self.ledger_id = job_id or uuid.uuid4().hex
+        self.job_id = job_id
+        self.kind = kind
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.status = "running"
+        self.llm: Dict[str, Dict[str, float]] = {}
+        self.providers: Dict[str, Dict[str, float]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # Sampling profile summary, when the job was profiled (backend.profiling)
+        self.profile: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _add(bucket: Dict[str, Dict[str, float]], name: str, **values: float) -> None:
+        row = bucket.setdefault(name, {})
+        for k, v in values.items():
+            row[k] = row.get(k, 0) + v
+
+    def add_llm(self, backend: str, stats: Dict[str, Any]) -> None:
+        with self._lock:
+            self._add(
+                self.llm,
+                backend,
+                calls=1,
+                prompt_tokens=stats.get("prompt_eval_count", 0),
+                eval_tokens=stats.get("eval_count", 0),
+                prompt_eval_ms=stats.get("prompt_eval_ms", 0.0),
+                eval_ms=stats.get("eval_ms", 0.0),
+                load_ms=stats.get("load_ms", 0.0),
+                wall_ms=stats.get("wall_ms", 0.0),
+            )
+
+    def add_clip(self, provider: str, requested_s: float, billed_s: float, wall_s: float, reused: bool = False) -> None:
+        with self._lock:
+            self._add(
+                self.providers,
+                provider,
+                clips=0 if reused else 1,
+                reused_clips=1 if reused else 0,
+                requested_s=requested_s,
+                billed_s=billed_s,
+                # Footage paid for beyond what the storyboard asked (5/10s clamping)
+                excess_s=max(0.0, billed_s - requested_s),
+                cost=billed_s * PROVIDER_PRICES.get(provider, 0.0),
+                wall_s=wall_s,
+            )
+
+    def add_poll(self, provider: str) -> None:
+        with self._lock:
+            self._add(self.providers, provider, polls=1)
+
+    def add_stage(self, stage: str, wall_s: float) -> None:
+        with self._lock:
+            self._add(self.stages, stage, calls=1, wall_s=wall_s)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            record = {
+                "ledger_id": self.ledger_id,
+                "job_id": self.job_id,
+                "kind": self.kind,
+                "status": self.status,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "wall_s": round((self.finished_at or time.time()) - self.started_at, 3),
+                "llm": {k: dict(v) for k, v in self.llm.items()},
+                "providers": {k: dict(v) for k, v in self.providers.items()},
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+            }
+            if self.profile is not None:
+                record["profile"] = self.profile
+            return record
+
+
+_current: "contextvars.ContextVar[Optional[Ledger]]" = contextvars.ContextVar("velocity2_ledger", default=None)
+
+
+def current_ledger() -> Optional[Ledger]:
+    return _current.get()
+
+
+class AccountingStore:
+    """Finished ledgers: recent ones in memory, all of them appended to daily JSONL files."""
+
+    def __init__(self, root: Path = ACCOUNTING_DIR, max_jobs: int = ACCOUNTING_MAX_JOBS):
+        self.root = Path(root)
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._running: Dict[str, Ledger] = {}
+
+    def started(self, ledger: Ledger) -> None:
+        with self._lock:
+            self._running[ledger.ledger_id] = ledger
+
+    def finished(self, ledger: Ledger) -> None:
+        record = ledger.to_dict()
+        with self._lock:
+            self._running.pop(ledger.ledger_id, None)
+            self._recent[record["ledger_id"]] = record
+            while len(self._recent) > self.max_jobs:
+                self._recent.popitem(last=False)
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                day = time.strftime("%Y%m%d", time.gmtime(record["finished_at"]))
+                with (self.root / f"ledger-{day}.jsonl").open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write accounting record: {e}")
+
+    def running(self, ledger_id: str) -> Optional[Ledger]:
+        with self._lock:
+            return self._running.get(ledger_id)
+
+    def get(self, ledger_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            running = self._running.get(ledger_id)
+            if running is None:
+                return self._recent.get(ledger_id)
+        return running.to_dict()
+
+    def recent(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r for r in self._recent.values() if (r["finished_at"] or 0) >= since]
+
+    def summary(self, since: float = 0.0) -> Dict[str, Any]:
+        """Totals over recent finished jobs, by LLM backend, provider and stage."""
+        records = self.recent(since)
+        totals: Dict[str, Any] = {"jobs": len(records), "llm": {}, "providers": {}, "stages": {}}
+        for record in records:
+            for section in ("llm", "providers", "stages"):
+                for name, values in record[section].items():
+                    Ledger._add(totals[section], name, **values)
+        span = max((r["finished_at"] for r in records), default=0) - min((r["started_at"] for r in records), default=0)
+        totals["jobs_per_hour"] = round(len(records) / span * 3600, 2) if span > 0 else None
+        return totals
+
+    def export(self, fmt: str = "jsonl", since: float = 0.0) -> str:
+        """
+        Every ledger on disk since `since`. "jsonl" is one job per line;
+        "csv" is one row per (job, section, name) for spreadsheets.
+        """
+        records: List[Dict[str, Any]] = []
+        for path in sorted(self.root.glob("ledger-*.jsonl")):
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (record.get("finished_at") or 0) >= since:
+                        records.append(record)
+        if fmt == "jsonl":
+            return "".join(json.dumps(r) + "\n" for r in records)
+
+        out = io.StringIO()
+        fields = ["ledger_id", "job_id", "kind", "status", "finished_at", "wall_s", "section", "name", "metric", "value"]
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        for record in records:
+            base = {k: record.get(k) for k in fields[:6]}
+            for section in ("llm", "providers", "stages"):
+                for name, values in record.get(section, {}).items():
+                    for metric, value in values.items():
+                        writer.writerow({**base, "section": section, "name": name, "metric": metric, "value": value})
+        return out.getvalue()
+
+
+@process_singleton
+def get_accounting() -> AccountingStore:
+    return AccountingStore()
+
+
+def open_ledger(kind: str) -> Ledger:
+    """A new ledger, visible to the API while it runs. Close it with close_ledger."""
+    ledger = Ledger(kind)
+    get_accounting().started(ledger)
+    get_profiler().job_started(ledger)
+    return ledger
+
+
+def close_ledger(ledger: Ledger, ok: bool) -> None:
+    ledger.status = "ok" if ok else "error"
+    ledger.finished_at = time.time()
+    ledger.profile = get_profiler().job_finished(ledger)
+    get_accounting().finished(ledger)
+
+
+@contextmanager
+def ledger_scope(ledger: Optional[Ledger]) -> Iterator[None]:
+    """Make `ledger` current in this block (e.g. in a pool thread working on its job)."""
+    token = _current.set(ledger)
+    try:
+        with job_thread(ledger):
+            yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def job_ledger(kind: str) -> Iterator[Ledger]:
+    """
+    Ledger for the job running in this block. Nested calls (e.g. the
+    pipeline inside an API handler that already opened one) reuse the
+    outer ledger; the outermost block records it when it exits.
+    """
+    ledger = _current.get()
+    if ledger is not None:
+        yield ledger
+        return
+    ledger = open_ledger(kind)
+    ok = False
+    try:
+        with ledger_scope(ledger):
+            yield ledger
+        ok = True
+    finally:
+        close_ledger(ledger, ok)
+
+
+def set_job_id(job_id: str) -> None:
+    """Tie the current ledger to the media job id once the pipeline allocates one."""
+    ledger = _current.get()
+    if ledger is not None and ledger.job_id is None:
+        store = get_accounting()
+        with store._lock:
+            store._running.pop(ledger.ledger_id, None)
+            ledger.job_id = ledger.ledger_id = job_id
+            store._running[job_id] = ledger
+        get_profiler().job_started(ledger)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ledger = _current.get()
+        if ledger is not None:
+            ledger.add_stage(stage, time.perf_counter() - start)
+
+
+def record_llm(backend: Optional[str], stats: Dict[str, Any]) -> None:
+    ledger = _current.get()
+    if ledger is not None:
+        ledger.add_llm(backend or "mock", stats)
+
+
+def record_clip(provider: str, scene: Dict[str, Any], wall_s: float, reused: bool = False) -> None:
+    ledger = _current.get()
+    if ledger is None:
+        return
+    requested = float(scene.get("requested_duration") or scene.get("duration") or 0)
+    billed = 0.0 if reused else float(scene.get("duration") or 0)
+    ledger.add_clip(provider, requested, billed, wall_s, reused=reused)
+
+
+def record_poll(provider: str) -> None:
+    ledger = _current.get()
+    if ledger is not None:
+        ledger.add_poll(provider)
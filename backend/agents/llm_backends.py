@@ -0,0 +1,177 @@
+# backend/agents/llm_backends.py
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures before a backend's breaker opens, and how long it stays open.
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+HEALTH_INTERVAL_S = float(os.getenv("LLM_HEALTH_INTERVAL_S", "15"))
+
+KIND_OLLAMA = "ollama"
+KIND_OPENAI = "openai"  # any OpenAI-compatible /chat/completions endpoint (e.g. xAI Grok)
+
+
+class Backend:
+    """
+    One model server plus its routing state: in-flight request count and a
+    circuit breaker (closed -> open after N failures -> half-open trial after
+    the cooldown -> closed on success).
+    """
+
+    def __init__(self, kind: str, url: str, model: str, api_key: str = "", name: str = ""):
+        self.kind = kind
+        self.url = url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.name = name or f"{kind}@{self.url}"
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.half_open_trial = False
+
+    @property
+    def chat_url(self) -> str:
+        if self.kind == KIND_OPENAI:
+            return self.url if self.url.endswith("/chat/completions") else f"{self.url}/chat/completions"
+        return self.url if self.url.endswith("/api/chat") else f"{self.url}/api/chat"
+
+    @property
+    def health_url(self) -> str:
+        if self.kind == KIND_OPENAI:
+            return self.chat_url.rsplit("/chat/completions", 1)[0] + "/models"
+        return self.chat_url.rsplit("/api/chat", 1)[0] + "/api/tags"
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def available(self, now: float) -> bool:
+        if self.open_until <= 0:
+            return True
+        # Breaker open: allow a single trial request once the cooldown has passed
+        return now >= self.open_until and not self.half_open_trial
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "model": self.model,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "breaker": "open" if self.open_until > time.time() else ("half-open" if self.open_until else "closed"),
+        }
+
+
+class BackendPool:
+    """Least-outstanding-requests routing over a set of backends."""
+
+    def __init__(self, backends: List[Backend]):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = backends
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+
+    def pick(self, exclude: Optional[List[Backend]] = None) -> Optional[Backend]:
+        """Reserve the available backend with the fewest in-flight requests, or None."""
+        now = time.time()
+        with self._lock:
+            candidates = [b for b in self.backends if b.available(now) and b not in (exclude or [])]
+            if not candidates:
+                return None
+            low = min(b.outstanding for b in candidates)
+            backend = random.choice([b for b in candidates if b.outstanding == low])
+            if backend.open_until > 0:
+                backend.half_open_trial = True
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend: Backend, ok: Optional[bool]) -> None:
+        """ok=None releases without touching the breaker (the failure wasn't the backend's)."""
+        with self._lock:
+            backend.outstanding -= 1
+            if ok is not None:
+                self._record(backend, ok)
+
+    def _record(self, backend: Backend, ok: bool) -> None:
+        backend.half_open_trial = False
+        if ok:
+            backend.failures = 0
+            backend.open_until = 0.0
+            return
+        backend.failures += 1
+        if backend.failures >= BREAKER_FAILURES or backend.open_until > 0:
+            if backend.open_until == 0.0:
+                logger.warning(f"LLM backend {backend.name} circuit opened after {backend.failures} failures")
+            backend.open_until = time.time() + BREAKER_COOLDOWN_S
+
+    # ---- health checks ------------------------------------------------
+
+    def check_health(self) -> None:
+        import requests
+
+        for backend in self.backends:
+            try:
+                r = requests.get(backend.health_url, headers=backend.headers(), timeout=3)
+                ok = r.status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            with self._lock:
+                # Only probes that change the picture touch the breaker
+                if ok and backend.open_until > 0:
+                    self._record(backend, ok=True)
+                elif not ok:
+                    self._record(backend, ok=False)
+
+    def start_health_checks(self, interval_s: float = HEALTH_INTERVAL_S) -> None:
+        if interval_s <= 0 or (self._health_thread and self._health_thread.is_alive()):
+            return
+
+        def _loop() -> None:
+            while True:
+                time.sleep(interval_s)
+                try:
+                    self.check_health()
+                except Exception as e:
+                    logger.error(f"LLM health check failed: {e}")
+
+        self._health_thread = threading.Thread(target=_loop, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [b.snapshot() for b in self.backends]
+
+
+def backends_from_env(default_url: str, default_model: str) -> List[Backend]:
+    """
+    LLM_BACKENDS is a JSON list, e.g.
+      [{"kind": "ollama", "url": "http://gpu1:11434", "model": "phi3"},
+       {"kind": "openai", "url": "https://api.x.ai/v1", "model": "grok-2-latest",
+        "api_key_env": "GROK_API_KEY"}]
+    Unset means a single Ollama backend at default_url.
+    """
+    raw = os.getenv("LLM_BACKENDS", "").strip()
+    if not raw:
+        return [Backend(KIND_OLLAMA, default_url, default_model)]
+    backends = []
+    for spec in json.loads(raw):
+        backends.append(
+            Backend(
+                kind=spec.get("kind", KIND_OLLAMA),
+                url=spec["url"],
+                model=spec.get("model", default_model),
+                api_key=os.getenv(spec["api_key_env"], "") if spec.get("api_key_env") else spec.get("api_key", ""),
+                name=spec.get("name", ""),
+            )
+        )
+    return backends
@@ -1,7 +1,14 @@
-import requests
 import logging
 import json
-from typing import List, Dict, Any
+import os
+import time
+from typing import List, Dict, Any, Optional
+
+from backend.accounting import record_llm
+from backend.agents.llm_backends import KIND_OPENAI, Backend, BackendPool, backends_from_env
+from backend.config import process_singleton
+from backend.deadline import DeadlineExceeded, stage_timeout, time_left
+from backend.scheduler import get_scheduler
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -9,78 +16,254 @@ logger = logging.getLogger(__name__)
 OLLAMA_URL = "http://localhost:11434/api/chat"
 MODEL_NAME = "phi3"  # or "llama3.1"
 
-def chat(messages: List[Dict[str, str]], temperature: float = 0.3) -> str:
+# Keep the model (and its prompt cache) resident between planner steps, and
+# keep num_ctx fixed: a different num_ctx forces Ollama to reload the runner,
+# which throws away any cached prompt prefix.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# Per-call cap; a job deadline (backend.deadline) shortens it further.
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+# Client errors that mean our request itself is bad (malformed payload,
+# invalid options): no backend will accept it, so don't fail over. Any other
+# 4xx can be specific to one backend (its key: 401/403, its models: 404, or
+# busy: 408/429) and fails over like a 5xx.
+_REQUEST_4XX = {400, 422}
+
+
+def chat(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.3,
+    keep_alive: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
     """
     Thin wrapper around Ollama chat API.
     messages: [{"role": "system"/"user"/"assistant", "content": "..."}]
     
     Falls back to a mock response if Ollama is unreachable.
     """
-    logger.info(f"Sending request to Ollama ({MODEL_NAME}): {messages[-1]['content'][:50]}...")
-    
+    return chat_with_stats(messages, temperature, keep_alive, options)["content"]
+
+
+def _stats_from_response(data: Dict[str, Any], wall_ms: float) -> Dict[str, Any]:
+    """Ollama reports durations in nanoseconds; convert to ms."""
+    return {
+        "prompt_eval_count": data.get("prompt_eval_count", 0),
+        "prompt_eval_ms": data.get("prompt_eval_duration", 0) / 1e6,
+        "eval_count": data.get("eval_count", 0),
+        "eval_ms": data.get("eval_duration", 0) / 1e6,
+        "load_ms": data.get("load_duration", 0) / 1e6,
+        "wall_ms": round(wall_ms, 1),
+    }
+
+
+def chat_with_stats(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.3,
+    keep_alive: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Like chat(), but returns {"content", "prompt_eval_count", "prompt_eval_ms",
+    "eval_count", "eval_ms", "load_ms", "wall_ms", "mock", "backend"} so callers
+    can see how much of a step was spent processing the prompt.
+
+    Routes to the least-loaded available backend in the pool and fails over to
+    the next one on connection/HTTP errors (a 400/422 is re-raised, as is a 4xx
+    every backend returned). Only when every backend has failed (or has an
+    open circuit breaker) does it return the mock response.
+    Raises DeadlineExceeded if the current job deadline runs out.
+
+    Calls go through the "llm" stage scheduler: interactive work ahead of
+    batch planning, tenants sharing fairly, and AdmissionRejected when the
+    queue wait would outlast the deadline.
+    """
+    with get_scheduler("llm").slot():
+        return _chat_with_stats(messages, temperature, keep_alive, options)
+
+
+def _chat_with_stats(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    keep_alive: Optional[str],
+    options: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    import requests  # deferred to keep import of the planner cheap
+
+    pool = get_pool()
+    tried: List[Backend] = []
+    client_errors: List[Any] = []
+    while True:
+        backend = pool.pick(exclude=tried)
+        if backend is None:
+            break
+        tried.append(backend)
+        try:
+            timeout = stage_timeout("llm", LLM_TIMEOUT_S)
+        except DeadlineExceeded:
+            pool.release(backend, ok=None)
+            raise
+        logger.info(f"Sending request to {backend.name} ({backend.model}): {messages[-1]['content'][:50]}...")
+        try:
+            start = time.perf_counter()
+            if backend.kind == KIND_OPENAI:
+                data = _post_openai(backend, messages, temperature, options, timeout)
+            else:
+                data = _post_ollama(backend, messages, temperature, keep_alive, options, timeout)
+            stats = _stats_from_response(data, (time.perf_counter() - start) * 1000)
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 500
+            if status in _REQUEST_4XX:
+                # Our payload is wrong: another backend won't fix it
+                pool.release(backend, ok=None)
+                raise
+            if 400 <= status < 500:
+                client_errors.append(e)
+            pool.release(backend, ok=False)
+            logger.warning(f"LLM backend {backend.name} failed: {e}")
+            continue
+        except requests.exceptions.RequestException as e:
+            if time_left() <= 0:
+                # Our budget ran out, not necessarily the backend's fault
+                pool.release(backend, ok=None)
+                raise DeadlineExceeded("llm") from e
+            pool.release(backend, ok=False)
+            logger.warning(f"LLM backend {backend.name} failed: {e}")
+            continue
+        except Exception as e:
+            pool.release(backend, ok=False)
+            logger.error(f"Unexpected error in LLM client: {e}")
+            raise
+        pool.release(backend, ok=True)
+        record_llm(backend.name, stats)
+        logger.info(
+            f"Received response from {backend.name} (prompt {stats['prompt_eval_count']} tok / "
+            f"{stats['prompt_eval_ms']:.0f} ms, eval {stats['eval_count']} tok / {stats['eval_ms']:.0f} ms)."
+        )
+        return {"content": data["content"], "mock": False, "backend": backend.name, **stats}
+
+    statuses = {e.response.status_code for e in client_errors}
+    if tried and len(client_errors) == len(tried) and len(statuses) == 1:
+        # Every backend refused it the same way: the request, not the pool, is at fault
+        raise client_errors[-1]
+
+    logger.warning("No LLM backend available. Returning MOCK response.")
+    stats = _stats_from_response({}, 0.0)
+    record_llm(None, stats)
+    return {"content": _mock_content(messages), "mock": True, "backend": None, **stats}
+
+
+def _post_ollama(
+    backend: Backend,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    keep_alive: Optional[str],
+    options: Optional[Dict[str, Any]],
+    timeout: float,
+) -> Dict[str, Any]:
+    import requests
+
     payload: Dict[str, Any] = {
-        "model": MODEL_NAME,
+        "model": backend.model,
         "messages": messages,
         "options": {
             "temperature": temperature,
+            "num_ctx": OLLAMA_NUM_CTX,
+            **(options or {}),
         },
+        "keep_alive": keep_alive or OLLAMA_KEEP_ALIVE,
         "stream": False,
     }
-    
-    try:
-        resp = requests.post(OLLAMA_URL, json=payload, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        content = data["message"]["content"]
-        logger.info("Received response from Ollama.")
-        return content
-    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-        logger.warning(f"Failed to connect to Ollama: {e}. Returning MOCK response.")
-        
-        # Determine if this is a storyboard request based on system prompt
-        is_storyboard = any("storyboard" in m.get("content", "").lower() for m in messages if m.get("role") == "system")
-        
-        if is_storyboard:
-            return json.dumps({
-                "shots": [
-                    {
-                        "type": "Wide shot",
-                        "duration": 5,
-                        "camera": "Static",
-                        "context": "A bright, clean studio setting",
-                        "focus": "The product in the center",
-                        "caption": "Introducing the new standard."
-                    },
-                    {
-                        "type": "Close-up",
-                        "duration": 5,
-                        "camera": "Slow zoom in",
-                        "context": "Detailed view of the product texture",
-                        "focus": "Product features",
-                        "caption": "Unmatched quality."
-                    },
-                    {
-                        "type": "Medium shot",
-                        "duration": 5,
-                        "camera": "Pan left",
-                        "context": "Lifestyle setting with soft lighting",
-                        "focus": "Product in use",
-                        "caption": "Designed for you."
-                    },
-                    {
-                        "type": "Wide shot",
-                        "duration": 5,
-                        "camera": "Static",
-                        "context": "Product with logo overlay",
-                        "focus": "Brand identity",
-                        "overlay": "Shop Now"
-                    }
-                ]
-            })
-        else:
-            return "This is a mock response from Velocity2 because Ollama is offline."
-            
-    except Exception as e:
-        logger.error(f"Unexpected error in LLM client: {e}")
-        raise
+    resp = requests.post(backend.chat_url, json=payload, headers=backend.headers(), timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    data["content"] = data["message"]["content"]
+    return data
+
+
+def _post_openai(
+    backend: Backend,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    options: Optional[Dict[str, Any]],
+    timeout: float,
+) -> Dict[str, Any]:
+    """OpenAI-compatible chat completion; usage is mapped onto Ollama's stat names."""
+    import requests
+
+    payload: Dict[str, Any] = {
+        "model": backend.model,
+        "messages": messages,
+        "temperature": temperature,
+    }
+    # Ollama-only options (num_ctx, keep_alive) have no equivalent here
+    if options and "num_predict" in options:
+        payload["max_tokens"] = options["num_predict"]
+    resp = requests.post(backend.chat_url, json=payload, headers=backend.headers(), timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    usage = data.get("usage") or {}
+    return {
+        "content": data["choices"][0]["message"]["content"],
+        "prompt_eval_count": usage.get("prompt_tokens", 0),
+        "eval_count": usage.get("completion_tokens", 0),
+    }
+
+
+@process_singleton
+def get_pool() -> BackendPool:
+    """Backend pool from LLM_BACKENDS (default: the single OLLAMA_URL), created on first use."""
+    pool = BackendPool(backends_from_env(OLLAMA_URL, MODEL_NAME))
+    if len(pool.backends) > 1:
+        pool.start_health_checks()
+    return pool
+
+def _mock_content(messages: List[Dict[str, str]]) -> str:
+    # Storyboard request: the latest user turn asks for JSON, or a single-turn
+    # call whose system prompt is about storyboards.
+    last = messages[-1].get("content", "").lower()
+    is_storyboard = "json" in last or (
+        len(messages) <= 2
+        and any("storyboard" in m.get("content", "").lower() for m in messages if m.get("role") == "system")
+    )
 
+    if is_storyboard:
+        return json.dumps({
+            "shots": [
+                {
+                    "type": "Wide shot",
+                    "duration": 5,
+                    "camera": "Static",
+                    "context": "A bright, clean studio setting",
+                    "focus": "The product in the center",
+                    "caption": "Introducing the new standard."
+                },
+                {
+                    "type": "Close-up",
+                    "duration": 5,
+                    "camera": "Slow zoom in",
+                    "context": "Detailed view of the product texture",
+                    "focus": "Product features",
+                    "caption": "Unmatched quality."
+                },
+                {
+                    "type": "Medium shot",
+                    "duration": 5,
+                    "camera": "Pan left",
+                    "context": "Lifestyle setting with soft lighting",
+                    "focus": "Product in use",
+                    "caption": "Designed for you."
+                },
+                {
+                    "type": "Wide shot",
+                    "duration": 5,
+                    "camera": "Static",
+                    "context": "Product with logo overlay",
+                    "focus": "Brand identity",
+                    "overlay": "Shop Now"
+                }
+            ]
+        })
+    return "This is a mock response from Velocity2 because Ollama is offline."
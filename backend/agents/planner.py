@@ -1,19 +1,32 @@
-# # backend/agents/planner.py
+# backend/agents/planner.py
 import base64
 import json
 import os
-from typing import Any, Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
-import requests
+from backend.agents.llm_client import chat_with_stats
+from backend.agents.storyboard_scorer import score_storyboard
+from backend.config import PLANNER_MAX_BEST_OF
+from backend.deadline import DeadlineExceeded, note_degraded, run_in_context, time_left
 
 GROK_API_KEY = os.getenv("GROK_API_KEY", "")
-# GROK_URL = "https://api.x.ai/v1/chat/completions"  # xAI Grok API base [web:16]
+GROK_URL = "https://api.x.ai/v1/chat/completions"  # xAI Grok API base [web:16]
 
 HEADERS = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {GROK_API_KEY}",
 }
 
+# Number of drafts generated concurrently; only the best-scoring one is
+# critiqued and refined. Set OLLAMA_NUM_PARALLEL >= this on the model server.
+PLANNER_BEST_OF = int(os.getenv("PLANNER_BEST_OF", "1"))
+
+# If less than this much of the job deadline is left after drafting, skip
+# critique/refine and ship the best draft rather than miss the deadline.
+PLANNER_REFINE_RESERVE_S = float(os.getenv("PLANNER_REFINE_RESERVE_S", "20"))
+
 
 def _encode_image_bytes(image_bytes: bytes) -> str:
     return base64.b64encode(image_bytes).decode("utf-8")
@@ -25,6 +38,8 @@ def extract_product_attributes(image_bytes: bytes) -> str:
     """
     Use Grok vision model to describe the product in the image.
     """
+    import requests  # deferred: only the vision path needs it
+
     image_b64 = base64.b64encode(image_bytes).decode("utf-8")
     data_url = f"data:image/png;base64,{image_b64}"  # or jpeg depending on upload
 
@@ -95,27 +110,6 @@ def extract_product_attributes_from_text(prompt: str) -> str:
     return prompt
 
 
-# backend/agents/planner.py
-import json
-import os
-import requests
-from typing import Any, Dict
-
-import json
-import re
-from typing import Any, Dict
-from backend.agents.llm_client import chat
-
-GROK_API_KEY = os.getenv("GROK_API_KEY", "")
-GROK_URL = "https://api.x.ai/v1/chat/completions"
-
-GROK_API_KEY = os.getenv("GROK_API_KEY", "")
-
-HEADERS = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {GROK_API_KEY}",
-}
-
 def _extract_json_block(text: str) -> str:
     """
     Extract JSON object from an LLM response that may include markdown fences
@@ -137,95 +131,165 @@ def _extract_json_block(text: str) -> str:
     return text.strip()
 
 
-def _critique_storyboard(draft_storyboard: str, product_description: str) -> str:
-    """
-    Ask the LLM to critique the draft storyboard for improvements.
-    """
-    system_instruction = (
-        "You are a critical film editor. Analyze the given video storyboard draft. "
-        "Identify 3 key areas to improve for better flow, engagement, and visual impact. "
-        "Focus on: 1) Pacing, 2) Visual variety (camera angles), 3) Clarity of the CTA. "
-        "Be concise."
+# Shared, product-independent system prompt. Every planner call (drafts,
+# critique, refine) starts with exactly this message, and each step appends
+# to the same conversation, so the model server can reuse the already
+# evaluated prompt prefix instead of re-processing it every step.
+PLANNER_SYSTEM_PROMPT = (
+    "You are a senior creative director and film editor for e-commerce video ads. "
+    "You plan storyboards for 6–10 second video ads, critique them, and revise them. "
+    "When asked for a storyboard, return only valid JSON with a top-level 'shots' array. "
+    "Each shot has: type, duration (seconds), camera, context, focus, and optional caption "
+    "or overlay (for the CTA) with cta_position. No comments, no explanations, no markdown."
+)
+
+_CRITIQUE_REQUEST = (
+    "Critique the storyboard above as a critical film editor. "
+    "Identify 3 key areas to improve for better flow, engagement, and visual impact. "
+    "Focus on: 1) Pacing, 2) Visual variety (camera angles), 3) Clarity of the CTA. "
+    "Be concise and do not rewrite it yet."
+)
+
+
+def _draft_request(product_description: str, max_scenes: int) -> str:
+    return (
+        "Product details:\n"
+        f"{product_description}\n\n"
+        f"Generate a high-conversion video ad storyboard with exactly {max_scenes} shots. "
+        "Reply with JSON only."
     )
-    
-    user_prompt = (
-        f"Product: {product_description}\n\n"
-        f"Draft Storyboard:\n{draft_storyboard}\n\n"
-        "Provide a short critique."
+
+
+def _refine_request(max_scenes: int) -> str:
+    return (
+        "Rewrite the storyboard to address your critique, producing the FINAL version "
+        f"with exactly {max_scenes} shots. Return ONLY valid JSON. No markdown formatting, no comments."
     )
-    
-    return chat(
-        [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.3
+
+
+def _record_step(step: str, result: Dict[str, Any], stats: Optional[List[Dict[str, Any]]]) -> None:
+    entry = {k: v for k, v in result.items() if k != "content"}
+    entry["step"] = step
+    print(
+        f"--- [PLANNER] {step}: prompt_eval {entry['prompt_eval_count']} tok in "
+        f"{entry['prompt_eval_ms']:.0f} ms, eval {entry['eval_count']} tok in {entry['eval_ms']:.0f} ms"
     )
+    if stats is not None:
+        stats.append(entry)
 
 
-def _refine_storyboard(draft_storyboard: str, critique: str, product_description: str, max_scenes: int) -> str:
+def _critique_storyboard(conversation: List[Dict[str, str]]) -> Dict[str, Any]:
     """
-    Ask the LLM to rewrite the storyboard based on the critique.
+    Ask the LLM to critique the draft (the last assistant turn of `conversation`).
     """
-    system_instruction = (
-        "You are a master storyboard artist. "
-        f"Rewrite the storyboard to address the critique, producing the FINAL version with exactly {max_scenes} shots. "
-        "Return ONLY valid JSON. No markdown formatting, no comments."
-    )
-    
-    user_prompt = (
-        f"Original Draft:\n{draft_storyboard}\n\n"
-        f"Critique to Address:\n{critique}\n\n"
-        "Generate the polished, final JSON storyboard."
+    return chat_with_stats(
+        conversation + [{"role": "user", "content": _CRITIQUE_REQUEST}],
+        temperature=0.3,
     )
-    
-    return chat(
-        [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_prompt}
+
+
+def _refine_storyboard(conversation: List[Dict[str, str]], critique: str, max_scenes: int) -> Dict[str, Any]:
+    """
+    Ask the LLM to rewrite the draft based on its critique, in the same conversation.
+    """
+    return chat_with_stats(
+        conversation + [
+            {"role": "user", "content": _CRITIQUE_REQUEST},
+            {"role": "assistant", "content": critique},
+            {"role": "user", "content": _refine_request(max_scenes)},
         ],
-        temperature=0.2 # Lower temp for precision in JSON generation
+        temperature=0.2,  # Lower temp for precision in JSON generation
     )
 
 
-def plan_storyboard(product_description: str, max_scenes: int = 4) -> Dict[str, Any]:
-    system_instruction = (
-        "You are a senior creative director for e-commerce video ads. "
-        f"You MUST produce a JSON storyboard for a 6–10 second video ad with exactly {max_scenes} shots. "
-        "Only return valid JSON with a top-level 'shots' array. No comments, no explanations."
-    )
+def _draft_temperatures(n: int) -> List[float]:
+    """Spread draft temperatures over 0.3–0.9 so best-of-N drafts actually differ."""
+    if n <= 1:
+        return [0.4]
+    return [round(0.3 + 0.6 * i / (n - 1), 2) for i in range(n)]
 
-    user_prompt = (
-        "Product details:\n"
-        f"{product_description}\n\n"
-        "Generate a high-conversion video ad storyboard. "
-        "Each shot must have: type, duration (seconds), camera, context, focus, and optional caption or overlay for CTA. "
-        "Reply with JSON only."
-    )
 
+def _generate_drafts(messages: List[Dict[str, str]], n: int) -> List[Dict[str, Any]]:
+    """Generate n drafts concurrently; a failed draft comes back with empty content."""
+    def _draft(temperature: float) -> Dict[str, Any]:
+        try:
+            return chat_with_stats(messages, temperature=temperature)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"--- [PLANNER] Draft at temperature {temperature} failed: {e}")
+            return {"content": ""}
 
-    # 1. GENERATE DRAFT
-    print("--- [PLANNER] Generating DRAFT storyboard...")
-    draft_content = chat(
-        [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.4, # Slightly higher temp for creativity in draft
-    )
-    
-    if not draft_content or not draft_content.strip():
+    temperatures = _draft_temperatures(n)
+    if n <= 1:
+        return [_draft(temperatures[0])]
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="planner-draft") as pool:
+        return list(pool.map(run_in_context(_draft), temperatures))
+
+
+def _parse_storyboard(content: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(_extract_json_block(content))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def plan_storyboard(
+    product_description: str,
+    max_scenes: int = 4,
+    best_of: Optional[int] = None,
+    stats: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Draft -> critique -> refine as one growing conversation.
+    If `stats` is given, per-step prompt/eval token counts and timings are appended to it.
+    """
+    best_of = max(1, min(best_of or PLANNER_BEST_OF, PLANNER_MAX_BEST_OF))
+    conversation = [
+        {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
+        {"role": "user", "content": _draft_request(product_description, max_scenes)},
+    ]
+
+    # 1. GENERATE DRAFT(S)
+    print(f"--- [PLANNER] Generating {best_of} DRAFT storyboard(s)...")
+    drafts = []
+    for i, result in enumerate(_generate_drafts(conversation, best_of)):
+        if result.get("content", "").strip():
+            _record_step(f"draft_{i}", result, stats)
+            drafts.append(result["content"])
+
+    if not drafts:
         print("Empty content from LLM (Draft), falling back to mock.")
+        note_degraded("mock_storyboard")
         return _get_mock_storyboard(max_scenes)
 
+    # Pick the best draft with the local scorer; unparseable drafts score 0
+    parsed = [_parse_storyboard(d) for d in drafts]
+    scores = [score_storyboard(p, max_scenes) if p else 0.0 for p in parsed]
+    best = max(range(len(drafts)), key=lambda i: scores[i])
+    draft_content = drafts[best]
+    if len(drafts) > 1:
+        print(f"--- [PLANNER] Draft scores: {scores}; refining draft {best}")
+    conversation.append({"role": "assistant", "content": draft_content})
+
+    if parsed[best] and time_left() < PLANNER_REFINE_RESERVE_S:
+        print(f"--- [PLANNER] {time_left():.1f}s left on the job deadline; skipping critique/refine.")
+        note_degraded("refine_skipped")
+        return parsed[best]
+
     # 2. CRITIQUE DRAFT (Self-Correction)
     print("--- [PLANNER] Critiquing storyboard...")
-    critique = _critique_storyboard(draft_content, product_description)
+    critique_result = _critique_storyboard(conversation)
+    _record_step("critique", critique_result, stats)
+    critique = critique_result["content"]
     print(f"--- [PLANNER] Critique received: {critique[:100]}...")
 
     # 3. REFINE STORYBOARD
     print("--- [PLANNER] Refining storyboard based on critique...")
-    final_content = _refine_storyboard(draft_content, critique, product_description, max_scenes)
+    final_result = _refine_storyboard(conversation, critique, max_scenes)
+    _record_step("refine", final_result, stats)
+    final_content = final_result["content"]
     
     # Extract JSON from the FINAL content
     json_str = _extract_json_block(final_content)
@@ -238,7 +302,12 @@ def plan_storyboard(product_description: str, max_scenes: int = 4) -> Dict[str,
     except json.JSONDecodeError as e:
         print(f"JSON Decode Error: {e}. Content snippet: {json_str[:200]}")
         # Fallback on JSON error (e.g. truncated output)
+        if parsed[best]:
+            print("Falling back to best draft storyboard due to JSON error.")
+            note_degraded("refine_failed")
+            return parsed[best]
         print("Falling back to mock storyboard due to JSON error.")
+        note_degraded("mock_storyboard")
         return _get_mock_storyboard(max_scenes)
 
 def _get_mock_storyboard(max_scenes: int) -> Dict[str, Any]:
@@ -1,17 +1,15 @@
 # backend/agents/scene_agent.py
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
+from backend.agents.shot_canon import canonical_shot
+from backend.agents.timing import plan_timing
 
-def shot_to_prompt(shot: Dict[str, Any], product_description: str) -> str:
-    """
-    Turn a storyboard shot into a Pika-friendly text prompt.
-    Keep it short and visual; no JSON here.
-    """
+
+def _shot_parts(shot: Dict[str, Any]) -> List[str]:
     shot_type = shot.get("type", "")
     camera = shot.get("camera", "")
     context = shot.get("context", "")
     focus = shot.get("focus", "")
-    caption = shot.get("caption") or shot.get("overlay") or ""
 
     parts: List[str] = []
 
@@ -23,6 +21,16 @@ def shot_to_prompt(shot: Dict[str, Any], product_description: str) -> str:
         parts.append(f"in {context}")
     if focus:
         parts.append(f"focused on {focus}")
+    return parts
+
+
+def shot_to_prompt(shot: Dict[str, Any], product_description: str) -> str:
+    """
+    Turn a storyboard shot into a Pika-friendly text prompt.
+    Keep it short and visual; no JSON here.
+    """
+    caption = shot.get("caption") or shot.get("overlay") or ""
+    parts = _shot_parts(shot)
 
     # Add product + style conditioning
     parts.append(f"high quality cinematic ad of {product_description}")
@@ -33,37 +41,71 @@ def shot_to_prompt(shot: Dict[str, Any], product_description: str) -> str:
     return ", ".join(p for p in parts if p)
 
 
+def packed_prompt(shots: List[Dict[str, Any]], segments: List[Dict[str, Any]], product_description: str) -> str:
+    """One prompt for several short shots rendered as a single clip, with their timings."""
+    steps = [
+        f"shot {n} ({seg['duration']:g}s): " + ", ".join(_shot_parts(shot))
+        for n, (shot, seg) in enumerate(zip(shots, segments), start=1)
+    ]
+    return (
+        f"Sequence of {len(shots)} shots in one clip, cutting between them: "
+        + "; ".join(steps)
+        + f"; high quality cinematic ad of {product_description}"
+    )
+
+
 def storyboard_to_scene_prompts(
     storyboard: Dict[str, Any],
     product_description: str,
     default_aspect_ratio: str = "16:9",
     default_duration: int = 5,
+    provider: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    Convert storyboard JSON into a list of scene generation requests.
-    Each scene request will later be sent to Pika.
+    Convert storyboard JSON into a list of scene generation requests, one
+    per provider render. The timing engine fits shot lengths to the target
+    ad length, asks the provider for the shortest clip it can make, and may
+    pack several short shots into one render; each scene's "segments" say
+    which parts of its clip go into the final cut.
     """
     print("storyboard", storyboard)
     print(type(storyboard))
+    if provider is None:
+        from backend.integrations.video_client import select_provider
+
+        provider = select_provider()
     shots = storyboard.get("shots", [])
     scenes = []
 
-    for idx, shot in enumerate(shots):
-        duration = int(round(shot.get("duration", default_duration)))
-        # Clamp to Pika-supported durations (e.g. 5 or 10 seconds via Fal) [web:89][web:139]
-        if duration <= 5:
-            duration = 5
+    for idx, unit in enumerate(plan_timing(storyboard, provider, default_duration=default_duration)):
+        unit_shots = [shots[i] for i in unit["shots"]]
+        shot = unit_shots[0]
+        if len(unit_shots) == 1:
+            prompt = shot_to_prompt(shot, product_description)
+            canon = canonical_shot(shot)
         else:
-            duration = 10
-
-        prompt = shot_to_prompt(shot, product_description)
+            prompt = packed_prompt(unit_shots, unit["segments"], product_description)
+            canons = [canonical_shot(s) for s in unit_shots]
+            canon = {k: " / ".join(c[k] for c in canons) for k in canons[0]}
 
         scenes.append(
             {
                 "index": idx,
                 "prompt": prompt,
-                "duration": duration,
+                # Clip length requested from (and billed by) the provider
+                "duration": unit["render_s"],
+                # What the plan keeps of it
+                "requested_duration": round(sum(s["duration"] for s in unit["segments"]), 3),
+                "segments": unit["segments"],
                 "aspect_ratio": default_aspect_ratio,
+                # Raw shot fields, used by the local animatic renderer
+                "shot_type": " / ".join(s.get("type", "") for s in unit_shots),
+                "camera": " / ".join(s.get("camera", "") for s in unit_shots),
+                "caption": shot.get("caption") or "",
+                "overlay": shot.get("overlay") or "",
+                # Canonical shot fields + product, used to find reusable renders
+                "canon": canon,
+                "product": product_description,
             }
         )
 
@@ -0,0 +1,131 @@
+# backend/agents/shot_canon.py
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+# Controlled vocabularies: canonical term -> phrases the planner uses for it.
+# Matching is on normalized text, longest phrase first, so "extreme close up"
+# wins over "close up".
+SHOT_TYPES: Dict[str, List[str]] = {
+    "extreme close-up": ["extreme close up", "extreme closeup", "ecu", "macro"],
+    "close-up": ["close up", "closeup", "cu", "detail", "tight"],
+    "medium": ["medium", "mid", "medium close up", "waist", "ms"],
+    "wide": ["wide", "long", "establishing", "full", "ws"],
+    "overhead": ["overhead", "top down", "flat lay", "birds eye", "bird s eye"],
+    "product": ["product", "hero", "packshot", "pack shot"],
+    "lifestyle": ["lifestyle", "in use", "action"],
+    "cta": ["cta", "call to action", "end card", "outro"],
+}
+
+CAMERA_MOVES: Dict[str, List[str]] = {
+    "static": ["static", "still", "locked off", "fixed", "tripod", "none"],
+    "pan left": ["pan left", "slow pan left"],
+    "pan right": ["pan right", "slow pan right"],
+    "pan": ["pan", "slow pan", "panning", "gentle pan", "sweep"],
+    "tilt up": ["tilt up"],
+    "tilt down": ["tilt down"],
+    "tilt": ["tilt", "slow tilt"],
+    "push in": ["push in", "dolly in", "slow push in", "zoom in", "slow zoom in", "push"],
+    "pull out": ["pull out", "dolly out", "pull back", "zoom out", "slow zoom out"],
+    "orbit": ["orbit", "arc", "360", "rotate", "rotating", "turntable", "slow rotation"],
+    "tracking": ["tracking", "track", "follow", "dolly", "truck"],
+    "handheld": ["handheld", "hand held", "shaky"],
+    "crane": ["crane", "jib", "boom", "rise", "drone"],
+}
+
+_STOPWORDS: Set[str] = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "with", "for",
+    "by", "from", "into", "its", "it", "is", "are", "this", "that", "shot", "scene",
+}
+
+_NON_WORD_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: Any) -> str:
+    """Casefold, drop punctuation and collapse whitespace."""
+    text = _NON_WORD_RE.sub(" ", str(text or "").casefold().replace("_", " "))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def _phrases(vocab: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    pairs = {(f" {normalize_text(p)} ", canon) for canon, options in vocab.items() for p in [canon, *options]}
+    return sorted(pairs, key=lambda pc: -len(pc[0]))
+
+
+_SHOT_PHRASES = _phrases(SHOT_TYPES)
+_CAMERA_PHRASES = _phrases(CAMERA_MOVES)
+
+
+def _lookup(phrases: List[Tuple[str, str]], text: Any) -> str:
+    norm = normalize_text(text)
+    if not norm:
+        return ""
+    padded = f" {norm} "
+    for phrase, canon in phrases:
+        if phrase in padded:
+            return canon
+    # Unknown term: keep it, normalized, rather than guessing
+    return norm
+
+
+def canonical_shot_type(value: Any) -> str:
+    return _lookup(_SHOT_PHRASES, value)
+
+
+def canonical_camera(value: Any) -> str:
+    return _lookup(_CAMERA_PHRASES, value)
+
+
+def content_tokens(text: Any) -> List[str]:
+    """Normalized words minus stopwords, with a crude plural fold ("sneakers" -> "sneaker")."""
+    tokens = []
+    for word in normalize_text(text).split():
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def canonical_shot(shot: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Canonical form of a storyboard shot's visual fields. Two shots with the
+    same canonical form render the same clip (given product, duration,
+    aspect ratio and provider).
+    """
+    return {
+        "type": canonical_shot_type(shot.get("type")),
+        "camera": canonical_camera(shot.get("camera")),
+        "context": " ".join(content_tokens(shot.get("context"))),
+        "focus": " ".join(content_tokens(shot.get("focus"))),
+        # Burned-in text must match exactly, up to case/punctuation/spacing
+        "caption": normalize_text(shot.get("caption") or shot.get("overlay")),
+    }
+
+
+def _digest(fields: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def shot_key(canon: Dict[str, str], product_description: str, duration: Any, aspect_ratio: str) -> str:
+    """Exact-match key for a canonical shot in a given render setting."""
+    product = " ".join(content_tokens(product_description))
+    return _digest({**canon, "product": product, "duration": duration, "aspect_ratio": aspect_ratio})
+
+
+def shot_group(canon: Dict[str, str], product_description: str, duration: Any, aspect_ratio: str) -> str:
+    """
+    Like shot_key but without context/focus: shots in the same group differ
+    only in free-text description, so they are candidates for similar reuse.
+    """
+    product = " ".join(content_tokens(product_description))
+    fixed = {k: canon[k] for k in ("type", "camera", "caption")}
+    return _digest({**fixed, "product": product, "duration": duration, "aspect_ratio": aspect_ratio})
+
+
+def shot_text(canon: Dict[str, str]) -> str:
+    """The free-text part of a canonical shot, compared by similarity."""
+    return f"{canon['context']} {canon['focus']}".strip()
@@ -0,0 +1,60 @@
+# backend/agents/storyboard_scorer.py
+from typing import Any, Dict, List
+
+# Target ad length the planner prompts ask for.
+TARGET_MIN_SECONDS = 6.0
+TARGET_MAX_SECONDS = 10.0
+
+_CTA_WORDS = ("shop", "buy", "order", "get yours", "learn more", "discover", "try", "visit")
+
+
+def _shot_duration(shot: Dict[str, Any]) -> float:
+    try:
+        return float(shot.get("duration", 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def has_cta(shots: List[Dict[str, Any]]) -> bool:
+    """A shot carries an overlay/CTA position, or the last caption reads like a CTA."""
+    if any(s.get("overlay") or s.get("cta_position") for s in shots):
+        return True
+    last_caption = str(shots[-1].get("caption", "")).lower() if shots else ""
+    return any(w in last_caption for w in _CTA_WORDS)
+
+
+def score_storyboard(storyboard: Dict[str, Any], max_scenes: int) -> float:
+    """
+    Cheap rule-based quality score in [0, 1] used to rank draft storyboards
+    before spending an LLM round-trip on critique/refine.
+
+    Equal weights for: shot count matches max_scenes, total duration inside
+    the 6–10s target, camera variety, and a CTA being present.
+    """
+    shots = storyboard.get("shots") if isinstance(storyboard, dict) else None
+    if not isinstance(shots, list) or not shots:
+        return 0.0
+    shots = [s for s in shots if isinstance(s, dict)]
+    if not shots:
+        return 0.0
+
+    # 1) shot count, partial credit for being close
+    count_score = max(0.0, 1.0 - abs(len(shots) - max_scenes) / max(max_scenes, 1))
+
+    # 2) total duration, linear falloff outside the target window
+    total = sum(_shot_duration(s) for s in shots)
+    if TARGET_MIN_SECONDS <= total <= TARGET_MAX_SECONDS:
+        duration_score = 1.0
+    elif total < TARGET_MIN_SECONDS:
+        duration_score = total / TARGET_MIN_SECONDS
+    else:
+        duration_score = max(0.0, 1.0 - (total - TARGET_MAX_SECONDS) / TARGET_MAX_SECONDS)
+
+    # 3) distinct camera moves per shot
+    cameras = {str(s.get("camera", "")).strip().lower() for s in shots if s.get("camera")}
+    variety_score = len(cameras) / len(shots)
+
+    # 4) CTA
+    cta_score = 1.0 if has_cta(shots) else 0.0
+
+    return round((count_score + duration_score + variety_score + cta_score) / 4, 4)
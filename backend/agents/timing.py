@@ -0,0 +1,147 @@
+# backend/agents/timing.py
+import os
+from typing import Any, Dict, List, Optional
+
+from backend.agents.shot_canon import canonical_shot
+from backend.agents.storyboard_scorer import TARGET_MAX_SECONDS, TARGET_MIN_SECONDS
+from backend.config import env_flag
+
+# Clip lengths a provider can render, in seconds. Providers not listed
+# (local, mock) render any length, so their clips match the plan exactly.
+PROVIDER_CLIP_LENGTHS: Dict[str, List[float]] = {
+    "luma": [5, 10],
+    "runway": [5, 10],
+    "pika": [5, 10],
+}
+
+# Fit storyboards into this total length (a storyboard's own "target_duration" wins).
+TIMING_FIT = env_flag("TIMING_FIT", "1")
+TIMING_TARGET_MIN_S = float(os.getenv("TIMING_TARGET_MIN_S", str(TARGET_MIN_SECONDS)))
+TIMING_TARGET_MAX_S = float(os.getenv("TIMING_TARGET_MAX_S", str(TARGET_MAX_SECONDS)))
+TIMING_MIN_SHOT_S = float(os.getenv("TIMING_MIN_SHOT_S", "1.0"))
+
+PACK_OFF = "off"
+PACK_SETTING = "setting"  # consecutive shots in the same setting, without burned-in text
+PACK_ANY = "any"          # any consecutive shots without burned-in text
+TIMING_PACK = os.getenv("TIMING_PACK", PACK_SETTING)
+
+
+def _seconds(value: Any, default: float) -> float:
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return default
+    return seconds if seconds > 0 else default
+
+
+def fit_durations(
+    durations: List[float],
+    target_min: float = TIMING_TARGET_MIN_S,
+    target_max: float = TIMING_TARGET_MAX_S,
+) -> List[float]:
+    """
+    Scale planned shot lengths so their total lands in [target_min, target_max],
+    keeping their proportions; no shot goes below TIMING_MIN_SHOT_S.
+    """
+    total = sum(durations)
+    if not total:
+        return list(durations)
+    scale = 1.0
+    if total > target_max:
+        scale = target_max / total
+    elif total < target_min:
+        scale = target_min / total
+    return [max(TIMING_MIN_SHOT_S, round(d * scale, 2)) for d in durations]
+
+
+def render_length(planned: float, provider: str) -> float:
+    """Shortest clip the provider can render that covers `planned` seconds."""
+    lengths = PROVIDER_CLIP_LENGTHS.get(provider)
+    if not lengths:
+        return round(planned, 2)
+    return next((length for length in sorted(lengths) if length >= planned - 1e-6), max(lengths))
+
+
+def _packable(a: Dict[str, Any], b: Dict[str, Any], mode: str) -> bool:
+    if mode == PACK_OFF:
+        return False
+    # A provider can't be told when to show text, so captioned shots render alone
+    if any(s.get("caption") or s.get("overlay") for s in (a, b)):
+        return False
+    return mode == PACK_ANY or canonical_shot(a)["context"] == canonical_shot(b)["context"]
+
+
+def pack_shots(shots: List[Dict[str, Any]], durations: List[float], provider: str, mode: str = TIMING_PACK) -> List[List[int]]:
+    """
+    Group consecutive shot indices into provider renders. A shot joins the
+    previous group only if the prompt allows it and one render of the group
+    is shorter than rendering the shot separately, e.g. two 2s shots share one
+    5s clip instead of costing two. Providers rendering exact lengths never pack.
+    """
+    groups: List[List[int]] = []
+    for i, shot in enumerate(shots):
+        if groups:
+            group = groups[-1]
+            together = sum(durations[j] for j in group) + durations[i]
+            apart = render_length(sum(durations[j] for j in group), provider) + render_length(durations[i], provider)
+            if _packable(shots[group[-1]], shot, mode) and render_length(together, provider) < apart and (
+                render_length(together, provider) >= together - 1e-6
+            ):
+                group.append(i)
+                continue
+        groups.append([i])
+    return groups
+
+
+def plan_timing(
+    storyboard: Dict[str, Any],
+    provider: str,
+    default_duration: float = 5,
+    fit: Optional[bool] = None,
+    pack: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Timing plan for a storyboard: one entry per provider render, as
+    {"shots": [shot index, ...], "render_s": clip length to request,
+    "segments": [{"shot", "start", "duration"}]} where segments are the
+    parts of the rendered clip kept in the final cut.
+    """
+    shots = storyboard.get("shots", [])
+    durations = [_seconds(s.get("duration"), default_duration) for s in shots]
+    target = _seconds(storyboard.get("target_duration"), 0)
+    if target:
+        durations = fit_durations(durations, target, target)
+    elif TIMING_FIT if fit is None else fit:
+        durations = fit_durations(durations)
+
+    plan = []
+    for group in pack_shots(shots, durations, provider, TIMING_PACK if pack is None else pack):
+        planned = sum(durations[i] for i in group)
+        render_s = render_length(planned, provider)
+        segments, start = [], 0.0
+        for i in group:
+            # A shot longer than the provider's longest clip is cut to fit
+            duration = round(min(durations[i], render_s - start), 3)
+            segments.append({"shot": i, "start": round(start, 3), "duration": duration})
+            start += duration
+        plan.append({"shots": group, "render_s": render_s, "segments": segments})
+    return plan
+
+
+def output_duration(scene: Dict[str, Any]) -> float:
+    """Seconds of a scene's clip kept in the final video."""
+    segments = scene.get("segments")
+    if segments:
+        return sum(float(s["duration"]) for s in segments)
+    return float(scene.get("duration", 0))
+
+
+def needs_trim(scene: Dict[str, Any], clip_duration: Optional[float], tolerance: float = 0.05) -> bool:
+    """True if only part of the rendered clip belongs in the final cut."""
+    segments = scene.get("segments")
+    if not segments:
+        return False
+    if len(segments) > 1 or float(segments[0]["start"]) > 0:
+        return True
+    length = clip_duration if clip_duration is not None else float(scene.get("duration", 0))
+    return length - float(segments[0]["duration"]) > tolerance
@@ -0,0 +1,156 @@
+# backend/api/cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+from backend.deadline import DeadlineExceeded
+
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "1024"))
+API_CACHE_TTL_S = float(os.getenv("API_CACHE_TTL_S", "3600"))
+
+# Request fields that don't change the result and so must not change the key.
+# A short deadline can degrade the result (no refine, fast render tier), but
+# such results are marked and never cached: see get_or_compute's `cacheable`.
+_NON_KEY_FIELDS = {"deadline_s"}
+
+
+def request_key(kind: str, body: BaseModel) -> str:
+    """Stable key for a request body: same fields and values -> same key."""
+    data = {k: v for k, v in body.model_dump().items() if k not in _NON_KEY_FIELDS}
+    raw = json.dumps({"kind": kind, **data}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def etag_for(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of API results keyed by request_key(), with single-flight:
+    concurrent identical requests wait for the first one instead of all
+    recomputing. `on_evict(value)` runs when an entry leaves the cache
+    (used to unpin job media).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = API_CACHE_MAX_ENTRIES,
+        ttl_s: float = API_CACHE_TTL_S,
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, Tuple[float, Any, str]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, str]]:
+        """(value, etag) for a live entry, or None."""
+        evicted = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value, etag = entry
+            if time.time() - stored_at > self.ttl_s:
+                evicted = self._entries.pop(key)[1]
+            else:
+                self._entries.move_to_end(key)
+                return value, etag
+        self._evicted(evicted)
+        return None
+
+    def put(self, key: str, value: Any) -> str:
+        etag = etag_for(value)
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                evicted.append(old[1])
+            self._entries[key] = (time.time(), value, etag)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1][1])
+        for value in evicted:
+            self._evicted(value)
+        return etag
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._evicted(entry[1])
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, str, bool]:
+        """
+        (value, etag, hit). Only one caller per key runs `compute` at a time;
+        the others wait for it and share the result. A value `cacheable`
+        rejects is returned to its own caller only, and the waiters compute
+        their own, as they do when the owner ran out of its deadline.
+        """
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                return cached[0], cached[1], True
+
+            with self._lock:
+                fut = self._inflight.get(key)
+                owner = fut is None
+                if owner:
+                    fut = Future()
+                    self._inflight[key] = fut
+
+            if owner:
+                break
+            try:
+                shared = fut.result()
+            except DeadlineExceeded:
+                continue  # the owner's deadline, not necessarily ours
+            if shared is not None:
+                return shared[0], shared[1], True
+
+        try:
+            value = compute()
+            keep = cacheable is None or cacheable(value)
+            etag = self.put(key, value) if keep else etag_for(value)
+        except BaseException as e:
+            self._finished(key)
+            fut.set_exception(e)
+            raise
+        self._finished(key)
+        fut.set_result((value, etag) if keep else None)
+        return value, etag, False
+
+    def _finished(self, key: str) -> None:
+        # Before waking the waiters, so a retrying waiter starts a new flight
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _evicted(self, value: Any) -> None:
+        if self.on_evict is not None and value is not None:
+            try:
+                self.on_evict(value)
+            except Exception:
+                pass
@@ -1,10 +1,44 @@
 # backend/api/main.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import hmac
+import math
+import os
+import re
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+
+from backend.accounting import get_accounting, job_ledger, stage_timer
+from backend.api.cache import ResultCache, etag_matches, request_key
+from backend.config import PLANNER_MAX_BEST_OF, startup
+from backend.deadline import (
+    DEFAULT_JOB_DEADLINE_S,
+    DeadlineExceeded,
+    deadline_scope,
+    degraded_scope,
+    new_deadline,
+    run_in_context,
+)
+from backend.pipelines.media_workers import PRIORITY_INTERACTIVE, priority_scope
+from backend.scheduler import SCHED_ADMISSION, AdmissionRejected, projected_wait, tenant_scope
+
+# Shared secret for the /admin routes (X-Admin-Token); unset means they are off.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
-from backend.agents.planner import extract_product_attributes, plan_storyboard
 
-app = FastAPI(title="Agentic Video Ads - Storyboard API")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    startup()
+    yield
+
+
+app = FastAPI(title="Agentic Video Ads - Storyboard API", lifespan=lifespan)
 
 # optional CORS if you later add a Next.js UI
 app.add_middleware(
@@ -13,6 +47,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache", "Accept-Ranges", "Content-Range"],
 )
 
 
@@ -36,49 +71,473 @@ app.add_middleware(
 #     except Exception as e:
 #         # Simple error surface for now; you can log e with struct logging
 #         raise HTTPException(status_code=500, detail=str(e))
-# backend/api/main.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+
+
 class StoryboardRequest(BaseModel):
     product_description: str
     max_scenes: int = 4
+    # Drafts to generate and rank; default PLANNER_BEST_OF
+    best_of: Optional[int] = Field(None, ge=1, le=PLANNER_MAX_BEST_OF)
+    deadline_s: Optional[float] = None  # end-to-end budget; default DEFAULT_JOB_DEADLINE_S
+
+
+class VideoRequest(BaseModel):
+    product_description: str
+    max_scenes: int = 4
+    best_of: Optional[int] = Field(None, ge=1, le=PLANNER_MAX_BEST_OF)
+    deadline_s: Optional[float] = None
+    # Extra outputs from the same storyboard, e.g. ["9:16", "1:1@1080", "16:9@720:hevc"];
+    # the first one sets the aspect ratio the scenes are rendered at
+    renditions: Optional[List[str]] = None
+    fit: str = "auto"  # auto | crop | pad | render
+    hls: Optional[bool] = None  # also emit HLS; default PACKAGING_HLS
+    clip_reuse: Optional[str] = None  # off | exact | similar; default CLIP_REUSE
+    keyframes: Optional[str] = None  # off | setting | all; default KEYFRAME_CHAIN
+
+
+_RENDITION_NAME_RE = re.compile(r"^\d+x\d+_\d+_\w+$")
+_KEYFRAME_NAME_RE = re.compile(r"^scene_\d+(_\w+)?\.jpg$")
+
+
+def _media_url(job_id: str, path: str) -> Optional[str]:
+    """URL of a file under the job's final/ directory; None for a path outside it."""
+    from backend.storage.media_store import get_media_store
+
+    final_dir = (get_media_store().job_dir(job_id) / "final").resolve()
+    try:
+        relpath = Path(path).resolve().relative_to(final_dir)
+    except ValueError:
+        return None
+    return f"/jobs/{job_id}/media/" + relpath.as_posix()
+
+
+def _add_packaging_urls(result: Dict[str, Any]) -> None:
+    packaging = result.get("packaging")
+    if not packaging:
+        return
+    job_id = result["job_id"]
+    for rung in packaging["ladder"]:
+        rung["url"] = _media_url(job_id, rung["path"])
+    packaging["poster_url"] = _media_url(job_id, packaging["poster"])
+    packaging["thumbnail_urls"] = [url for url in (_media_url(job_id, p) for p in packaging["thumbnails"]) if url]
+    if packaging.get("hls"):
+        packaging["hls_url"] = _media_url(job_id, packaging["hls"])
+
+
+def _unpin_job(result: Dict[str, Any]) -> None:
+    from backend.storage.media_store import get_media_store
+
+    get_media_store().unpin(result["job"]["job_id"])
+
+
+# Identical request bodies get the cached storyboard / the existing job.
+# Cached video results pin their job's media so GC can't remove it underneath.
+storyboard_cache = ResultCache()
+video_cache = ResultCache(on_evict=_unpin_job)
 
-from backend.agents.planner import (
-    extract_product_attributes_from_text,
-    plan_storyboard,
-)
+
+def _admit(stages: List[str], deadline_s: Optional[float]) -> None:
+    """503 + Retry-After up front if the stages' queues won't get to this request within its deadline."""
+    budget = deadline_s if deadline_s is not None else DEFAULT_JOB_DEADLINE_S
+    if not SCHED_ADMISSION or not budget or budget <= 0:
+        return
+    wait = projected_wait(stages, PRIORITY_INTERACTIVE)
+    if wait > budget:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: projected queue wait {wait:.0f}s exceeds the {budget:.0f}s deadline",
+            headers={"Retry-After": str(math.ceil(wait - budget))},
+        )
+
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.projected_wait_s))})
+
+
+def _not_degraded(value: Dict[str, Any]) -> bool:
+    # A fallback or short-deadline result must not be served to later requests
+    return not value.get("degraded")
+
+
+def _cached_response(request: Request, response: Response, value: Any, etag: str, hit: bool) -> Any:
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    # Shared caches may store it but must revalidate with If-None-Match
+    response.headers["Cache-Control"] = "no-cache"
+    return value
+
+
+# Planner/pipeline imports are deferred to the handlers (or to startup() when
+# VELOCITY2_PRELOAD=1) so importing the app stays cheap for workers and CLIs.
 
 @app.post("/generate/storyboard")
-async def generate_storyboard(body: StoryboardRequest):
-    # try:
-        # print(plan_storyboard("Matte black insulated water bottle with logo", max_scenes=4))
+async def generate_storyboard(body: StoryboardRequest, request: Request, response: Response):
+    from backend.agents.planner import extract_product_attributes_from_text, plan_storyboard
 
-    product_desc = extract_product_attributes_from_text(body.product_description)
-    storyboard = plan_storyboard(product_desc, max_scenes=body.max_scenes)
-    
-    return {
-        "product_description": product_desc,
-        "storyboard": storyboard,
-    }
-    # except Exception as e:
-    #     raise HTTPException(status_code=500, detail=str(e))
+    def compute() -> Dict[str, Any]:
+        with job_ledger("storyboard") as ledger, stage_timer("plan"), degraded_scope() as degraded:
+            product_desc = extract_product_attributes_from_text(body.product_description)
+            storyboard = plan_storyboard(product_desc, max_scenes=body.max_scenes, best_of=body.best_of)
+        value = {
+            "product_description": product_desc,
+            "storyboard": storyboard,
+            # For GET /accounting/jobs/{ledger_id}; a cache hit returns the computing request's ledger
+            "ledger_id": ledger.ledger_id,
+        }
+        if degraded:
+            value["degraded"] = degraded
+        return value
 
+    key = request_key("storyboard", body)
+    if storyboard_cache.get(key) is None:
+        _admit(["llm"], body.deadline_s)
+    try:
+        with deadline_scope(new_deadline(body.deadline_s)), priority_scope(PRIORITY_INTERACTIVE), tenant_scope(
+            request.headers.get("x-tenant")
+        ):
+            # Planning blocks for seconds: keep it (and the single-flight wait) off the event loop
+            value, etag, hit = await run_in_threadpool(
+                run_in_context(storyboard_cache.get_or_compute), key, compute, _not_degraded
+            )
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return _cached_response(request, response, value, etag, hit)
 
-from backend.agents.planner import plan_storyboard
-from backend.pipelines.video_pipeline import generate_video_from_storyboard
 
-class VideoRequest(BaseModel):
-    product_description: str
-    max_scenes: int = 4
+def _validate_video_request(body: VideoRequest) -> List[Any]:
+    """Parsed renditions of a video request; 422 for bad options."""
+    from backend.pipelines.keyframes import KEYFRAME_MODES
+    from backend.pipelines.renditions import parse_rendition
+    from backend.storage.clip_index import REUSE_MODES
+
+    try:
+        renditions = [parse_rendition(spec, fit=body.fit) for spec in body.renditions or []]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if body.clip_reuse is not None and body.clip_reuse not in REUSE_MODES:
+        raise HTTPException(status_code=422, detail=f"clip_reuse must be one of {', '.join(REUSE_MODES)}")
+    if body.keyframes is not None and body.keyframes not in KEYFRAME_MODES:
+        raise HTTPException(status_code=422, detail=f"keyframes must be one of {', '.join(KEYFRAME_MODES)}")
+    return renditions
+
+
+def _add_job_urls(result: Dict[str, Any]) -> None:
+    result["final_video_url"] = f"/jobs/{result['job_id']}/video"
+    for name, rendition in result.get("renditions", {}).items():
+        rendition["url"] = f"/jobs/{result['job_id']}/video?rendition={name}"
+    _add_packaging_urls(result)
 
 
 @app.post("/generate/video")
-async def generate_video(body: VideoRequest):
-    storyboard = plan_storyboard(body.product_description, max_scenes=body.max_scenes)
-    print(type(storyboard))
-    result = generate_video_from_storyboard(storyboard, body.product_description)
-    return {
-        "product_description": body.product_description,
-        "storyboard": storyboard,
-        "job": result,
-    }
+async def generate_video(body: VideoRequest, request: Request, response: Response):
+    from backend.agents.planner import plan_storyboard
+    from backend.pipelines.video_pipeline import generate_video_from_storyboard
+    from backend.storage.media_store import get_media_store
+
+    renditions = _validate_video_request(body)
+    store = get_media_store()
+    key = request_key("video", body)
+
+    def compute() -> Dict[str, Any]:
+        # Cache hits cost nothing, so only computed requests get a ledger
+        with job_ledger("video"), degraded_scope() as degraded:
+            with stage_timer("plan"):
+                storyboard = plan_storyboard(body.product_description, max_scenes=body.max_scenes, best_of=body.best_of)
+            result = generate_video_from_storyboard(
+                storyboard,
+                body.product_description,
+                renditions=renditions,
+                hls=body.hls,
+                clip_reuse=body.clip_reuse,
+                keyframes=body.keyframes,
+            )
+        _add_job_urls(result)
+        value = {
+            "product_description": body.product_description,
+            "storyboard": storyboard,
+            "job": result,
+        }
+        if degraded:
+            value["degraded"] = degraded
+        else:
+            store.pin(result["job_id"])  # unpinned when the cache evicts it
+        return value
+
+    cached = video_cache.get(key)
+    if cached and store.committed_final(cached[0]["job"]["job_id"]) is None:
+        video_cache.invalidate(key)  # media is gone (e.g. deleted by hand); render again
+        cached = None
+    if cached is None:
+        _admit(["llm", "render"], body.deadline_s)
+
+    try:
+        # API callers are waiting on the result: their planning, renders and
+        # ffmpeg work go ahead of batch jobs, shared fairly between tenants (X-Tenant)
+        with deadline_scope(new_deadline(body.deadline_s)), priority_scope(PRIORITY_INTERACTIVE), tenant_scope(
+            request.headers.get("x-tenant")
+        ):
+            value, etag, hit = await run_in_threadpool(
+                run_in_context(video_cache.get_or_compute), key, compute, _not_degraded
+            )
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return _cached_response(request, response, value, etag, hit)
+
+
+@app.post("/jobs/video", status_code=202)
+async def queue_video(body: VideoRequest, request: Request):
+    """
+    Distributed mode: queue the job for `python -m backend worker` processes
+    on any node and return at once. Poll GET /jobs/{job_id} for progress.
+    """
+    from backend.pipelines.distributed import submit_video_job
+
+    _validate_video_request(body)
+    with tenant_scope(request.headers.get("x-tenant")):
+        job_id = submit_video_job(
+            body.product_description,
+            max_scenes=body.max_scenes,
+            best_of=body.best_of,
+            deadline_s=body.deadline_s if body.deadline_s is not None else DEFAULT_JOB_DEADLINE_S or None,
+            renditions=body.renditions,
+            fit=body.fit,
+            hls=body.hls,
+            clip_reuse=body.clip_reuse,
+            keyframes=body.keyframes,
+            priority=PRIORITY_INTERACTIVE,
+        )
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+async def queued_job(job_id: str):
+    """Status of a queued job, its task counts by kind and status, and once done its result with media URLs."""
+    from backend.work_queue import JOB_DONE, get_work_queue
+
+    job = await run_in_threadpool(get_work_queue().get_job, job_id=job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job["status"] == JOB_DONE and job["result"]:
+        _add_job_urls(job["result"])
+    return job
+
+
+async def _fetch_remote(job_id: str) -> bool:
+    """Pull a job finished on another node from the object store (distributed mode)."""
+    from backend.pipelines.distributed import fetch_job_media
+
+    return await run_in_threadpool(fetch_job_media, job_id)
+
+
+@app.get("/jobs/{job_id}/video")
+async def job_video(job_id: str, request: Request, rendition: Optional[str] = None):
+    """
+    Final MP4 for a job, or one of its renditions by name. FileResponse
+    handles Range requests (seeking) and uses the ASGI pathsend extension
+    (sendfile) where the server supports it.
+    """
+    from backend.storage.media_store import get_media_store
+
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    name = "final.mp4"
+    if rendition is not None:
+        if not _RENDITION_NAME_RE.match(rendition):
+            raise HTTPException(status_code=404, detail="Unknown rendition")
+        name = f"final_{rendition}.mp4"
+    path = get_media_store().committed_final(job_id, name)
+    if path is None and await _fetch_remote(job_id):
+        path = get_media_store().committed_final(job_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    # A job's final video never changes once committed
+    headers = {"Cache-Control": "public, max-age=86400, immutable"}
+    file_response = FileResponse(path, media_type="video/mp4", headers=headers, stat_result=os.stat(path))
+    etag = file_response.headers["etag"]
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, **headers})
+    return file_response
+
+
+_MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".jpg": "image/jpeg",
+}
+
+
+@app.get("/jobs/{job_id}/media/{path:path}")
+async def job_media(job_id: str, path: str, request: Request):
+    """Packaged outputs of a job: ladder MP4s, HLS playlists/segments, posters."""
+    from backend.storage.media_store import get_media_store
+
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    media_type = _MEDIA_TYPES.get(Path(path).suffix)
+    file_path = get_media_store().committed_file(job_id, path) if media_type else None
+    if file_path is None and media_type and await _fetch_remote(job_id):
+        file_path = get_media_store().committed_file(job_id, path)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    headers = {"Cache-Control": "public, max-age=86400, immutable"}
+    file_response = FileResponse(file_path, media_type=media_type, headers=headers, stat_result=os.stat(file_path))
+    if etag_matches(request.headers.get("if-none-match"), file_response.headers["etag"]):
+        return Response(status_code=304, headers={"ETag": file_response.headers["etag"], **headers})
+    return file_response
+
+
+@app.get("/jobs/{job_id}/keyframes/{name}")
+async def job_keyframe(job_id: str, name: str):
+    """
+    Scene keyframes (last frames handed to the next scene). Served while the
+    job is still rendering, since that's when the video provider fetches them.
+    """
+    from backend.storage.media_store import get_media_store
+
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    path = get_media_store().keyframe_file(job_id, name) if _KEYFRAME_NAME_RE.match(name) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path, media_type="image/jpeg")
+
+
+@app.get("/media/workers")
+async def media_workers():
+    from backend.pipelines.media_workers import get_slot_pool
+
+    return get_slot_pool().snapshot()
+
+
+@app.get("/accounting/jobs/{job_id}")
+async def accounting_job(job_id: str):
+    """LLM tokens, provider seconds/polls/cost and stage wall time of one job (running or finished)."""
+    record = get_accounting().get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return record
+
+
+@app.get("/accounting/summary")
+async def accounting_summary(since: float = 0.0):
+    """Totals by LLM backend, provider and stage over recently finished jobs (unix time `since`)."""
+    return get_accounting().summary(since=since)
+
+
+@app.get("/accounting/export")
+async def accounting_export(format: str = "jsonl", since: float = 0.0):
+    if format not in ("jsonl", "csv"):
+        raise HTTPException(status_code=422, detail="format must be jsonl or csv")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return PlainTextResponse(get_accounting().export(format, since=since), media_type=media_type)
+
+
+@app.get("/scheduler")
+async def scheduler_state():
+    """Per-stage slots, queues by priority class and tenant, and admission/preemption counters."""
+    from backend.scheduler import snapshot
+
+    return snapshot()
+
+
+@app.get("/queue")
+async def queue_state():
+    """Jobs by status, tasks by kind and status, and workers holding leases."""
+    from backend.work_queue import get_work_queue
+
+    return await run_in_threadpool(get_work_queue().stats)
+
+
+@app.post("/queue/{method}")
+async def queue_rpc(method: str, request: Request):
+    """The shared queue for workers on other hosts (QUEUE_URL=http://this-node); see backend.work_queue."""
+    from backend.work_queue import QUEUE_TOKEN, RPC_METHODS, get_work_queue
+
+    if not QUEUE_TOKEN:
+        # Off unless a token is configured: these calls can complete or fail any task
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-queue-token", "").encode(), QUEUE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Bad queue token")
+    if method not in RPC_METHODS:
+        raise HTTPException(status_code=404, detail="Unknown queue method")
+    kwargs = await request.json()
+    try:
+        result = await run_in_threadpool(getattr(get_work_queue(), method), **kwargs)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"result": result}
+
+
+def _require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        # Off unless a token is configured: profiles expose stacks and cost CPU
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Bad admin token")
+
+
+@app.post("/admin/profile", dependencies=[Depends(_require_admin)])
+async def profile_window(seconds: float = 30.0):
+    """Sample every thread of this worker process for `seconds` (capped by PROFILE_MAX_WINDOW_S)."""
+    from backend.profiling import get_profiler
+
+    return get_profiler().start_window(seconds)
+
+
+@app.post("/admin/profile/jobs/{job_id}", dependencies=[Depends(_require_admin)])
+async def profile_job(job_id: str):
+    """Profile a job: at once if it is running in this worker, else the next job with that id or kind."""
+    from backend.profiling import get_profiler
+
+    return get_profiler().arm_job(job_id)
+
+
+@app.get("/admin/profile", dependencies=[Depends(_require_admin)])
+async def profile_status():
+    from backend.profiling import get_profiler
+
+    return get_profiler().status()
+
+
+@app.get("/admin/profile/{profile_id}", dependencies=[Depends(_require_admin)])
+async def profile_summary(profile_id: str):
+    """Per-function self/total time of a finished profile."""
+    from backend.profiling import get_profiler
+
+    summary = get_profiler().get(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return summary
+
+
+@app.get("/admin/profile/{profile_id}/folded", dependencies=[Depends(_require_admin)])
+async def profile_folded(profile_id: str):
+    """Collapsed stacks, e.g. for `flamegraph.pl` or https://speedscope.app."""
+    from backend.profiling import get_profiler
+
+    path = get_profiler().folded_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
+@app.get("/llm/backends")
+async def llm_backends():
+    from backend.agents.llm_client import get_pool
+
+    return {"backends": get_pool().snapshot()}
@@ -0,0 +1,102 @@
+# backend/cli.py
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+
+def _cmd_batch(args: argparse.Namespace) -> int:
+    from backend.config import Settings, startup
+    from backend.pipelines.batch import run_batch
+    from backend.pipelines.renditions import parse_rendition
+
+    # Short-lived batch runs reclaim space on the next API/GC run, not here
+    startup(Settings(start_media_gc=False))
+    manifest = args.manifest or f"{args.catalog}.manifest.jsonl"
+    renditions = [parse_rendition(spec, fit=args.fit) for spec in args.rendition or []]
+    stats = run_batch(
+        args.catalog,
+        manifest,
+        plan_workers=args.plan_workers,
+        render_workers=args.render_workers,
+        concat_workers=args.concat_workers,
+        max_in_flight=args.max_in_flight,
+        max_scenes=args.max_scenes,
+        best_of=args.best_of,
+        deadline_s=args.item_deadline,
+        renditions=renditions,
+        clip_reuse=args.clip_reuse,
+        keyframes=args.keyframes,
+        tenant=args.tenant,
+    )
+    print(json.dumps({"manifest": manifest, **stats}))
+    return 1 if stats["error"] else 0
+
+
+def _cmd_worker(args: argparse.Namespace) -> int:
+    from backend.config import startup
+    from backend.pipelines.distributed import TASK_KINDS, run_worker
+    from backend.work_queue import QUEUE_LEASE_S
+
+    startup()
+    kinds = [k.strip() for k in args.kinds.split(",")] if args.kinds else list(TASK_KINDS)
+    unknown = set(kinds) - set(TASK_KINDS)
+    if unknown:
+        print(f"unknown task kinds: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    ran = run_worker(concurrency=args.concurrency, kinds=kinds, lease_s=args.lease or QUEUE_LEASE_S, max_tasks=args.max_tasks)
+    print(json.dumps({"tasks": ran}))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="velocity2", description="Velocity2 command-line tools.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="debug logging")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="generate videos for every product in a CSV/JSONL catalog")
+    batch.add_argument("catalog", help="catalog .csv or .jsonl (id/sku + product_description columns)")
+    batch.add_argument("--manifest", help="JSONL results file; reruns resume from it (default: <catalog>.manifest.jsonl)")
+    batch.add_argument("--max-scenes", type=int, default=4)
+    batch.add_argument("--best-of", type=int, help="storyboard drafts to rank per product (default PLANNER_BEST_OF)")
+    batch.add_argument("--item-deadline", type=float, help="seconds each product may take end to end")
+    batch.add_argument("--plan-workers", type=int, default=2, help="concurrent storyboard plans")
+    batch.add_argument("--render-workers", type=int, default=4, help="concurrent scene renders")
+    batch.add_argument("--concat-workers", type=int, default=2, help="concurrent ffmpeg concats")
+    batch.add_argument("--max-in-flight", type=int, default=8, help="catalog items in progress at once")
+    batch.add_argument(
+        "--rendition", action="append", metavar="SPEC",
+        help='extra output, e.g. "9:16", "1:1@1080" or "16:9@720:hevc"; repeatable, the first sets the master aspect',
+    )
+    batch.add_argument("--fit", choices=["auto", "crop", "pad", "render"], default="auto",
+                       help="how renditions are derived (default: crop from the master when it allows, else re-render)")
+    batch.add_argument("--clip-reuse", choices=["off", "exact", "similar"],
+                       help="reuse earlier renders of identical or near-duplicate scenes (default CLIP_REUSE)")
+    batch.add_argument("--keyframes", choices=["off", "setting", "all"],
+                       help="start each scene from the previous scene's last frame (default KEYFRAME_CHAIN)")
+    batch.add_argument("--tenant", default="batch", help="tenant this run's work is shared fairly as (default: batch)")
+    batch.set_defaults(func=_cmd_batch)
+
+    worker = sub.add_parser("worker", help="run plan/render/concat tasks from the shared queue (QUEUE_URL)")
+    worker.add_argument("--concurrency", type=int, default=4, help="tasks run at once by this process")
+    worker.add_argument("--kinds", help="comma-separated task kinds to take (default: plan,render,concat)")
+    worker.add_argument("--lease", type=float, help="seconds a claimed task is held between heartbeats (default QUEUE_LEASE_S)")
+    worker.add_argument("--max-tasks", type=int, help="exit after running this many tasks")
+    worker.set_defaults(func=_cmd_worker)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stderr,
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# backend/config.py
+import functools
+import importlib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upper bound on storyboard drafts per request (each is a thread and an LLM
+# call). Here rather than in the planner so the API can validate request
+# bodies without importing it.
+PLANNER_MAX_BEST_OF = int(os.getenv("PLANNER_MAX_BEST_OF", "8"))
+
+
+def env_flag(name: str, default: str = "0") -> bool:
+    """Boolean env var: 1/true/yes/on (any case) is True."""
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def process_singleton(factory: Callable[..., T]) -> Callable[..., T]:
+    """
+    Decorator for the module-level get_x() accessors: the first call builds
+    the instance (one per distinct positional args), concurrent first calls
+    wait for it rather than building their own, and later calls don't lock.
+    Unlike lru_cache, the factory never runs twice for the same args, which
+    matters for instances that start threads or open files.
+    `get_x.cache_clear()` drops the instances (tests).
+    """
+    instances: Dict[Tuple[Any, ...], T] = {}
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get(*args: Any) -> T:
+        try:
+            return instances[args]
+        except KeyError:
+            pass
+        with lock:
+            if args not in instances:
+                instances[args] = factory(*args)
+            return instances[args]
+
+    def cache_clear() -> None:
+        with lock:
+            instances.clear()
+
+    get.cache_clear = cache_clear  # type: ignore[attr-defined]
+    return get
+
+
+@dataclass
+class Settings:
+    """
+    Process-level settings, read from the environment once at startup.
+    Module-level constants elsewhere still read their own env vars; this
+    only covers what the startup phase itself needs to act on.
+    """
+    media_root: Path = field(default_factory=lambda: Path(os.getenv("MEDIA_ROOT", "media")))
+    video_provider: str = field(default_factory=lambda: os.getenv("VIDEO_PROVIDER", "mock"))
+    # Import the planner/pipeline/provider modules during startup instead of on first request.
+    preload: bool = field(default_factory=lambda: env_flag("VELOCITY2_PRELOAD"))
+    start_media_gc: bool = field(default_factory=lambda: env_flag("VELOCITY2_MEDIA_GC", "1"))
+
+
+# Modules the request path needs; imported by startup() when preload is on.
+PRELOAD_MODULES: List[str] = [
+    "requests",
+    "backend.agents.planner",
+    "backend.agents.scene_agent",
+    "backend.pipelines.video_pipeline",
+]
+
+_settings: Optional[Settings] = None
+_started = False
+_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def startup(settings: Optional[Settings] = None) -> Settings:
+    """
+    Explicit startup phase: create media dirs, start media GC and optionally
+    preload the modules/provider used by requests. Importing backend modules
+    never does filesystem I/O; this is where it happens. Safe to call twice.
+    """
+    global _settings, _started
+    with _lock:
+        if settings is not None:
+            _settings = settings
+        settings = get_settings()
+        if _started:
+            return settings
+
+        settings.media_root.mkdir(parents=True, exist_ok=True)
+
+        if settings.start_media_gc:
+            from backend.storage.media_store import get_media_store
+
+            get_media_store().start_gc()
+
+        if settings.preload:
+            for name in PRELOAD_MODULES:
+                importlib.import_module(name)
+            from backend.integrations.video_client import load_provider
+
+            load_provider(settings.video_provider)
+
+        _started = True
+        logger.info(f"Velocity2 started (provider={settings.video_provider}, preload={settings.preload})")
+        return settings
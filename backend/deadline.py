@@ -0,0 +1,140 @@
+# backend/deadline.py
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, NoReturn, Optional
+
+# Default end-to-end budget for a job when the request doesn't set one (0 = none).
+DEFAULT_JOB_DEADLINE_S = float(os.getenv("DEFAULT_JOB_DEADLINE_S", "0"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """The job's time budget ran out before `stage` could start or finish."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """An absolute point in (monotonic) time that every stage of a job draws from."""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage: str) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str, cap: float) -> float:
+        """Per-call timeout: the stage's usual cap, or what's left of the budget if less."""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+
+_current: "contextvars.ContextVar[Optional[Deadline]]" = contextvars.ContextVar("velocity2_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make `deadline` the current one for code (and stage helpers) run inside the block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def new_deadline(budget_s: Optional[float] = None) -> Optional[Deadline]:
+    """Deadline for a new job; None when neither the request nor the env sets a budget."""
+    budget_s = budget_s if budget_s is not None else DEFAULT_JOB_DEADLINE_S
+    return Deadline(budget_s) if budget_s and budget_s > 0 else None
+
+
+def stage_timeout(stage: str, cap: float) -> float:
+    """
+    Timeout for one blocking call in `stage`: `cap` when there is no job
+    deadline, otherwise capped by the time left. Raises DeadlineExceeded if
+    the budget is already spent.
+    """
+    deadline = _current.get()
+    return deadline.timeout(stage, cap) if deadline else cap
+
+
+def check_deadline(stage: str) -> None:
+    deadline = _current.get()
+    if deadline:
+        deadline.check(stage)
+
+
+def time_left(default: float = float("inf")) -> float:
+    deadline = _current.get()
+    return deadline.remaining() if deadline else default
+
+
+def raise_timeout(stage: str, error: BaseException) -> NoReturn:
+    """
+    Re-raise a blocking call's timeout from `stage`: as DeadlineExceeded if
+    the job deadline has run out, else `error` itself, since only the
+    stage's own cap (or a busy worker pool) ran out and no deadline was missed.
+    """
+    deadline = _current.get()
+    if deadline is not None and deadline.remaining() <= 0:
+        raise DeadlineExceeded(stage) from error
+    raise error
+
+
+_degraded: "contextvars.ContextVar[Optional[List[str]]]" = contextvars.ContextVar("velocity2_degraded", default=None)
+
+
+@contextmanager
+def degraded_scope() -> Iterator[List[str]]:
+    """Collect the note_degraded() reasons of the job run inside the block (pool threads included)."""
+    reasons: List[str] = []
+    token = _degraded.set(reasons)
+    try:
+        yield reasons
+    finally:
+        _degraded.reset(token)
+
+
+def note_degraded(reason: str) -> None:
+    """
+    Record that the current job's result is worse than a normal run would
+    give (a skipped step, a fallback, the fast render tier), e.g. so it isn't
+    cached and served to requests that have the time for the real thing.
+    """
+    reasons = _degraded.get()
+    if reasons is not None and reason not in reasons:
+        reasons.append(reason)
+
+
+def run_in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap `fn` so it runs with the caller's deadline when submitted to a
+    thread pool (contextvars are not inherited by pool threads). The pool
+    thread also counts as working on the caller's job for the profiler.
+    """
+    ctx = contextvars.copy_context()
+
+    def _run(*args: Any, **kwargs: Any) -> Any:
+        return ctx.copy().run(_in_job_thread, fn, *args, **kwargs)
+
+    return _run
+
+
+def _in_job_thread(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    from backend.accounting import current_ledger
+    from backend.profiling import job_thread
+
+    with job_thread(current_ledger()):
+        return fn(*args, **kwargs)
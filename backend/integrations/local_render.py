@@ -0,0 +1,122 @@
+# backend/integrations/local_render.py
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from backend.pipelines.ffmpeg_tools import available_filters, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Small frames + low fps keep a 5s clip well under a second of CPU with x264 ultrafast.
+LOCAL_RENDER_SHORT_SIDE = int(os.getenv("LOCAL_RENDER_SHORT_SIDE", "360"))
+LOCAL_RENDER_FPS = int(os.getenv("LOCAL_RENDER_FPS", "12"))
+LOCAL_RENDER_FONT = os.getenv("LOCAL_RENDER_FONT", "")  # optional path to a .ttf
+
+_warned_no_drawtext = False
+
+
+def frame_size(aspect_ratio: str, short_side: int = LOCAL_RENDER_SHORT_SIDE) -> Tuple[int, int]:
+    """
+    Pixel size for an aspect ratio like "16:9", with the short side fixed.
+    Both dimensions are kept even for yuv420p.
+    """
+    try:
+        w, h = (float(x) for x in aspect_ratio.split(":"))
+    except ValueError:
+        w, h = 16.0, 9.0
+    if w >= h:
+        width, height = short_side * w / h, short_side
+    else:
+        width, height = short_side, short_side * h / w
+    return int(round(width / 2)) * 2, int(round(height / 2)) * 2
+
+
+def _palette(seed: str) -> Tuple[str, str]:
+    """Two stable background colors derived from the scene prompt."""
+    digest = hashlib.md5(seed.encode("utf-8")).hexdigest()
+    return f"0x{digest[0:6]}", f"0x{digest[6:12]}"
+
+
+def _drawtext(textfile: Path, size: int, y: str, box: bool) -> str:
+    opts = [
+        f"textfile={textfile}",
+        "fontcolor=white",
+        f"fontsize={size}",
+        "x=(w-text_w)/2",
+        f"y={y}",
+    ]
+    if LOCAL_RENDER_FONT:
+        opts.append(f"fontfile={LOCAL_RENDER_FONT}")
+    if box:
+        opts += ["box=1", "boxcolor=black@0.5", "boxborderw=8"]
+    return "drawtext=" + ":".join(opts)
+
+
+def render_scene_clip(scene: Dict[str, Any], out_path: Path) -> Path:
+    """
+    Synthesize an animatic clip for a scene dict with ffmpeg.
+    Uses scene duration/aspect_ratio; burns in shot label, caption and CTA overlay.
+    Output is deterministic for a given scene, so it is safe for load tests and caching.
+    """
+    duration = float(scene.get("duration", 5))
+    width, height = frame_size(scene.get("aspect_ratio", "16:9"))
+    c0, c1 = _palette(scene.get("prompt", ""))
+    fps = LOCAL_RENDER_FPS
+
+    filters = available_filters()
+    if "gradients" in filters:
+        source = (
+            f"gradients=s={width}x{height}:c0={c0}:c1={c1}"
+            f":d={duration}:r={fps}:speed=0.02:seed=1"
+        )
+    else:
+        source = f"color=c={c0}:s={width}x{height}:d={duration}:r={fps}"
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="velocity2_render_") as tmp:
+        vf: List[str] = []
+        if "drawtext" in filters:
+            texts = [
+                (scene.get("shot_type") or f"Scene {scene.get('index', 0) + 1}", height // 18, "h/12", False),
+                (scene.get("caption") or "", height // 12, "h-text_h-h/10", True),
+                (scene.get("overlay") or "", height // 8, "(h-text_h)/2", True),
+            ]
+            for i, (text, size, y, box) in enumerate(texts):
+                if not text:
+                    continue
+                # textfile sidesteps filtergraph escaping of quotes/colons in captions
+                textfile = Path(tmp) / f"text_{i}.txt"
+                textfile.write_text(str(text), encoding="utf-8")
+                vf.append(_drawtext(textfile, size, y, box))
+        else:
+            global _warned_no_drawtext
+            if not _warned_no_drawtext:
+                logger.warning("ffmpeg has no drawtext filter; rendering clips without text.")
+                _warned_no_drawtext = True
+        vf.append("format=yuv420p")
+
+        tmp_out = out_path.with_name(out_path.name + ".part.mp4")
+        run_ffmpeg([
+            "-f", "lavfi", "-i", source,
+            "-vf", ",".join(vf),
+            "-t", f"{duration}",
+            "-r", str(fps),
+            "-c:v", "libx264",
+            "-preset", "ultrafast",
+            "-tune", "stillimage",
+            "-g", str(fps * 2),
+            "-threads", "1",
+            "-an",
+            "-map_metadata", "-1",
+            "-fflags", "+bitexact",
+            "-flags:v", "+bitexact",
+            str(tmp_out),
+        ])
+        os.replace(tmp_out, out_path)
+
+    return out_path
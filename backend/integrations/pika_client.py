@@ -4,25 +4,24 @@ import time
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 
-import requests
+from backend.accounting import record_poll
+from backend.deadline import stage_timeout, time_left
+from backend.integrations.video_client import download_clip
+from backend.storage.media_store import get_media_store
 
 # If using Fal.ai wrapper for Pika [web:89][web:146]:
 FAL_API_KEY = os.getenv("FAL_API_KEY", "")
 FAL_BASE_URL = "https://fal.run"  # Fal base; the exact URL/path depends on client [web:89][web:140]
 
-MEDIA_ROOT = Path("media")
-CLIPS_DIR = MEDIA_ROOT / "clips"
-CLIPS_DIR.mkdir(parents=True, exist_ok=True)
 
-
-def _fake_generate_clip(prompt: str, idx: int, job_id: str) -> str:
+def _fake_generate_clip(scene: Dict[str, Any], job_id: str) -> str:
     """
-    Stand-in for Pika. Creates an empty placeholder file so the pipeline runs.
+    Stand-in for Pika. Renders a local animatic so the pipeline (and concat) runs.
     """
-    path = CLIPS_DIR / f"{job_id}_scene_{idx}.mp4"
-    # Just touch the file for now
-    path.write_bytes(b"")
-    return str(path)
+    from backend.integrations.local_render import render_scene_clip
+
+    path = get_media_store().scene_clip_path(job_id, scene)
+    return str(render_scene_clip(scene, path))
 
 
 def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
@@ -33,7 +32,9 @@ def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
     """
     if not FAL_API_KEY:
         # No API key yet → fake file path
-        return _fake_generate_clip(scene["prompt"], scene["index"], job_id)
+        return _fake_generate_clip(scene, job_id)
+
+    import requests
 
     headers = {
         "Authorization": f"Key {FAL_API_KEY}",
@@ -52,7 +53,7 @@ def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
 
     # Submit request (exact path may differ per Fal client) [web:89][web:140]
     submit_url = f"{FAL_BASE_URL}/queue/fal-ai/pika/v2.1/text-to-video"
-    resp = requests.post(submit_url, json=payload, headers=headers, timeout=120)
+    resp = requests.post(submit_url, json=payload, headers=headers, timeout=stage_timeout("submit", 120))
     resp.raise_for_status()
     data = resp.json()
     request_id: str = data["request_id"]
@@ -60,7 +61,8 @@ def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
     # Poll result (simplified)
     result_url = f"{FAL_BASE_URL}/queue/fal-ai/pika/v2.1/text-to-video/{request_id}"
     while True:
-        r = requests.get(result_url, headers=headers, timeout=60)
+        record_poll("pika")
+        r = requests.get(result_url, headers=headers, timeout=stage_timeout("poll", 60))
         r.raise_for_status()
         rd = r.json()
         status = rd.get("status")
@@ -68,7 +70,7 @@ def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
             break
         elif status in ("FAILED", "CANCELLED"):
             raise RuntimeError(f"Pika generation failed: {rd}")
-        time.sleep(2)
+        time.sleep(min(2, time_left()))
 
     # Fal output schema includes video URL in `data` (check docs) [web:89][web:140]
     video_url: Optional[str] = rd.get("data", {}).get("video_url")
@@ -76,8 +78,5 @@ def generate_clip_with_pika(scene: Dict[str, Any], job_id: str) -> str:
         raise RuntimeError(f"No video_url in Pika result: {rd}")
 
     # Download video to local file
-    clip_path = CLIPS_DIR / f"{job_id}_scene_{scene['index']}.mp4"
-    vr = requests.get(video_url, timeout=300)
-    vr.raise_for_status()
-    clip_path.write_bytes(vr.content)
-    return str(clip_path)
+    clip_path = get_media_store().scene_clip_path(job_id, scene)
+    return download_clip(video_url, clip_path)
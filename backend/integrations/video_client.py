@@ -1,33 +1,105 @@
 # backend/integrations/video_client.py
+import functools
+import importlib
+import logging
 import os
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any
+from shutil import copyfile
+from typing import Any, Callable, Dict, Optional
+
+from backend.accounting import record_poll
+from backend.deadline import note_degraded, stage_timeout, time_left
+from backend.storage.media_store import MEDIA_ROOT, get_media_store
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PROVIDER = os.getenv("VIDEO_PROVIDER", "mock")  # "mock", "local", "runway", "luma", "pika"
+
+# Degraded tier: when a job deadline has less than VIDEO_FAST_TIER_BELOW_S
+# left, scenes go to VIDEO_PROVIDER_FAST (e.g. "local") if it is set.
+VIDEO_PROVIDER_FAST = os.getenv("VIDEO_PROVIDER_FAST", "")
+VIDEO_FAST_TIER_BELOW_S = float(os.getenv("VIDEO_FAST_TIER_BELOW_S", "120"))
+# Downloaded clips whose provider URL is remembered for a re-download.
+VIDEO_SOURCE_CACHE_SIZE = int(os.getenv("VIDEO_SOURCE_CACHE_SIZE", "1024"))
+
+# Provider name -> "module:function". Resolved on first use so that importing
+# this module does not pull in HTTP clients or ffmpeg helpers it won't need.
+PROVIDERS: Dict[str, str] = {
+    "mock": f"{__name__}:_generate_clip_mock",
+    "local": f"{__name__}:_generate_clip_local",
+    "runway": f"{__name__}:_generate_clip_runway",
+    "luma": f"{__name__}:_generate_clip_luma",
+    "pika": "backend.integrations.pika_client:generate_clip_with_pika",
+}
+
 
-import requests
+@functools.lru_cache(maxsize=None)
+def load_provider(name: str) -> Callable[[Dict[str, Any], str], str]:
+    """Import and return the clip function for a provider (unknown names -> mock)."""
+    target = PROVIDERS.get(name.lower(), PROVIDERS["mock"])
+    module_name, func_name = target.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
 
-MEDIA_ROOT = Path("media")
-CLIPS_DIR = MEDIA_ROOT / "clips"
-CLIPS_DIR.mkdir(parents=True, exist_ok=True)
 
-VIDEO_PROVIDER = os.getenv("VIDEO_PROVIDER", "mock")  # "mock", "runway", "luma"
+def select_provider() -> str:
+    """VIDEO_PROVIDER, or VIDEO_PROVIDER_FAST when the job deadline is close."""
+    if VIDEO_PROVIDER_FAST and time_left() < VIDEO_FAST_TIER_BELOW_S:
+        note_degraded("fast_tier")
+        return VIDEO_PROVIDER_FAST.lower()
+    return VIDEO_PROVIDER.lower()
 
 
-def generate_clip(scene: Dict[str, Any], job_id: str) -> str:
+def generate_clip(scene: Dict[str, Any], job_id: str, provider: Optional[str] = None) -> str:
     """
-    Dispatch based on VIDEO_PROVIDER.
+    Dispatch based on VIDEO_PROVIDER (or an explicit `provider`).
     scene: {index, prompt, duration, aspect_ratio}
     Returns local mp4 path.
     """
-    provider = VIDEO_PROVIDER.lower()
-    print("provider", provider)
-    provider = "mock"
-    if provider == "runway":
-        return _generate_clip_runway(scene, job_id)
-    elif provider == "luma":
-        return _generate_clip_luma(scene, job_id)
-    else:
-        return _generate_clip_mock(scene, job_id)
+    provider = provider or select_provider()
+    logger.debug(f"Rendering scene {scene.get('index')} with provider {provider}")
+    return load_provider(provider)(scene, job_id)
+
+
+# clip path -> provider output URL it was downloaded from
+_sources: "OrderedDict[str, str]" = OrderedDict()
+_sources_lock = threading.Lock()
+
+
+def download_clip(video_url: str, clip_path: Path) -> str:
+    """Download a provider's rendered clip and remember its URL for redownload_clip."""
+    import requests
+
+    vr = requests.get(video_url, timeout=stage_timeout("download", 300))
+    vr.raise_for_status()
+    clip_path.write_bytes(vr.content)
+    with _sources_lock:
+        _sources[str(clip_path)] = video_url
+        _sources.move_to_end(str(clip_path))
+        while len(_sources) > VIDEO_SOURCE_CACHE_SIZE:
+            _sources.popitem(last=False)
+    return str(clip_path)
+
+
+def redownload_clip(path: str) -> bool:
+    """
+    Fetch a downloaded clip again from the provider's output URL, without a
+    new (billed) render. False if the clip wasn't downloaded or the fetch fails.
+    """
+    import requests
+
+    with _sources_lock:
+        video_url = _sources.pop(str(path), None)
+    if video_url is None:
+        return False
+    try:
+        download_clip(video_url, Path(path))
+    except requests.RequestException as e:
+        logger.warning(f"Re-download of {path} failed: {e}")
+        return False
+    return True
 
 RUNWAY_API_KEY = os.getenv("RUNWAY_API_KEY", "")
 RUNWAY_BASE_URL = "https://api.runwayml.com/v1"  # check docs [web:216]
@@ -47,6 +119,8 @@ def _generate_clip_runway(scene: Dict[str, Any], job_id: str) -> str:
     Example: Runway text-to-video.
     You MUST adapt endpoint path and payload fields to the current Runway docs. [web:216]
     """
+    import requests
+
     prompt = scene["prompt"]
     duration = scene["duration"]  # seconds
     aspect = scene.get("aspect_ratio", "16:9")
@@ -59,7 +133,7 @@ def _generate_clip_runway(scene: Dict[str, Any], job_id: str) -> str:
         "aspect_ratio": aspect,
         # add model/version fields as per Runway docs
     }
-    resp = requests.post(submit_url, json=payload, headers=_runway_headers(), timeout=60)
+    resp = requests.post(submit_url, json=payload, headers=_runway_headers(), timeout=stage_timeout("submit", 60))
     resp.raise_for_status()
     data = resp.json()
     job_id_runway = data.get("id") or data.get("job_id")
@@ -67,7 +141,8 @@ def _generate_clip_runway(scene: Dict[str, Any], job_id: str) -> str:
     # 2) Poll until done
     status_url = f"{RUNWAY_BASE_URL}/videos/{job_id_runway}"  # example path [web:216]
     while True:
-        r = requests.get(status_url, headers=_runway_headers(), timeout=30)
+        record_poll("runway")
+        r = requests.get(status_url, headers=_runway_headers(), timeout=stage_timeout("poll", 30))
         r.raise_for_status()
         jd = r.json()
         status = jd.get("status")
@@ -75,32 +150,40 @@ def _generate_clip_runway(scene: Dict[str, Any], job_id: str) -> str:
             break
         if status in ("failed", "error"):
             raise RuntimeError(f"Runway generation failed: {jd}")
-        time.sleep(3)
+        time.sleep(min(3, time_left()))
 
     # 3) Download video URL
     video_url = jd.get("output", {}).get("url") or jd.get("video_url")
     if not video_url:
         raise RuntimeError(f"No video URL in Runway result: {jd}")
-    clip_path = CLIPS_DIR / f"{job_id}_scene_{scene['index']}.mp4"
-    vr = requests.get(video_url, timeout=300)
-    vr.raise_for_status()
-    clip_path.write_bytes(vr.content)
-    return str(clip_path)
-
+    clip_path = get_media_store().scene_clip_path(job_id, scene)
+    return download_clip(video_url, clip_path)
 
-from shutil import copyfile
 
 SAMPLE_DIR = MEDIA_ROOT / "sample"
 SAMPLE_CLIP = SAMPLE_DIR / "sample.mp4"  # put any valid test mp4 here
 
 
 def _generate_clip_mock(scene: Dict[str, Any], job_id: str) -> str:
+    """
+    Copy the sample clip if one is present, otherwise render an animatic locally.
+    """
     if not SAMPLE_CLIP.exists():
-        raise RuntimeError(f"Sample clip not found at {SAMPLE_CLIP}")
-    out_path = CLIPS_DIR / f"{job_id}_scene_{scene['index']}.mp4"
+        return _generate_clip_local(scene, job_id)
+    out_path = get_media_store().scene_clip_path(job_id, scene)
     copyfile(SAMPLE_CLIP, out_path)
     return str(out_path)
 
+
+def _generate_clip_local(scene: Dict[str, Any], job_id: str) -> str:
+    """
+    Deterministic ffmpeg animatic for the scene (no external services).
+    """
+    from backend.integrations.local_render import render_scene_clip
+
+    out_path = get_media_store().scene_clip_path(job_id, scene)
+    return str(render_scene_clip(scene, out_path))
+
 LUMA_API_KEY = os.getenv("LUMA_API_KEY", "")
 LUMA_BASE_URL = "https://api.piapi.ai/api/v1/task"  # replace with real base [web:200][web:203]
 
@@ -149,27 +232,15 @@ def _luma_headers() -> Dict[str, str]:
 #     video_url = jd.get("output", {}).get("video_url") or jd.get("video_url")
 #     if not video_url:
 #         raise RuntimeError(f"No video URL in Luma result: {jd}")
-#     clip_path = CLIPS_DIR / f"{job_id}_scene_{scene['index']}.mp4"
+#     clip_path = get_media_store().clip_path(job_id, scene["index"])
 #     vr = requests.get(video_url, timeout=300)
 #     vr.raise_for_status()
 #     clip_path.write_bytes(vr.content)
 #     return str(clip_path)
 
 
-# backend/integrations/video_client.py
-import os
-import time
-from pathlib import Path
-from typing import Dict, Any
-
-import requests
-
-MEDIA_ROOT = Path("media")
-CLIPS_DIR = MEDIA_ROOT / "clips"
-CLIPS_DIR.mkdir(parents=True, exist_ok=True)
-
 PIAPI_KEY = "b9ba07821766bbf16345d0965a0b3a88efa34027e132e4ffdfad8ee841746b54"#os.getenv("PIAPI_API_KEY", "")  # set this in your env
-PIAPI_BASE_URL = "https://api.piapi.ai"
+PIAPI_BASE_URL = os.getenv("PIAPI_BASE_URL", "https://api.piapi.ai")  # overridable for local stand-ins
 
 
 def _piapi_headers() -> Dict[str, str]:
@@ -186,6 +257,8 @@ def _generate_clip_luma(scene: Dict[str, Any], job_id: str) -> str:
     Text-to-video using Luma Dream Machine via PiAPI.
     Uses POST /api/v1/task with model=luma, task_type=video_generation.
     """
+    import requests
+
     prompt = scene["prompt"]
     duration = scene["duration"]  # must be 5 or 10
     aspect = scene.get("aspect_ratio", "16:9")
@@ -203,12 +276,20 @@ def _generate_clip_luma(scene: Dict[str, Any], job_id: str) -> str:
         },
         # "config": { ... }  # optional webhook_config/service_mode if you want
     }
+    if scene.get("frame0"):
+        from backend.pipelines.keyframes import keyframe_url
+
+        # Keyframe chaining: start from the previous scene's last frame
+        frame_url = keyframe_url(job_id, scene["frame0"])
+        if frame_url:
+            payload["input"]["key_frames"] = {"frame0": {"type": "image", "url": frame_url}}
+        else:
+            logger.warning(f"KEYFRAME_PUBLIC_BASE_URL not set; rendering scene {scene['index']} from text only")
     headers = _piapi_headers()
-    print("payload", payload)
-    print("_piapi_headers()", headers)
-    resp = requests.post(create_url, json=payload, headers=headers, timeout=60)
-    print("PiAPI STATUS:", resp.status_code)
-    print("PiAPI BODY:", resp.text)
+    # Never log `headers`: they carry the API key
+    logger.debug(f"PiAPI task payload: {payload}")
+    resp = requests.post(create_url, json=payload, headers=headers, timeout=stage_timeout("submit", 60))
+    logger.debug(f"PiAPI create status {resp.status_code}: {resp.text[:500]}")
     resp.raise_for_status()
     data = resp.json()
 
@@ -218,7 +299,8 @@ def _generate_clip_luma(scene: Dict[str, Any], job_id: str) -> str:
     # 2) Poll task status until Completed / Failed
     status_url = f"{PIAPI_BASE_URL}/api/v1/task/{task_id}"
     while True:
-        r = requests.get(status_url, headers=_piapi_headers(), timeout=30)
+        record_poll("luma")
+        r = requests.get(status_url, headers=_piapi_headers(), timeout=stage_timeout("poll", 30))
         r.raise_for_status()
         jd = r.json()
         status = jd["data"]["status"]
@@ -226,7 +308,7 @@ def _generate_clip_luma(scene: Dict[str, Any], job_id: str) -> str:
             break
         if status == "Failed":
             raise RuntimeError(f"Luma task failed: {jd['data'].get('error')}")
-        time.sleep(3)
+        time.sleep(min(3, time_left()))
 
     # 3) Extract video URL from output
     output = jd["data"]["output"]
@@ -237,12 +319,8 @@ def _generate_clip_luma(scene: Dict[str, Any], job_id: str) -> str:
         raise RuntimeError(f"No video URL in Luma output: {output}")
 
     # 4) Download to local file
-    clip_path = CLIPS_DIR / f"{job_id}_scene_{scene['index']}.mp4"
-    vr = requests.get(video_url, timeout=300)
-    vr.raise_for_status()
-    clip_path.write_bytes(vr.content)
-
-    return str(clip_path)
+    clip_path = get_media_store().scene_clip_path(job_id, scene)
+    return download_clip(video_url, clip_path)
 
 
 def create_luma_video(prompt):
@@ -0,0 +1,150 @@
+# backend/job_runner.py
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from backend.accounting import job_ledger
+from backend.deadline import deadline_scope, new_deadline
+from backend.pipelines.media_workers import PRIORITY_INTERACTIVE, priority_scope
+from backend.scheduler import tenant_scope
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNNER_WORKERS = int(os.getenv("JOB_RUNNER_WORKERS", "4"))
+# Finished jobs are kept (in memory and on disk) this long for polling/reloads.
+JOB_RUNNER_RETENTION_S = float(os.getenv("JOB_RUNNER_RETENTION_S", "86400"))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+@dataclass
+class JobRecord:
+    job_id: str
+    kind: str
+    key: Optional[str] = None
+    status: str = STATUS_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (STATUS_DONE, STATUS_ERROR)
+
+    def elapsed_s(self) -> float:
+        start = self.started_at or self.created_at
+        return (self.finished_at or time.time()) - start
+
+
+class JobRunner:
+    """
+    Runs long pipeline calls (planning, rendering) on a small thread pool so
+    UI script threads only submit and poll. Jobs with the same `key` are
+    shared: submitting an identical request while one is queued, running or
+    done returns the existing job. Records are written to `state_dir` so a
+    browser reload (or a server restart, for finished jobs) can find them.
+    """
+
+    def __init__(self, state_dir: Path, workers: int = JOB_RUNNER_WORKERS, tenant: str = "ui"):
+        self.state_dir = Path(state_dir)
+        self.tenant = tenant
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ui-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, JobRecord] = {}
+        self._by_key: Dict[str, str] = {}
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        key: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        **kwargs: Any,
+    ) -> str:
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key, "")) if key else None
+            if existing is not None and existing.status != STATUS_ERROR:
+                return existing.job_id
+            record = JobRecord(job_id=uuid.uuid4().hex, kind=kind, key=key)
+            self._jobs[record.job_id] = record
+            if key:
+                self._by_key[key] = record.job_id
+        self._save(record)
+
+        def _run() -> None:
+            record.status = STATUS_RUNNING
+            record.started_at = time.time()
+            self._save(record)
+            try:
+                # Someone is watching the UI: interactive media priority
+                with deadline_scope(new_deadline(deadline_s)), priority_scope(PRIORITY_INTERACTIVE), tenant_scope(
+                    self.tenant
+                ), job_ledger(kind):
+                    record.result = fn(*args, **kwargs)
+                record.status = STATUS_DONE
+            except Exception as e:
+                logger.exception(f"{kind} job {record.job_id} failed")
+                record.error = f"{type(e).__name__}: {e}"
+                record.status = STATUS_ERROR
+            record.finished_at = time.time()
+            self._save(record)
+
+        self._pool.submit(_run)
+        self._expire()
+        return record.job_id
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+        return record or self._load(job_id)
+
+    def _path(self, job_id: str) -> Path:
+        return self.state_dir / f"{job_id}.json"
+
+    def _save(self, record: JobRecord) -> None:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(record.job_id)
+        tmp = path.with_suffix(".json.tmp")
+        try:
+            tmp.write_text(json.dumps(asdict(record), default=str))
+            os.replace(tmp, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not persist job {record.job_id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[JobRecord]:
+        if not job_id.isalnum():
+            return None
+        try:
+            data = json.loads(self._path(job_id).read_text())
+        except (OSError, ValueError):
+            return None
+        record = JobRecord(**data)
+        if not record.finished:
+            # Its worker died with the previous server process
+            record.status = STATUS_ERROR
+            record.error = record.error or "Interrupted by a server restart"
+        return record
+
+    def _expire(self) -> None:
+        cutoff = time.time() - JOB_RUNNER_RETENTION_S
+        with self._lock:
+            stale = [r for r in self._jobs.values() if r.finished and (r.finished_at or 0) < cutoff]
+            for record in stale:
+                del self._jobs[record.job_id]
+                if record.key and self._by_key.get(record.key) == record.job_id:
+                    del self._by_key[record.key]
+        for record in stale:
+            self._path(record.job_id).unlink(missing_ok=True)
@@ -0,0 +1,311 @@
+# backend/pipelines/batch.py
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from backend.accounting import close_ledger, ledger_scope, open_ledger, stage_timer
+from backend.deadline import deadline_scope, new_deadline
+from backend.pipelines.media_workers import PRIORITY_BATCH, priority_scope
+from backend.scheduler import tenant_scope
+
+logger = logging.getLogger(__name__)
+
+_ID_FIELDS = ("id", "sku", "product_id")
+_DESCRIPTION_FIELDS = ("product_description", "description", "title")
+
+
+def read_catalog(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream catalog rows from a .csv or .jsonl file as
+    {"id", "product_description", "max_scenes" (optional)}.
+    Rows without a description are skipped.
+    """
+    p = Path(path)
+    with p.open(newline="", encoding="utf-8") as f:
+        if p.suffix.lower() == ".csv":
+            rows: Iterator[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for n, row in enumerate(rows, start=1):
+            item_id = next((str(row[k]) for k in _ID_FIELDS if row.get(k)), f"row-{n}")
+            desc = next((row[k] for k in _DESCRIPTION_FIELDS if row.get(k)), "")
+            if not desc:
+                logger.warning(f"Catalog row {item_id} has no description; skipping")
+                continue
+            item: Dict[str, Any] = {"id": item_id, "product_description": desc}
+            if row.get("max_scenes"):
+                item["max_scenes"] = int(row["max_scenes"])
+            yield item
+
+
+def load_manifest(path: str) -> Set[str]:
+    """Ids already completed successfully in a previous run of this manifest."""
+    done: Set[str] = set()
+    p = Path(path)
+    if not p.exists():
+        return done
+    with p.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if rec.get("status") == "ok":
+                done.add(rec["id"])
+    return done
+
+
+def _ends_torn(path: str) -> bool:
+    """True if the file's last line has no newline (a run killed mid-write)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except OSError:  # missing or empty
+        return False
+
+
+class BatchRunner:
+    """
+    Streams catalog items through plan -> render -> concat. Each stage has its
+    own bounded thread pool, and at most `max_in_flight` items are between
+    "read from catalog" and "written to manifest" at any time, so memory and
+    provider load stay flat however large the catalog is.
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        plan_workers: int = 2,
+        render_workers: int = 4,
+        concat_workers: int = 2,
+        max_in_flight: int = 8,
+        max_scenes: int = 4,
+        best_of: Optional[int] = None,
+        deadline_s: Optional[float] = None,
+        renditions: Optional[List[Any]] = None,
+        clip_reuse: Optional[str] = None,
+        keyframes: Optional[str] = None,
+        tenant: str = "batch",
+    ):
+        self.manifest_path = manifest_path
+        self.max_scenes = max_scenes
+        self.best_of = best_of
+        self.deadline_s = deadline_s
+        self.renditions = renditions or None
+        self.clip_reuse = clip_reuse
+        self.keyframes = keyframes
+        self.tenant = tenant
+        self.max_in_flight = max_in_flight
+        self._plan_pool = ThreadPoolExecutor(plan_workers, thread_name_prefix="batch-plan")
+        self._render_pool = ThreadPoolExecutor(render_workers, thread_name_prefix="batch-render")
+        self._concat_pool = ThreadPoolExecutor(concat_workers, thread_name_prefix="batch-concat")
+        self._slots = threading.Semaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._stats = {"ok": 0, "error": 0, "skipped": 0}
+        self._started_at = 0.0
+
+    def run(self, items: Iterator[Dict[str, Any]]) -> Dict[str, int]:
+        done = load_manifest(self.manifest_path)
+        self._started_at = time.time()
+        Path(self.manifest_path).parent.mkdir(parents=True, exist_ok=True)
+        if _ends_torn(self.manifest_path):
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write("\n")  # end the torn line so the next record isn't glued to it
+        self._manifest = open(self.manifest_path, "a", encoding="utf-8")
+        try:
+            for item in items:
+                if item["id"] in done:
+                    self._stats["skipped"] += 1
+                    continue
+                self._slots.acquire()
+                item["_started"] = time.time()
+                item["_deadline"] = new_deadline(self.deadline_s)
+                item["_ledger"] = open_ledger("batch")
+                self._plan_pool.submit(self._scoped(item, self._plan, "plan"), item).add_done_callback(
+                    self._callback(item, lambda fut, item=item: self._on_planned(item, fut))
+                )
+            # Wait for every in-flight item to reach the manifest
+            for _ in range(self.max_in_flight):
+                self._slots.acquire()
+        except KeyboardInterrupt:
+            logger.warning("Interrupted; finished items are in the manifest, rerun to resume.")
+            for pool in (self._plan_pool, self._render_pool, self._concat_pool):
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            for pool in (self._plan_pool, self._render_pool, self._concat_pool):
+                pool.shutdown(wait=False)
+            self._manifest.close()
+        return dict(self._stats)
+
+    # ---- stages -------------------------------------------------------
+
+    def _scoped(self, item: Dict[str, Any], fn: Callable[..., Any], stage: Optional[str] = None) -> Callable[..., Any]:
+        """
+        Run a stage in a pool thread under the item's job deadline and cost
+        ledger, at batch priority for the run's tenant.
+        """
+        def _run(*args: Any) -> Any:
+            with deadline_scope(item.get("_deadline")), priority_scope(PRIORITY_BATCH), tenant_scope(
+                self.tenant
+            ), ledger_scope(item.get("_ledger")):
+                if stage is None:
+                    return fn(*args)
+                with stage_timer(stage):
+                    return fn(*args)
+        return _run
+
+    def _callback(self, item: Dict[str, Any], fn: Callable[[Future], None]) -> Callable[[Future], None]:
+        """
+        Done-callback that fails the item if `fn` raises. concurrent.futures
+        only logs callback errors, so the item's slot would never be released
+        and run() would wait forever.
+        """
+        def _done(fut: Future) -> None:
+            try:
+                fn(fut)
+            except Exception as e:
+                logger.exception(f"Batch item {item['id']} failed in a stage callback")
+                self._finish(item, error=e)
+        return _done
+
+    def _plan(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        from backend.agents.planner import plan_storyboard
+        from backend.agents.scene_agent import storyboard_to_scene_prompts
+        from backend.pipelines.keyframes import KEYFRAME_CHAIN, chain_parents
+        from backend.pipelines.video_pipeline import start_job
+
+        desc = item["product_description"]
+        storyboard = plan_storyboard(
+            desc, max_scenes=item.get("max_scenes", self.max_scenes), best_of=self.best_of
+        )
+        aspect_ratio = self.renditions[0].aspect_ratio if self.renditions else "16:9"
+        scenes = storyboard_to_scene_prompts(storyboard, desc, default_aspect_ratio=aspect_ratio)
+        if not scenes:
+            raise RuntimeError("Storyboard has no shots")
+        if self.clip_reuse:
+            for scene in scenes:
+                scene["clip_reuse"] = self.clip_reuse
+        parents = chain_parents(scenes, self.keyframes or KEYFRAME_CHAIN)
+        return {"job_id": start_job(), "scenes": scenes, "parents": parents}
+
+    def _on_planned(self, item: Dict[str, Any], fut: Future) -> None:
+        if fut.exception() is not None:
+            self._finish(item, error=fut.exception())
+            return
+        job = fut.result()
+        item["job_id"] = job["job_id"]
+        state = {"remaining": len(job["scenes"]), "paths": [None] * len(job["scenes"]), "error": None}
+
+        # Chain heads now; each chained scene once the scene it starts from is done
+        for pos, parent in enumerate(job["parents"]):
+            if parent is None:
+                self._submit_scene(item, job, state, pos)
+
+    def _submit_scene(self, item: Dict[str, Any], job: Dict[str, Any], state: Dict[str, Any], pos: int) -> None:
+        from backend.pipelines.keyframes import render_chained_clip
+
+        if item.get("_finished"):
+            return  # failed already: don't pay for scenes nobody will concat
+        args = [job["scenes"][pos], job["job_id"]]
+        parent = job["parents"][pos]
+        if parent is not None:
+            args += [job["scenes"][parent], state["paths"][parent]]
+        self._render_pool.submit(self._scoped(item, render_chained_clip, "render"), *args).add_done_callback(
+            self._callback(item, lambda f: self._on_rendered(item, job, state, pos, f))
+        )
+
+    @staticmethod
+    def _descendants(parents: List[Optional[int]], pos: int) -> List[int]:
+        found = [pos]
+        for i, parent in enumerate(parents):
+            if parent in found:
+                found.append(i)
+        return found[1:]
+
+    def _on_rendered(self, item: Dict[str, Any], job: Dict[str, Any], state: Dict[str, Any], pos: int, fut: Future) -> None:
+        with self._lock:
+            if fut.exception() is not None:
+                state["error"] = state["error"] or fut.exception()
+            else:
+                state["paths"][pos] = fut.result()
+            children = self._descendants(job["parents"], pos)
+            if state["error"] is not None:
+                # The item has failed: scenes chained after this one won't be rendered
+                state["remaining"] -= 1 + len(children)
+                children = []
+            else:
+                state["remaining"] -= 1
+                children = [c for c in children if job["parents"][c] == pos]
+            remaining = state["remaining"]
+        for child in children:
+            self._submit_scene(item, job, state, child)
+        if remaining > 0:
+            return
+
+        if state["error"] is not None:
+            self._finish(item, error=state["error"])
+            return
+
+        from backend.pipelines.video_pipeline import finalize_job
+
+        self._concat_pool.submit(
+            self._scoped(item, finalize_job), job["job_id"], job["scenes"], state["paths"], self.renditions
+        ).add_done_callback(
+            self._callback(
+                item, lambda f: self._finish(item, error=f.exception(), result=None if f.exception() else f.result())
+            )
+        )
+
+    def _finish(self, item: Dict[str, Any], error: Optional[BaseException] = None, result: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            # A failed callback finishes the item early; later scenes of it must not finish it again
+            if item.get("_finished"):
+                return
+            item["_finished"] = True
+        try:
+            self._write_record(item, error, result)
+        finally:
+            self._slots.release()
+
+    def _write_record(self, item: Dict[str, Any], error: Optional[BaseException], result: Optional[Dict[str, Any]]) -> None:
+        record: Dict[str, Any] = {
+            "id": item["id"],
+            "status": "error" if error else "ok",
+            "job_id": item.get("job_id"),
+            "elapsed_s": round(time.time() - item["_started"], 3),
+        }
+        if result:
+            record["final_video_path"] = result["final_video_path"]
+            record["scene_count"] = result["scene_count"]
+            if result.get("renditions"):
+                record["renditions"] = {name: r["path"] for name, r in result["renditions"].items()}
+        if error:
+            record["error"] = f"{type(error).__name__}: {error}"
+        ledger = item.get("_ledger")
+        if ledger is not None:
+            close_ledger(ledger, ok=error is None)
+            record["ledger_id"] = ledger.ledger_id
+
+        with self._lock:
+            self._manifest.write(json.dumps(record) + "\n")
+            self._manifest.flush()
+            os.fsync(self._manifest.fileno())
+            self._stats[record["status"]] += 1
+            finished = self._stats["ok"] + self._stats["error"]
+            rate = finished / max(time.time() - self._started_at, 1e-6) * 60
+        logger.info(f"[{record['status']}] {item['id']} in {record['elapsed_s']}s ({finished} done, {rate:.1f}/min)")
+
+
+def run_batch(catalog_path: str, manifest_path: str, **kwargs: Any) -> Dict[str, int]:
+    """Run a catalog through the pipeline, resuming from `manifest_path` if it exists."""
+    return BatchRunner(manifest_path, **kwargs).run(read_catalog(catalog_path))
@@ -0,0 +1,275 @@
+# backend/pipelines/clip_check.py
+import functools
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.accounting import record_clip
+from backend.agents.shot_canon import shot_group, shot_key, shot_text
+from backend.config import env_flag
+from backend.deadline import check_deadline
+from backend.scheduler import get_scheduler
+from backend.integrations.video_client import generate_clip, redownload_clip, select_provider
+from backend.storage.clip_index import CLIP_REUSE, get_clip_index, link_or_copy
+from backend.storage.media_store import get_media_store
+from backend.pipelines.ffmpeg_tools import FFMPEG_BIN, FFPROBE_BIN, ffprobe, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+CLIP_MIN_BYTES = int(os.getenv("CLIP_MIN_BYTES", "1024"))
+# A clip shorter than this share of the scene's requested duration is rejected.
+CLIP_MIN_DURATION_RATIO = float(os.getenv("CLIP_MIN_DURATION_RATIO", "0.5"))
+# Provider calls per scene before giving up (first try included).
+CLIP_MAX_ATTEMPTS = int(os.getenv("CLIP_MAX_ATTEMPTS", "2"))
+# Decode the last half second to catch downloads cut off after a front moov atom.
+CLIP_DECODE_TAIL = env_flag("CLIP_DECODE_TAIL", "1")
+CLIP_PROBE_CACHE_SIZE = int(os.getenv("CLIP_PROBE_CACHE_SIZE", "4096"))
+CLIP_PROBE_TIMEOUT_S = float(os.getenv("CLIP_PROBE_TIMEOUT_S", "30"))
+
+
+class ClipValidationError(RuntimeError):
+    """A scene's clip was still unusable after CLIP_MAX_ATTEMPTS provider calls."""
+
+    def __init__(self, scene_index: int, reason: str):
+        super().__init__(f"Scene {scene_index} clip invalid: {reason}")
+        self.scene_index = scene_index
+        self.reason = reason
+
+
+@dataclass(frozen=True)
+class ClipInfo:
+    path: str
+    size: int
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    vcodec: Optional[str] = None
+    pix_fmt: Optional[str] = None
+    fps: Optional[float] = None
+    has_audio: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@functools.lru_cache(maxsize=None)
+def _have_ffprobe() -> bool:
+    return shutil.which(FFPROBE_BIN) is not None
+
+
+def _rate(value: Optional[str]) -> Optional[float]:
+    try:
+        num, den = (value or "").split("/")
+        return float(num) / float(den) if float(den) else None
+    except ValueError:
+        return None
+
+
+def _probe_ffprobe(path: str, size: int) -> ClipInfo:
+    try:
+        info = ffprobe(path, timeout=CLIP_PROBE_TIMEOUT_S)
+    except (RuntimeError, ValueError) as e:
+        return ClipInfo(path, size, error=str(e).strip()[-300:])
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), None)
+    has_audio = any(s.get("codec_type") == "audio" for s in info.get("streams", []))
+    if video is None:
+        return ClipInfo(path, size, has_audio=has_audio, error="no video stream")
+    duration = info.get("format", {}).get("duration") or video.get("duration")
+    return ClipInfo(
+        path,
+        size,
+        duration=float(duration) if duration else None,
+        width=video.get("width"),
+        height=video.get("height"),
+        vcodec=video.get("codec_name"),
+        pix_fmt=video.get("pix_fmt"),
+        fps=_rate(video.get("avg_frame_rate")),
+        has_audio=has_audio,
+    )
+
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_RE = re.compile(r"Stream #\S+.*?: Video: (\w+).*?, (\w+)(?:\(.*?\))?, (\d+)x(\d+)(?:.*?, ([\d.]+) fps)?")
+
+
+def _probe_ffmpeg(path: str, size: int) -> ClipInfo:
+    """Fallback for hosts without ffprobe: parse `ffmpeg -i` output."""
+    try:
+        proc = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-i", path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=CLIP_PROBE_TIMEOUT_S,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return ClipInfo(path, size, error=f"probe failed: {e}")
+    err = proc.stderr.decode("utf-8", errors="replace")
+    video = _VIDEO_RE.search(err)
+    if video is None:
+        return ClipInfo(path, size, error=err.strip().splitlines()[-1] if err.strip() else "no video stream")
+    m = _DURATION_RE.search(err)
+    duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)) if m else None
+    return ClipInfo(
+        path,
+        size,
+        duration=duration,
+        width=int(video.group(3)),
+        height=int(video.group(4)),
+        vcodec=video.group(1),
+        pix_fmt=video.group(2),
+        fps=float(video.group(5)) if video.group(5) else None,
+        has_audio="Audio:" in err,
+    )
+
+
+# (path, size, mtime_ns) -> ClipInfo; a rewritten file never hits a stale entry
+_cache: "OrderedDict[Tuple[str, int, int], ClipInfo]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def probe_clip(path: str) -> ClipInfo:
+    """Probe a clip (cached by path, size and mtime)."""
+    path = str(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ClipInfo(path, 0, error="missing")
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            return info
+
+    if st.st_size < CLIP_MIN_BYTES:
+        info = ClipInfo(path, st.st_size, error=f"too small ({st.st_size} bytes)")
+    elif _have_ffprobe():
+        info = _probe_ffprobe(path, st.st_size)
+    else:
+        info = _probe_ffmpeg(path, st.st_size)
+
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > CLIP_PROBE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def _decodes_to_end(path: str) -> Optional[str]:
+    try:
+        run_ffmpeg(["-sseof", "-0.5", "-i", path, "-map", "0:v:0", "-f", "null", "-"], timeout=CLIP_PROBE_TIMEOUT_S)
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        return f"tail does not decode: {str(e).strip()[-200:]}"
+    return None
+
+
+def validate_clip(path: str, scene: Dict[str, Any]) -> ClipInfo:
+    """Probe a clip and check it against what the scene asked for."""
+    info = probe_clip(path)
+    if not info.ok:
+        return info
+    expected = float(scene.get("duration") or 0)
+    if info.duration is not None and expected and info.duration < expected * CLIP_MIN_DURATION_RATIO:
+        return ClipInfo(**{**info.__dict__, "error": f"too short ({info.duration:.2f}s of {expected:.0f}s)"})
+    if CLIP_DECODE_TAIL:
+        error = _decodes_to_end(path)
+        if error:
+            return ClipInfo(**{**info.__dict__, "error": error})
+    return info
+
+
+def _reuse_keys(scene: Dict[str, Any], provider: str) -> Optional[Tuple[str, str, str]]:
+    """(exact key, similarity group, free text) of a scene for the clip index."""
+    canon = scene.get("canon")
+    if not canon:
+        return None
+    if scene.get("frame0_sha"):
+        # Chained renders start from a specific frame; only the same frame gives the same clip
+        canon = {**canon, "frame0": scene["frame0_sha"]}
+    args = (canon, scene.get("product", ""), scene.get("duration"), scene.get("aspect_ratio"))
+    return f"{provider}:{shot_key(*args)}", f"{provider}:{shot_group(*args)}", shot_text(canon)
+
+
+def _reuse_clip(scene: Dict[str, Any], job_id: str, keys: Tuple[str, str, str]) -> Optional[str]:
+    """Link an already rendered, still valid clip for this scene into the job, if one exists."""
+    index = get_clip_index()
+    hit = index.lookup(*keys, mode=scene.get("clip_reuse") or CLIP_REUSE)
+    if hit is None:
+        return None
+    src, score = hit
+    dst = get_media_store().scene_clip_path(job_id, scene)
+    link_or_copy(src, dst)
+    if not validate_clip(str(dst), scene).ok:
+        dst.unlink(missing_ok=True)
+        return None
+    logger.info(f"Scene {scene['index']} reuses {src} (similarity {score:.2f})")
+    # Point the index at the newest copy so it outlives the source job
+    index.add(*keys, path=str(dst))
+    return str(dst)
+
+
+def _damaged(reason: str) -> bool:
+    """True if a rejection points at the file (cut off, unreadable) rather than the render itself."""
+    return not reason.startswith(("too short", "no video stream"))
+
+
+def generate_valid_clip(scene: Dict[str, Any], job_id: str) -> str:
+    """
+    generate_clip + validation. A damaged download is fetched once more from
+    the provider's output URL; a clip that is still bad is deleted and only
+    that scene is rendered again, up to CLIP_MAX_ATTEMPTS.
+    Scenes matching an earlier render (per scene["clip_reuse"] or CLIP_REUSE)
+    reuse it instead of calling the provider.
+    """
+    provider = select_provider()
+    keys = _reuse_keys(scene, provider)
+    if keys is not None:
+        start = time.perf_counter()
+        reused = _reuse_clip(scene, job_id, keys)
+        if reused:
+            record_clip(provider, scene, time.perf_counter() - start, reused=True)
+            return reused
+
+    reason = ""
+    for attempt in range(1, CLIP_MAX_ATTEMPTS + 1):
+        if attempt > 1:
+            check_deadline("render")
+        with get_scheduler("render").slot():
+            start = time.perf_counter()
+            path = generate_clip(scene, job_id=job_id, provider=provider)
+        # Rejected attempts are billed too
+        record_clip(provider, scene, time.perf_counter() - start)
+        info = validate_clip(path, scene)
+        if not info.ok and _damaged(info.error or "") and redownload_clip(path):
+            logger.warning(f"Scene {scene['index']} clip re-downloaded: {info.error}")
+            info = validate_clip(path, scene)
+        if info.ok:
+            if keys is not None:
+                get_clip_index().add(*keys, path=path)
+            return path
+        reason = info.error or "invalid"
+        logger.warning(f"Scene {scene['index']} clip rejected (attempt {attempt}/{CLIP_MAX_ATTEMPTS}): {reason}")
+        Path(path).unlink(missing_ok=True)
+    raise ClipValidationError(scene["index"], reason)
+
+
+def concat_compatible(infos: List[ClipInfo]) -> bool:
+    """True if the clips can be joined with `-c copy` (same codec, size, pixel format, audio layout)."""
+    if not infos:
+        return True
+    first = infos[0]
+    return all(
+        (i.vcodec, i.width, i.height, i.pix_fmt, i.has_audio)
+        == (first.vcodec, first.width, first.height, first.pix_fmt, first.has_audio)
+        for i in infos
+    )
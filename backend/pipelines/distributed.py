@@ -0,0 +1,313 @@
+# backend/pipelines/distributed.py
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.accounting import job_ledger, stage_timer
+from backend.deadline import Deadline, DeadlineExceeded, deadline_scope
+from backend.pipelines.media_workers import PRIORITY_INTERACTIVE, priority_scope
+from backend.scheduler import current_tenant, tenant_scope
+from backend.storage.media_store import get_media_store
+from backend.storage.object_store import get_object_store
+from backend.work_queue import QUEUE_LEASE_S, QUEUE_PURGE_INTERVAL_S, get_work_queue
+
+logger = logging.getLogger(__name__)
+
+TASK_PLAN = "plan"
+TASK_RENDER = "render"
+TASK_CONCAT = "concat"
+TASK_KINDS = (TASK_PLAN, TASK_RENDER, TASK_CONCAT)
+
+# Idle workers poll the queue this often.
+WORKER_POLL_S = float(os.getenv("WORKER_POLL_S", "1.0"))
+
+_fetch_lock = threading.Lock()
+
+
+def clip_key(job_id: str, scene: Dict[str, Any]) -> str:
+    return f"jobs/{job_id}/clips/{get_media_store().scene_clip_path(job_id, scene).name}"
+
+
+def final_prefix(job_id: str) -> str:
+    return f"jobs/{job_id}/final"
+
+
+def submit_video_job(
+    product_description: str,
+    max_scenes: int = 4,
+    best_of: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    renditions: Optional[List[str]] = None,
+    fit: str = "auto",
+    hls: Optional[bool] = None,
+    clip_reuse: Optional[str] = None,
+    keyframes: Optional[str] = None,
+    storyboard: Optional[Dict[str, Any]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
+    """
+    Queue a video job for the workers; returns its job id. The plan task
+    fans out into one render task per scene (chained scenes wait for their
+    parent) and a concat task that waits for every render.
+    """
+    job_id = str(uuid.uuid4())
+    request = {
+        "product_description": product_description,
+        "max_scenes": max_scenes,
+        "best_of": best_of,
+        "renditions": renditions or [],
+        "fit": fit,
+        "hls": hls,
+        "clip_reuse": clip_reuse,
+        "keyframes": keyframes,
+        "storyboard": storyboard,
+    }
+    get_work_queue().create_job(
+        job_id=job_id,
+        kind="video",
+        request=request,
+        tasks=[{"task_id": f"{job_id}:plan", "kind": TASK_PLAN}],
+        priority=priority,
+        tenant=current_tenant(),
+        deadline_at=time.time() + deadline_s if deadline_s else None,
+    )
+    return job_id
+
+
+# ---- task handlers ------------------------------------------------------
+# Each returns (task result, follow-up tasks, job result or None).
+
+
+def _renditions(request: Dict[str, Any]) -> List[Any]:
+    from backend.pipelines.renditions import parse_rendition
+
+    return [parse_rendition(spec, fit=request.get("fit", "auto")) for spec in request.get("renditions") or []]
+
+
+def run_plan(task: Dict[str, Any]) -> Any:
+    from backend.agents.planner import plan_storyboard
+    from backend.agents.scene_agent import storyboard_to_scene_prompts
+    from backend.pipelines.keyframes import chain_parents, KEYFRAME_CHAIN
+
+    job_id, request = task["job_id"], task["request"]
+    storyboard = request.get("storyboard")
+    if not storyboard:
+        with stage_timer("plan"):
+            storyboard = plan_storyboard(
+                request["product_description"], max_scenes=request["max_scenes"], best_of=request.get("best_of")
+            )
+    renditions = _renditions(request)
+    aspect_ratio = renditions[0].aspect_ratio if renditions else "16:9"
+    scenes = storyboard_to_scene_prompts(storyboard, request["product_description"], default_aspect_ratio=aspect_ratio)
+    if request.get("clip_reuse"):
+        for scene in scenes:
+            scene["clip_reuse"] = request["clip_reuse"]
+
+    parents = chain_parents(scenes, request.get("keyframes") or KEYFRAME_CHAIN)
+    renders = [
+        {
+            "task_id": f"{job_id}:render:{i}",
+            "kind": TASK_RENDER,
+            "payload": {"scene": scene, "parent": scenes[parents[i]] if parents[i] is not None else None},
+            "deps": [f"{job_id}:render:{parents[i]}"] if parents[i] is not None else [],
+        }
+        for i, scene in enumerate(scenes)
+    ]
+    concat = {
+        "task_id": f"{job_id}:concat",
+        "kind": TASK_CONCAT,
+        "payload": {"scenes": scenes},
+        "deps": [r["task_id"] for r in renders],
+    }
+    return {"storyboard": storyboard, "scene_count": len(scenes)}, [*renders, concat], None
+
+
+def _local_clip(job_id: str, scene: Dict[str, Any]) -> str:
+    """The scene's clip on this node, downloaded from the object store unless already here."""
+    path = get_media_store().scene_clip_path(job_id, scene)
+    key = clip_key(job_id, scene)
+    size = get_object_store().list(key.rsplit("/", 1)[0]).get(key)
+    if size is None:
+        raise RuntimeError(f"Clip {key} is missing from the object store")
+    if not path.exists() or path.stat().st_size != size:
+        get_object_store().get_file(key, path)
+    return str(path)
+
+
+def run_render(task: Dict[str, Any]) -> Any:
+    from backend.pipelines.keyframes import render_chained_clip
+
+    job_id, scene, parent = task["job_id"], task["payload"]["scene"], task["payload"]["parent"]
+    get_media_store().begin_job(job_id)
+    with stage_timer("render"):
+        if parent is None:
+            path = render_chained_clip(scene, job_id)
+        else:
+            path = render_chained_clip(scene, job_id, parent, _local_clip(job_id, parent))
+    key = clip_key(job_id, scene)
+    get_object_store().put_file(key, Path(path))
+    return {"clip_key": key}, None, None
+
+
+def run_concat(task: Dict[str, Any]) -> Any:
+    from backend.pipelines.video_pipeline import finalize_job
+
+    job_id, request, scenes = task["job_id"], task["request"], task["payload"]["scenes"]
+    get_media_store().begin_job(job_id)
+    clip_paths = [_local_clip(job_id, scene) for scene in scenes]
+    result = finalize_job(job_id, scenes, clip_paths, _renditions(request), hls=request.get("hls"))
+
+    store = get_object_store()
+    final_dir = get_media_store().job_dir(job_id) / "final"
+    for path in sorted(p for p in final_dir.rglob("*") if p.is_file()):
+        store.put_file(f"{final_prefix(job_id)}/{path.relative_to(final_dir).as_posix()}", path)
+    return {"final_prefix": final_prefix(job_id)}, None, result
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    TASK_PLAN: run_plan,
+    TASK_RENDER: run_render,
+    TASK_CONCAT: run_concat,
+}
+
+
+def fetch_job_media(job_id: str) -> bool:
+    """
+    Make a job finished by some other node servable here: copy its final/
+    outputs from the object store into the local media store and commit
+    them. False if the object store has nothing for the job.
+    """
+    media = get_media_store()
+    if media.committed_final(job_id) is not None:
+        return True
+    objects = get_object_store().list(final_prefix(job_id))
+    if not objects:
+        return False
+    with _fetch_lock:
+        if media.committed_final(job_id) is not None:
+            return True
+        for key, size in objects.items():
+            dst = media.final_path(job_id, key[len(final_prefix(job_id)) + 1:])
+            if not dst.exists() or dst.stat().st_size != size:
+                get_object_store().get_file(key, dst)
+        media.commit_job(job_id)
+    return True
+
+
+# ---- workers ------------------------------------------------------------
+
+
+def _heartbeat(queue: Any, task_id: str, worker: str, lease_s: float, stop: threading.Event, lost: threading.Event) -> None:
+    while not stop.wait(lease_s / 3):
+        try:
+            if not queue.heartbeat(task_id=task_id, worker=worker, lease_s=lease_s):
+                logger.warning(f"Lost lease on task {task_id}; its result will be discarded")
+                lost.set()
+                return
+        except Exception as e:
+            # A missed heartbeat is fine as long as a later one lands inside the lease
+            logger.warning(f"Heartbeat for task {task_id} failed: {e}")
+
+
+def _purge(queue: Any, stop: threading.Event) -> None:
+    # Every worker does this; a purge that finds nothing to delete is cheap
+    while True:
+        try:
+            purged = queue.purge()
+            if purged:
+                logger.info(f"Purged {purged} finished jobs from the queue")
+        except Exception as e:
+            logger.warning(f"Queue purge failed: {e}")
+        if stop.wait(QUEUE_PURGE_INTERVAL_S):
+            return
+
+
+def run_task(queue: Any, task: Dict[str, Any], worker: str, lease_s: float = QUEUE_LEASE_S) -> None:
+    """Run one claimed task under its job's deadline, priority and tenant, heartbeating its lease."""
+    stop, lost = threading.Event(), threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat, args=(queue, task["task_id"], worker, lease_s, stop, lost), daemon=True
+    )
+    beat.start()
+    deadline = None
+    if task.get("deadline_at"):
+        deadline = Deadline(task["deadline_at"] - time.time())
+    try:
+        with deadline_scope(deadline), priority_scope(task["priority"]), tenant_scope(task["tenant"]):
+            with job_ledger(f"queue_{task['kind']}"):
+                if deadline is not None:
+                    deadline.check(task["kind"])
+                result, then, job_result = HANDLERS[task["kind"]](task)
+    except DeadlineExceeded as e:
+        queue.fail(task_id=task["task_id"], worker=worker, error=str(e), retry=False)
+        return
+    except Exception as e:
+        logger.error(f"Task {task['task_id']} failed (attempt {task['attempts']}): {e}\n{traceback.format_exc()}")
+        queue.fail(task_id=task["task_id"], worker=worker, error=f"{type(e).__name__}: {e}")
+        return
+    finally:
+        stop.set()
+    if lost.is_set() or not queue.complete(
+        task_id=task["task_id"], worker=worker, result=result, then=then, job_result=job_result
+    ):
+        logger.warning(f"Task {task['task_id']} finished after its lease or its job moved on; result dropped")
+
+
+def run_worker(
+    concurrency: int = 4,
+    kinds: Optional[List[str]] = None,
+    lease_s: float = QUEUE_LEASE_S,
+    stop: Optional[threading.Event] = None,
+    max_tasks: Optional[int] = None,
+) -> int:
+    """
+    Claim and run tasks with `concurrency` threads until `stop` is set (or
+    `max_tasks` have run). Start more worker processes, here or on other
+    hosts, to scale out; they coordinate only through the queue and the
+    object store. Returns the number of tasks run.
+    """
+    queue = get_work_queue()
+    stop = stop or threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    done = [0]
+    lock = threading.Lock()
+
+    def _loop(n: int) -> None:
+        worker = f"{prefix}:{n}"
+        while not stop.is_set():
+            with lock:
+                if max_tasks is not None and done[0] >= max_tasks:
+                    return
+            try:
+                task = queue.claim(worker=worker, kinds=kinds, lease_s=lease_s)
+            except Exception as e:
+                logger.warning(f"Queue claim failed: {e}")
+                task = None
+            if task is None:
+                stop.wait(WORKER_POLL_S)
+                continue
+            logger.info(f"{worker} running {task['task_id']}")
+            run_task(queue, task, worker, lease_s)
+            with lock:
+                done[0] += 1
+
+    threads = [threading.Thread(target=_loop, args=(n,), name=f"queue-worker-{n}") for n in range(max(1, concurrency))]
+    if QUEUE_PURGE_INTERVAL_S > 0:
+        threading.Thread(target=_purge, args=(queue, stop), name="queue-purge", daemon=True).start()
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1.0)
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+    return done[0]
@@ -0,0 +1,101 @@
+# backend/pipelines/ffmpeg_tools.py
+import functools
+import json
+import logging
+import os
+import subprocess
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from backend.pipelines.media_workers import apply_limits, media_slot, release_limits
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+
+def run_ffmpeg(args: List[str], timeout: Optional[float] = None) -> None:
+    """
+    Run ffmpeg with the given arguments (without the binary name).
+    Waits for a media worker slot (by the caller's priority), and the process
+    runs niced/pinned/memory-capped per MEDIA_WORKER_* settings.
+    Raises RuntimeError with the tail of stderr if ffmpeg fails, and
+    subprocess.TimeoutExpired if queueing plus running takes longer than
+    `timeout` seconds.
+    """
+    cmd = [FFMPEG_BIN, "-hide_banner", "-loglevel", "error", "-y", *args]
+    try:
+        with media_slot(timeout) as remaining:
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            cgroup = apply_limits(proc.pid)
+            try:
+                _, stderr = proc.communicate(timeout=remaining)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+            finally:
+                release_limits(cgroup)
+    except TimeoutError as e:
+        # No slot freed up in time; same failure as running too long
+        raise subprocess.TimeoutExpired(cmd, timeout) from e
+    if proc.returncode != 0:
+        err = stderr.decode("utf-8", errors="replace")[-2000:]
+        raise RuntimeError(f"ffmpeg failed ({proc.returncode}): {err}")
+
+
+@functools.lru_cache(maxsize=None)
+def available_filters() -> Set[str]:
+    """
+    Names of the filters compiled into the local ffmpeg build.
+    Builds differ (e.g. drawtext needs libfreetype), so callers check before use.
+    """
+    try:
+        out = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-filters"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout.decode("utf-8", errors="replace")
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not list ffmpeg filters: {e}")
+        return set()
+
+    names: Set[str] = set()
+    for line in out.splitlines():
+        parts = line.split()
+        # Filter rows look like: " TSC drawtext  V->V  Draw text ..."
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return names
+
+
+def ffprobe(path: str, timeout: float = 30) -> Dict[str, Any]:
+    """ffprobe -show_format -show_streams as a dict. Raises RuntimeError if probing fails."""
+    cmd = [
+        FFPROBE_BIN, "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        str(path),
+    ]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise RuntimeError(f"ffprobe failed for {path}: {e}")
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", errors="replace")[-500:]
+        raise RuntimeError(f"ffprobe failed for {path}: {err}")
+    return json.loads(proc.stdout or b"{}")
+
+
+def video_dimensions(path: str) -> Optional[Tuple[int, int]]:
+    """(width, height) of the first video stream, or None if it can't be probed."""
+    try:
+        info = ffprobe(path)
+    except RuntimeError as e:
+        logger.warning(str(e))
+        return None
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == "video":
+            return int(stream["width"]), int(stream["height"])
+    return None
@@ -0,0 +1,165 @@
+# backend/pipelines/keyframes.py
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.accounting import stage_timer
+from backend.agents.timing import output_duration
+from backend.deadline import check_deadline, run_in_context, stage_timeout
+from backend.pipelines.clip_check import generate_valid_clip, probe_clip
+from backend.pipelines.ffmpeg_tools import run_ffmpeg
+from backend.storage.media_store import get_media_store
+
+logger = logging.getLogger(__name__)
+
+KEYFRAMES_OFF = "off"
+KEYFRAMES_SETTING = "setting"  # chain consecutive scenes in the same setting
+KEYFRAMES_ALL = "all"          # chain every scene to the one before it
+KEYFRAME_MODES = (KEYFRAMES_OFF, KEYFRAMES_SETTING, KEYFRAMES_ALL)
+
+KEYFRAME_CHAIN = os.getenv("KEYFRAME_CHAIN", KEYFRAMES_OFF)
+# Public base URL of this API (e.g. https://api.example.com), so hosted providers
+# can fetch /jobs/{job_id}/keyframes/...; without it they render text-to-video.
+KEYFRAME_PUBLIC_BASE_URL = os.getenv("KEYFRAME_PUBLIC_BASE_URL", "").rstrip("/")
+KEYFRAME_TIMEOUT_S = float(os.getenv("KEYFRAME_TIMEOUT_S", "60"))
+KEYFRAME_CACHE_SIZE = int(os.getenv("KEYFRAME_CACHE_SIZE", "4096"))
+# Scenes of one wave rendered at the same time.
+SCENE_RENDER_WORKERS = int(os.getenv("SCENE_RENDER_WORKERS", "4"))
+
+# (clip path, size, mtime, cut end) -> extracted frame path
+_frame_cache: "OrderedDict[Tuple[str, int, int, float], str]" = OrderedDict()
+_frame_lock = threading.Lock()
+
+
+def _settings(scene: Dict[str, Any]) -> List[str]:
+    # Packed scenes join their shots' fields with " / "
+    return [s.strip() for s in str((scene.get("canon") or {}).get("context", "")).split(" / ")]
+
+
+def _same_setting(prev: Dict[str, Any], scene: Dict[str, Any]) -> bool:
+    # Scenes without a known setting are unrelated, not "the same"
+    last, first = _settings(prev)[-1], _settings(scene)[0]
+    return bool(last) and last == first
+
+
+def chain_parents(scenes: List[Dict[str, Any]], mode: str = KEYFRAME_CHAIN) -> List[Optional[int]]:
+    """For each scene, the index of the scene whose last frame it starts from, or None."""
+    parents: List[Optional[int]] = []
+    for i, scene in enumerate(scenes):
+        if i == 0 or mode == KEYFRAMES_OFF:
+            parents.append(None)
+        elif mode == KEYFRAMES_ALL or _same_setting(scenes[i - 1], scene):
+            parents.append(i - 1)
+        else:
+            parents.append(None)
+    return parents
+
+
+def render_waves(parents: List[Optional[int]]) -> List[List[int]]:
+    """
+    Scenes grouped so each wave only depends on earlier ones: wave 0 is every
+    chain head, wave 1 their successors, and so on. Scenes in a wave render
+    concurrently, so a storyboard that changes setting twice renders three
+    chains side by side instead of one scene at a time.
+    """
+    depth: List[int] = []
+    for parent in parents:
+        depth.append(0 if parent is None else depth[parent] + 1)
+    waves: List[List[int]] = [[] for _ in range(max(depth, default=-1) + 1)]
+    for i, d in enumerate(depth):
+        waves[d].append(i)
+    return waves
+
+
+def extract_last_frame(clip_path: str, scene: Dict[str, Any], dst: Path) -> Optional[Path]:
+    """
+    JPEG of the last frame the final cut keeps of a scene's clip (the end
+    of its last trimmed segment, else the clip's end). Cached by clip
+    file identity; returns None if the frame can't be extracted.
+    """
+    st = os.stat(clip_path)
+    segments = scene.get("segments")
+    end = float(segments[-1]["start"]) + float(segments[-1]["duration"]) if segments else output_duration(scene)
+    duration = probe_clip(clip_path).duration
+    if duration is not None:
+        end = min(end, duration) if end else duration
+    key = (str(clip_path), st.st_size, st.st_mtime_ns, round(end, 3))
+    with _frame_lock:
+        cached = _frame_cache.get(key)
+        if cached is not None and os.path.exists(cached):
+            _frame_cache.move_to_end(key)
+            if cached != str(dst):
+                # Reused clip: same frame, new job
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                dst.write_bytes(Path(cached).read_bytes())
+            return dst
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".part.jpg")
+    # Decode the last quarter second up to `end` and keep overwriting one image
+    seek = ["-ss", f"{max(0.0, end - 0.25):.3f}", "-t", f"{min(0.25, end):.3f}"] if end else ["-sseof", "-0.25"]
+    try:
+        run_ffmpeg(
+            [*seek, "-i", clip_path, "-an", "-update", "1", "-q:v", "2", str(tmp)],
+            timeout=stage_timeout("keyframe", KEYFRAME_TIMEOUT_S),
+        )
+        os.replace(tmp, dst)
+    except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not extract last frame of {clip_path}: {e}")
+        tmp.unlink(missing_ok=True)
+        return None
+
+    with _frame_lock:
+        _frame_cache[key] = str(dst)
+        while len(_frame_cache) > KEYFRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return dst
+
+
+def keyframe_url(job_id: str, frame: str) -> Optional[str]:
+    """Where a provider can download a job's keyframe, if this API is publicly reachable."""
+    if not KEYFRAME_PUBLIC_BASE_URL:
+        return None
+    return f"{KEYFRAME_PUBLIC_BASE_URL}/jobs/{job_id}/keyframes/{Path(frame).name}"
+
+
+def render_chained_clip(
+    scene: Dict[str, Any],
+    job_id: str,
+    parent: Optional[Dict[str, Any]] = None,
+    parent_clip: Optional[str] = None,
+) -> str:
+    """generate_valid_clip, starting from the parent scene's last frame when there is one."""
+    if parent is not None and parent_clip:
+        frame = extract_last_frame(parent_clip, parent, get_media_store().keyframe_path(job_id, parent))
+        if frame is not None:
+            digest = hashlib.sha256(frame.read_bytes()).hexdigest()
+            scene = {**scene, "frame0": str(frame), "frame0_sha": digest}
+    return generate_valid_clip(scene, job_id=job_id)
+
+
+def render_scenes(scenes: List[Dict[str, Any]], job_id: str, mode: Optional[str] = None) -> List[str]:
+    """Render every scene's clip in dependency waves; returns clip paths in scene order."""
+    parents = chain_parents(scenes, mode or KEYFRAME_CHAIN)
+    paths: List[Optional[str]] = [None] * len(scenes)
+
+    def _render(i: int) -> str:
+        parent = parents[i]
+        with stage_timer("render"):
+            if parent is None:
+                return render_chained_clip(scenes[i], job_id)
+            return render_chained_clip(scenes[i], job_id, scenes[parent], paths[parent])
+
+    with ThreadPoolExecutor(max_workers=max(1, SCENE_RENDER_WORKERS), thread_name_prefix="scene-render") as pool:
+        for wave in render_waves(parents):
+            check_deadline("render")
+            futures = [(i, pool.submit(run_in_context(_render), i)) for i in wave]
+            for i, fut in futures:
+                paths[i] = fut.result()
+    return [p for p in paths if p is not None]
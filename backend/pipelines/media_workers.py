@@ -0,0 +1,192 @@
+# backend/pipelines/media_workers.py
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from backend.config import process_singleton
+
+logger = logging.getLogger(__name__)
+
+# Concurrent ffmpeg processes per API/worker process.
+MEDIA_WORKER_SLOTS = int(os.getenv("MEDIA_WORKER_SLOTS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Added to ffmpeg's niceness so encodes yield to request handling.
+MEDIA_WORKER_NICE = int(os.getenv("MEDIA_WORKER_NICE", "10"))
+# CPUs ffmpeg may run on, e.g. "2-7" or "4,5,6"; empty = no pinning.
+MEDIA_WORKER_CPUS = os.getenv("MEDIA_WORKER_CPUS", "")
+# Per-process memory cap in MB (0 = none). Enforced with a cgroup v2 memory.max
+# when MEDIA_WORKER_CGROUP points at a delegated cgroup directory, else RLIMIT_AS.
+MEDIA_WORKER_MEM_MB = int(os.getenv("MEDIA_WORKER_MEM_MB", "0"))
+MEDIA_WORKER_CGROUP = os.getenv("MEDIA_WORKER_CGROUP", "")
+
+# Lower runs first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BATCH = 10
+
+_priority: "contextvars.ContextVar[int]" = contextvars.ContextVar("velocity2_media_priority", default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def priority_scope(priority: int) -> Iterator[None]:
+    """ffmpeg work started inside the block queues at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class SlotPool:
+    """
+    Counting semaphore whose waiters are served by priority, then FIFO.
+    A freed slot goes straight to the best waiter, so a stream of batch
+    encodes can't keep an interactive request waiting behind them.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._waiters: List[Any] = []  # heap of [priority, seq, event, granted]
+        self._seq = itertools.count()
+
+    def acquire(self, priority: int, timeout: Optional[float] = None) -> bool:
+        entry = [priority, next(self._seq), threading.Event(), False]
+        with self._lock:
+            heapq.heappush(self._waiters, entry)
+            self._grant()
+            if entry[3]:
+                return True
+        entry[2].wait(timeout)
+        with self._lock:
+            if entry[3]:
+                return True
+            # Timed out: leave the queue (mark dead; _grant skips it)
+            entry[3] = None
+            return False
+
+    def release(self) -> None:
+        with self._lock:
+            self.busy -= 1
+            self._grant()
+
+    def _grant(self) -> None:
+        while self._waiters and self.busy < self.slots:
+            entry = heapq.heappop(self._waiters)
+            if entry[3] is None:
+                continue
+            entry[3] = True
+            self.busy += 1
+            entry[2].set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queued: Dict[int, int] = {}
+            for priority, _, _, granted in self._waiters:
+                if granted is False:
+                    queued[priority] = queued.get(priority, 0) + 1
+            return {"slots": self.slots, "busy": self.busy, "queued": queued}
+
+
+_gating = True
+
+
+@process_singleton
+def get_slot_pool() -> SlotPool:
+    return SlotPool(MEDIA_WORKER_SLOTS)
+
+
+def disable_gating() -> None:
+    """For child processes whose work the parent already holds a slot for."""
+    global _gating
+    _gating = False
+
+
+@contextmanager
+def media_slot(timeout: Optional[float] = None, priority: Optional[int] = None) -> Iterator[Optional[float]]:
+    """
+    Hold one media worker slot for the block. Yields what is left of
+    `timeout` after queueing; raises TimeoutError if no slot frees up in time.
+    """
+    if not _gating:
+        yield timeout
+        return
+    pool = get_slot_pool()
+    started = time.monotonic()
+    if not pool.acquire(current_priority() if priority is None else priority, timeout):
+        raise TimeoutError("Timed out waiting for a media worker slot")
+    try:
+        yield None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+    finally:
+        pool.release()
+
+
+def _parse_cpus(spec: str) -> Set[int]:
+    cpus: Set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def apply_limits(pid: int) -> Optional[Path]:
+    """
+    Lower priority, pin and memory-cap a freshly started ffmpeg from the
+    parent (no preexec_fn, which isn't safe with threads). Returns the
+    per-process cgroup to remove afterwards, if one was created.
+    Each limit is best effort: unsupported platforms just skip it.
+    """
+    try:
+        if MEDIA_WORKER_NICE:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + MEDIA_WORKER_NICE)
+        if MEDIA_WORKER_CPUS:
+            os.sched_setaffinity(pid, _parse_cpus(MEDIA_WORKER_CPUS))
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Could not set nice/affinity for {pid}: {e}")
+
+    if MEDIA_WORKER_MEM_MB <= 0:
+        return None
+    limit = MEDIA_WORKER_MEM_MB * 1024 * 1024
+    if MEDIA_WORKER_CGROUP:
+        cgroup = Path(MEDIA_WORKER_CGROUP) / f"ffmpeg-{pid}"
+        try:
+            cgroup.mkdir(exist_ok=True)
+            (cgroup / "memory.max").write_text(str(limit))
+            (cgroup / "cgroup.procs").write_text(str(pid))
+            return cgroup
+        except OSError as e:
+            logger.debug(f"cgroup limit unavailable ({e}); falling back to RLIMIT_AS")
+            try:
+                cgroup.rmdir()
+            except OSError:
+                pass
+    try:
+        import resource
+
+        resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, AttributeError, OSError) as e:
+        logger.debug(f"Could not set memory limit for {pid}: {e}")
+    return None
+
+
+def release_limits(cgroup: Optional[Path]) -> None:
+    if cgroup is not None:
+        try:
+            cgroup.rmdir()
+        except OSError:
+            pass
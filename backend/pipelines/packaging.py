@@ -0,0 +1,215 @@
+# backend/pipelines/packaging.py
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import env_flag, process_singleton
+from backend.deadline import raise_timeout, stage_timeout
+from backend.pipelines.ffmpeg_tools import run_ffmpeg, video_dimensions
+from backend.pipelines.media_workers import current_priority, disable_gating, get_slot_pool
+
+logger = logging.getLogger(__name__)
+
+# "<short side>:<video bitrate>" rungs, best first. Rungs above the source are skipped.
+PACKAGING_LADDER = os.getenv("PACKAGING_LADDER", "1080:5000k,720:2800k,480:1200k,360:700k")
+PACKAGING_ENABLED = env_flag("PACKAGING_ENABLED", "1")
+PACKAGING_HLS = env_flag("PACKAGING_HLS")
+PACKAGING_HLS_SEGMENT_S = int(os.getenv("PACKAGING_HLS_SEGMENT_S", "4"))
+PACKAGING_AUDIO_BITRATE = os.getenv("PACKAGING_AUDIO_BITRATE", "128k")
+PACKAGING_POSTER_AT_S = float(os.getenv("PACKAGING_POSTER_AT_S", "1.0"))
+PACKAGING_TIMEOUT_S = float(os.getenv("PACKAGING_TIMEOUT_S", "600"))
+# Encodes run in their own processes so they can't starve the API's threads;
+# each ffmpeg is also capped at PACKAGING_THREADS threads.
+PACKAGING_WORKERS = int(os.getenv("PACKAGING_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PACKAGING_THREADS = int(os.getenv("PACKAGING_THREADS", "2"))
+
+
+def parse_ladder(spec: str = PACKAGING_LADDER) -> List[Tuple[int, int]]:
+    """"720:2800k,480:1200k" -> [(720, 2800), (480, 1200)] (short side, kbps), best first."""
+    rungs = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        short_side, bitrate = part.split(":")
+        rungs.append((int(short_side), int(bitrate.lower().rstrip("k"))))
+    return sorted(rungs, reverse=True)
+
+
+def _rung_size(src_size: Tuple[int, int], short_side: int) -> Tuple[int, int]:
+    w, h = src_size
+    if w >= h:
+        return int(round(w * short_side / h / 2)) * 2, short_side
+    return short_side, int(round(h * short_side / w / 2)) * 2
+
+
+# ---- process-pool tasks (module-level so they pickle) ----------------------
+
+def _encode_rung(
+    src: str,
+    dst: str,
+    size: Tuple[int, int],
+    kbps: int,
+    hls_dir: Optional[str],
+    timeout: float,
+) -> None:
+    """One ladder rung: faststart MP4 with fixed keyframe spacing, optionally split into HLS segments."""
+    width, height = size
+    tmp = dst + ".part.mp4"
+    run_ffmpeg(
+        [
+            "-i", src,
+            "-map", "0:v:0", "-map", "0:a?",
+            "-vf", f"scale={width}:{height},setsar=1,format=yuv420p",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-b:v", f"{kbps}k",
+            "-maxrate", f"{int(kbps * 1.07)}k",
+            "-bufsize", f"{kbps * 2}k",
+            # Keyframes on segment boundaries so every rung splits identically
+            "-force_key_frames", f"expr:gte(t,n_forced*{PACKAGING_HLS_SEGMENT_S})",
+            "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", PACKAGING_AUDIO_BITRATE,
+            "-threads", str(PACKAGING_THREADS),
+            "-movflags", "+faststart",
+            tmp,
+        ],
+        timeout=timeout,
+    )
+    os.replace(tmp, dst)
+
+    if hls_dir:
+        Path(hls_dir).mkdir(parents=True, exist_ok=True)
+        run_ffmpeg(
+            [
+                "-i", dst,
+                "-c", "copy",
+                "-f", "hls",
+                "-hls_time", str(PACKAGING_HLS_SEGMENT_S),
+                "-hls_playlist_type", "vod",
+                "-hls_segment_filename", str(Path(hls_dir) / "seg_%03d.ts"),
+                str(Path(hls_dir) / "index.m3u8"),
+            ],
+            timeout=timeout,
+        )
+
+
+def _grab_frames(src: str, shots: List[Tuple[float, str, Optional[int]]], timeout: float) -> None:
+    """Write a JPEG at each (time, path, width) in `shots`; width None keeps full size."""
+    for at, dst, width in shots:
+        Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        vf = f"scale={width}:-2" if width else "null"
+        run_ffmpeg(
+            ["-ss", f"{at:.3f}", "-i", src, "-frames:v", "1", "-vf", vf, "-q:v", "3", dst],
+            timeout=timeout,
+        )
+
+
+@process_singleton
+def get_packaging_pool() -> ProcessPoolExecutor:
+    """Shared, bounded process pool for packaging encodes."""
+    # spawn, not fork: the API process has threads (GC, health checks, request pool)
+    return ProcessPoolExecutor(
+        max_workers=PACKAGING_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        # The parent holds the media worker slot for each task
+        initializer=disable_gating,
+    )
+
+
+def _submit(pool: ProcessPoolExecutor, timeout: float, fn: Any, *args: Any) -> Future:
+    """Submit once a media worker slot is free; the slot is released when the task ends."""
+    slots = get_slot_pool()
+    if not slots.acquire(current_priority(), timeout):
+        raise_timeout("packaging", TimeoutError("Timed out waiting for a media worker slot"))
+    try:
+        fut = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    fut.add_done_callback(lambda _: slots.release())
+    return fut
+
+
+def package_video(
+    src: str,
+    out_dir: str,
+    scenes: List[Dict[str, Any]],
+    hls: Optional[bool] = None,
+    ladder: Optional[List[Tuple[int, int]]] = None,
+) -> Dict[str, Any]:
+    """
+    Package a finished video: encoding ladder of faststart MP4s, optional
+    HLS (one variant playlist per rung plus a master playlist), a poster
+    frame and one thumbnail per scene. Writes under `out_dir`.
+    """
+    hls = PACKAGING_HLS if hls is None else hls
+    rungs = ladder or parse_ladder()
+    out = Path(out_dir)
+
+    from backend.integrations.local_render import frame_size
+
+    src_size = video_dimensions(src) or frame_size(scenes[0].get("aspect_ratio", "16:9") if scenes else "16:9")
+    src_short = min(src_size)
+    # Never upscale; keep at least the smallest rung
+    usable = [r for r in rungs if r[0] <= src_short] or [rungs[-1]]
+
+    timeout = stage_timeout("packaging", PACKAGING_TIMEOUT_S)
+    pool = get_packaging_pool()
+    tasks: List[Future] = []
+    ladder_out: List[Dict[str, Any]] = []
+
+    for short_side, kbps in usable:
+        size = _rung_size(src_size, short_side)
+        dst = out / "ladder" / f"{short_side}p.mp4"
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        hls_dir = out / "hls" / f"{short_side}p" if hls else None
+        if hls_dir is not None:
+            shutil.rmtree(hls_dir, ignore_errors=True)
+        tasks.append(_submit(pool, timeout, _encode_rung, src, str(dst), size, kbps, str(hls_dir) if hls_dir else None, timeout))
+        ladder_out.append({"short_side": short_side, "width": size[0], "height": size[1], "kbps": kbps, "path": str(dst)})
+
+    from backend.agents.timing import output_duration
+
+    total = sum(output_duration(s) for s in scenes)
+    shots = [(min(PACKAGING_POSTER_AT_S, total / 2) if total else 0.0, str(out / "poster.jpg"), None)]
+    start = 0.0
+    thumbnails = []
+    for scene in scenes:
+        duration = output_duration(scene)
+        path = str(out / "thumbs" / f"scene_{scene['index']}.jpg")
+        shots.append((start + duration / 2, path, 320))
+        thumbnails.append(path)
+        start += duration
+    tasks.append(_submit(pool, timeout, _grab_frames, src, shots, timeout))
+
+    try:
+        for fut in tasks:
+            fut.result()
+    except subprocess.TimeoutExpired as e:
+        for fut in tasks:
+            fut.cancel()
+        raise_timeout("packaging", e)
+
+    result: Dict[str, Any] = {
+        "ladder": ladder_out,
+        "poster": shots[0][1],
+        "thumbnails": thumbnails,
+        "hls": None,
+    }
+    if hls:
+        master = out / "hls" / "master.m3u8"
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        audio_kbps = int(PACKAGING_AUDIO_BITRATE.lower().rstrip("k"))
+        for rung in ladder_out:
+            bandwidth = int((rung["kbps"] * 1.07 + audio_kbps) * 1000)
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={rung['width']}x{rung['height']}")
+            lines.append(f"{rung['short_side']}p/index.m3u8")
+        master.write_text("\n".join(lines) + "\n")
+        result["hls"] = str(master)
+    return result
@@ -0,0 +1,195 @@
+# backend/pipelines/renditions.py
+import os
+import re
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.deadline import raise_timeout, run_in_context, stage_timeout
+from backend.integrations.local_render import frame_size
+from backend.pipelines.clip_check import generate_valid_clip
+from backend.pipelines.ffmpeg_tools import run_ffmpeg, video_dimensions
+from backend.storage.media_store import get_media_store
+
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "3"))
+RENDITION_TIMEOUT_S = float(os.getenv("RENDITION_TIMEOUT_S", "300"))
+# Crop from the master only if it keeps at least this share of the frame...
+RENDITION_MIN_CROP = float(os.getenv("RENDITION_MIN_CROP", "0.5"))
+# ...and the cropped region needs no more than this much upscaling.
+RENDITION_MAX_UPSCALE = float(os.getenv("RENDITION_MAX_UPSCALE", "2.0"))
+
+FIT_AUTO = "auto"      # crop from the master when it allows, else re-render
+FIT_CROP = "crop"
+FIT_PAD = "pad"        # letterbox/pillarbox the master, never loses content
+FIT_RENDER = "render"  # always re-render scenes at the target aspect
+FITS = (FIT_AUTO, FIT_CROP, FIT_PAD, FIT_RENDER)
+
+# codec name -> (ffmpeg encoder, default crf)
+CODECS = {
+    "h264": ("libx264", 23),
+    "hevc": ("libx265", 28),
+}
+
+_SPEC_RE = re.compile(r"^(\d+)[:x](\d+)(?:@(\d+))?(?::(\w+))?$")
+
+
+@dataclass(frozen=True)
+class Rendition:
+    aspect_ratio: str = "16:9"
+    short_side: int = 720
+    codec: str = "h264"
+    fit: str = FIT_AUTO
+
+    @property
+    def name(self) -> str:
+        return f"{self.aspect_ratio.replace(':', 'x')}_{self.short_side}_{self.codec}"
+
+    @property
+    def ratio(self) -> float:
+        w, h = self.aspect_ratio.split(":")
+        return float(w) / float(h)
+
+
+def parse_rendition(spec: str, fit: str = FIT_AUTO) -> Rendition:
+    """
+    "9:16", "9:16@1080" or "9:16@1080:hevc" -> Rendition.
+    Raises ValueError for anything else.
+    """
+    m = _SPEC_RE.match(spec.strip())
+    if not m or fit not in FITS:
+        raise ValueError(f"Bad rendition spec: {spec!r}")
+    w, h, short_side, codec = m.groups()
+    codec = (codec or "h264").lower()
+    if codec not in CODECS or int(w) == 0 or int(h) == 0:
+        raise ValueError(f"Bad rendition spec: {spec!r}")
+    return Rendition(f"{w}:{h}", int(short_side or 720), codec, fit)
+
+
+def _plan_fit(rendition: Rendition, master_size: Optional[Tuple[int, int]], master_ratio: float) -> str:
+    """Resolve FIT_AUTO to crop or render for this rendition."""
+    if rendition.fit != FIT_AUTO:
+        return rendition.fit
+    src_ratio = master_size[0] / master_size[1] if master_size else master_ratio
+    kept = min(src_ratio, rendition.ratio) / max(src_ratio, rendition.ratio)
+    if kept < RENDITION_MIN_CROP:
+        return FIT_RENDER
+    if master_size:
+        w, h = master_size
+        crop_w, crop_h = min(w, h * rendition.ratio), min(h, w / rendition.ratio)
+        target_w, target_h = frame_size(rendition.aspect_ratio, rendition.short_side)
+        if max(target_w / crop_w, target_h / crop_h) > RENDITION_MAX_UPSCALE:
+            return FIT_RENDER
+    return FIT_CROP
+
+
+def _fit_filter(rendition: Rendition, fit: str) -> str:
+    width, height = frame_size(rendition.aspect_ratio, rendition.short_side)
+    if fit == FIT_PAD:
+        return (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+        )
+    # Centre crop to the target aspect, then scale; a no-op crop when aspects match
+    w, h = rendition.aspect_ratio.split(":")
+    return (
+        f"crop=w='min(iw,ih*{w}/{h})':h='min(ih,iw*{h}/{w})',"
+        f"scale={width}:{height},setsar=1"
+    )
+
+
+def encode_rendition(src: str, dst: str, rendition: Rendition, fit: str) -> None:
+    """Crop/pad/scale `src` into `dst` with the rendition's codec."""
+    encoder, crf = CODECS[rendition.codec]
+    tmp = dst + ".part.mp4"
+    try:
+        run_ffmpeg(
+            [
+                "-i", src,
+                "-map", "0:v:0", "-map", "0:a?",
+                "-vf", _fit_filter(rendition, fit) + ",format=yuv420p",
+                "-c:v", encoder,
+                "-preset", "veryfast",
+                "-crf", str(crf),
+                "-c:a", "aac",
+                "-movflags", "+faststart",
+                tmp,
+            ],
+            timeout=stage_timeout("rendition", RENDITION_TIMEOUT_S),
+        )
+        os.replace(tmp, dst)
+    except subprocess.TimeoutExpired as e:
+        raise_timeout("rendition", e)
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+
+
+def build_renditions(
+    job_id: str,
+    scenes: List[Dict[str, Any]],
+    master_final: str,
+    renditions: List[Rendition],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Derive every rendition from one job. Renditions the master can serve
+    are cropped/padded from the master final video; the rest re-render their
+    scenes at the target aspect (as clip "variants") and concat those. All
+    re-renders, concats and encodes share one bounded pool.
+    """
+    from backend.pipelines.video_pipeline import assemble_clips
+
+    store = get_media_store()
+    master_ratio = Rendition(scenes[0]["aspect_ratio"] if scenes else "16:9").ratio
+    master_size = video_dimensions(master_final)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    encodes: List[Future] = []
+    pending_renders: List[Tuple[Rendition, List[Future]]] = []
+
+    with ThreadPoolExecutor(max_workers=RENDITION_WORKERS, thread_name_prefix="rendition") as pool:
+        for rendition in renditions:
+            if rendition.name in results:
+                continue
+            fit = _plan_fit(rendition, master_size, master_ratio)
+            out = str(store.final_path(job_id, f"final_{rendition.name}.mp4"))
+            results[rendition.name] = {
+                "aspect_ratio": rendition.aspect_ratio,
+                "short_side": rendition.short_side,
+                "codec": rendition.codec,
+                "method": fit,
+                "path": out,
+            }
+            if fit == FIT_RENDER:
+                variant = rendition.aspect_ratio.replace(":", "x")
+                clips = [
+                    pool.submit(
+                        run_in_context(generate_valid_clip),
+                        {**scene, "aspect_ratio": rendition.aspect_ratio, "variant": variant},
+                        job_id,
+                    )
+                    for scene in scenes
+                ]
+                pending_renders.append((rendition, clips))
+            else:
+                encodes.append(pool.submit(run_in_context(encode_rendition), master_final, out, rendition, fit))
+
+        # Concats wait on their clips here, not inside the pool, so workers never block on each other
+        for rendition, clips in pending_renders:
+            clip_paths = [f.result() for f in clips]
+            out = results[rendition.name]["path"]
+            joined = str(store.final_path(job_id, f"concat_{rendition.name}.mp4"))
+
+            def _concat_and_encode(clip_paths=clip_paths, joined=joined, out=out, rendition=rendition) -> None:
+                try:
+                    assemble_clips(clip_paths, scenes, joined)
+                    encode_rendition(joined, out, rendition, FIT_CROP)
+                finally:
+                    Path(joined).unlink(missing_ok=True)
+
+            encodes.append(pool.submit(run_in_context(_concat_and_encode)))
+
+        for fut in encodes:
+            fut.result()
+
+    return results
@@ -59,26 +59,36 @@
 #     }
 
 # backend/pipelines/video_pipeline.py
+import os
 import subprocess
 import uuid
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 
+from backend.accounting import set_job_id, stage_timer
 from backend.agents.scene_agent import storyboard_to_scene_prompts
-from backend.integrations.pika_client import generate_clip_with_pika
-from backend.integrations.video_client import generate_clip
+from backend.agents.timing import needs_trim
+from backend.deadline import raise_timeout, stage_timeout
+from backend.pipelines.clip_check import concat_compatible, probe_clip
+from backend.pipelines.ffmpeg_tools import run_ffmpeg
+from backend.pipelines.keyframes import render_scenes
+from backend.pipelines.packaging import PACKAGING_ENABLED, package_video
+from backend.storage.media_store import get_media_store
 
-MEDIA_ROOT = Path("media")
-FINAL_DIR = MEDIA_ROOT / "final"
-FINAL_DIR.mkdir(parents=True, exist_ok=True)
+if TYPE_CHECKING:
+    from backend.pipelines.renditions import Rendition
+
+CONCAT_TIMEOUT_S = float(os.getenv("CONCAT_TIMEOUT_S", "300"))
 
 
 def concat_videos_ffmpeg(input_files: List[str], output_file: str) -> None:
     """
     Concatenate MP4 files using ffmpeg concat demuxer.
     Creates a temporary file list and runs:
-      ffmpeg -f concat -safe 0 -i list.txt -c copy output.mp4
+      ffmpeg -f concat -safe 0 -i list.txt -c copy -movflags +faststart output.mp4
     [web:149][web:150][web:152]
+    Clips that can't be stream-copied together (mixed providers/sizes, per
+    the cached probes) are re-encoded to the first clip's frame size instead.
     """
     if not input_files:
         raise ValueError("No input files for concatenation")
@@ -88,53 +98,172 @@ def concat_videos_ffmpeg(input_files: List[str], output_file: str) -> None:
         for p in input_files:
             f.write(f"file '{Path(p).resolve()}'\n")
 
-    cmd = [
-        "ffmpeg",
-        "-y",
+    infos = [probe_clip(p) for p in input_files]
+    if concat_compatible(infos) or infos[0].width is None:
+        codec_args = ["-c", "copy"]
+    else:
+        w, h = infos[0].width, infos[0].height
+        codec_args = [
+            "-vf", f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "20",
+        ]
+        codec_args += ["-c:a", "aac"] if all(i.has_audio for i in infos) else ["-an"]
+
+    args = [
         "-f", "concat",
         "-safe", "0",
         "-i", str(list_path),
-        "-c", "copy",
+        *codec_args,
+        # moov atom up front so players can start before the download finishes
+        "-movflags", "+faststart",
         output_file,
     ]
-    # Run ffmpeg and raise if it fails
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Run ffmpeg and raise if it fails or overruns the job deadline
+    try:
+        run_ffmpeg(args, timeout=stage_timeout("concat", CONCAT_TIMEOUT_S))
+    except subprocess.TimeoutExpired as e:
+        raise_timeout("concat", e)
+    finally:
+        list_path.unlink(missing_ok=True)
 
-    list_path.unlink(missing_ok=True)
 
+def _segment_bounds(segment: Dict[str, Any], clip_duration: Optional[float]) -> Tuple[float, float]:
+    """(start, length) of a segment, pulled back inside a clip that came out shorter than requested."""
+    start, length = float(segment["start"]), float(segment["duration"])
+    if clip_duration is not None and start + length > clip_duration:
+        length = min(length, clip_duration)
+        start = max(0.0, clip_duration - length)
+    return start, length
 
-def generate_video_from_storyboard(
-    storyboard: Dict[str, Any],
-    product_description: str,
-) -> Dict[str, Any]:
+
+def assemble_clips(clip_paths: List[str], scenes: List[Dict[str, Any]], output_file: str) -> None:
     """
-    Orchestrates: storyboard -> scene prompts -> Pika clips -> stitched final video via ffmpeg.
+    Join scene clips into `output_file`, keeping only each scene's planned
+    segments. Providers render fixed clip lengths (and packed scenes hold
+    several shots), so trimmed clips are cut frame-accurately (decoded
+    input seeks) and re-encoded once; if nothing needs trimming this is
+    concat_videos_ffmpeg's stream copy.
     """
-    job_id = str(uuid.uuid4())
+    infos = [probe_clip(p) for p in clip_paths]
+    if not any(needs_trim(scene, info.duration) for scene, info in zip(scenes, infos)):
+        concat_videos_ffmpeg(clip_paths, output_file)
+        return
 
-    # 1) storyboard -> scene prompts
-    scenes = storyboard_to_scene_prompts(storyboard, product_description)
+    from backend.integrations.local_render import frame_size
 
-    # 2) generate clips for each scene
-    clip_paths: List[str] = []
-    for scene in scenes:
-        # clip_path = generate_clip_with_pika(scene, job_id=job_id)
-        
+    w, h = (infos[0].width, infos[0].height) if infos[0].width else frame_size(scenes[0].get("aspect_ratio", "16:9"))
+    fps = infos[0].fps or 24
+    audio = all(i.has_audio for i in infos)
 
-        # ...
-        clip_path = generate_clip(scene, job_id=job_id)
+    inputs: List[str] = []
+    chains: List[str] = []
+    labels: List[str] = []
+    n = 0
+    for path, scene, info in zip(clip_paths, scenes, infos):
+        segments = scene.get("segments") or [{"start": 0, "duration": info.duration or scene.get("duration", 0)}]
+        for segment in segments:
+            start, length = _segment_bounds(segment, info.duration)
+            inputs += ["-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", path]
+            chains.append(
+                f"[{n}:v:0]scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p,setpts=PTS-STARTPTS[v{n}]"
+            )
+            labels.append(f"[v{n}]")
+            if audio:
+                chains.append(f"[{n}:a:0]asetpts=PTS-STARTPTS[a{n}]")
+                labels.append(f"[a{n}]")
+            n += 1
+    chains.append(f"{''.join(labels)}concat=n={n}:v=1:a={1 if audio else 0}[v]" + ("[a]" if audio else ""))
 
-        clip_paths.append(clip_path)
+    args = [
+        *inputs,
+        "-filter_complex", ";".join(chains),
+        "-map", "[v]",
+        *(["-map", "[a]", "-c:a", "aac"] if audio else ["-an"]),
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20",
+        "-movflags", "+faststart",
+        output_file,
+    ]
+    try:
+        run_ffmpeg(args, timeout=stage_timeout("concat", CONCAT_TIMEOUT_S))
+    except subprocess.TimeoutExpired as e:
+        raise_timeout("concat", e)
 
-    # 3) stitch clips via ffmpeg
-    final_path = FINAL_DIR / f"{job_id}_final.mp4"
+
+def start_job() -> str:
+    """Allocate a job id and its media directory."""
+    job_id = str(uuid.uuid4())
+    get_media_store().begin_job(job_id)
+    set_job_id(job_id)
+    return job_id
+
+
+def finalize_job(
+    job_id: str,
+    scenes: List[Dict[str, Any]],
+    clip_paths: List[str],
+    renditions: Optional[List["Rendition"]] = None,
+    hls: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    Stitch rendered clips into the final video, derive any extra
+    renditions from it, package it (ladder, posters, HLS when `hls` or
+    PACKAGING_HLS) and commit the job's media.
+    """
+    store = get_media_store()
+    final_path = store.final_path(job_id)
     print("CLip paths", clip_paths)
-    concat_videos_ffmpeg(clip_paths, str(final_path))
+    with stage_timer("concat"):
+        assemble_clips(clip_paths, scenes, str(final_path))
 
-    return {
+    result = {
         "job_id": job_id,
         "scene_count": len(scenes),
         "clip_paths": clip_paths,
         "final_video_path": str(final_path),
     }
+    if renditions:
+        from backend.pipelines.renditions import build_renditions
+
+        with stage_timer("renditions"):
+            result["renditions"] = build_renditions(job_id, scenes, str(final_path), renditions)
+
+    if PACKAGING_ENABLED or hls:
+        with stage_timer("packaging"):
+            result["packaging"] = package_video(str(final_path), str(final_path.parent), scenes, hls=hls)
+
+    # Failed jobs stay "temp" and are reclaimed by the GC's temp TTL
+    store.commit_job(job_id)
+    return result
+
+
+def generate_video_from_storyboard(
+    storyboard: Dict[str, Any],
+    product_description: str,
+    renditions: Optional[List["Rendition"]] = None,
+    hls: Optional[bool] = None,
+    clip_reuse: Optional[str] = None,
+    keyframes: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Orchestrates: storyboard -> scene prompts -> Pika clips -> stitched final video via ffmpeg.
+    With `renditions`, the first one's aspect ratio is used for the master
+    clips and every rendition is derived from the same job. `clip_reuse`
+    ("off" / "exact" / "similar") overrides CLIP_REUSE for this job, and
+    `keyframes` ("off" / "setting" / "all") overrides KEYFRAME_CHAIN.
+    """
+    job_id = start_job()
 
+    # 1) storyboard -> scene prompts
+    aspect_ratio = renditions[0].aspect_ratio if renditions else "16:9"
+    scenes = storyboard_to_scene_prompts(storyboard, product_description, default_aspect_ratio=aspect_ratio)
+    if clip_reuse:
+        for scene in scenes:
+            scene["clip_reuse"] = clip_reuse
+
+    # 2) generate clips for each scene, in keyframe-chain waves
+    # clip_path = generate_clip_with_pika(scene, job_id=job_id)
+    clip_paths = render_scenes(scenes, job_id, mode=keyframes)
+
+    # 3) stitch clips via ffmpeg
+    return finalize_job(job_id, scenes, clip_paths, renditions, hls=hls)
@@ -0,0 +1,310 @@
+# backend/profiling.py
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from backend.config import process_singleton
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", os.path.join(os.getenv("MEDIA_ROOT", "media"), "profiles")))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# Jobs profiled from start to finish: comma-separated job ids or job kinds
+# ("video", "storyboard", "batch", "ui_video", ...), or "all".
+PROFILE_JOBS: Set[str] = {j.strip() for j in os.getenv("PROFILE_JOBS", "").split(",") if j.strip()}
+# Fraction of all jobs profiled at random, e.g. 0.01 in production.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_WINDOW_S = float(os.getenv("PROFILE_MAX_WINDOW_S", "600"))
+# Functions listed in the job record, by self time.
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "30"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+# Armed job ids/kinds that haven't run yet: at most this many, for this long.
+PROFILE_MAX_ARMED = int(os.getenv("PROFILE_MAX_ARMED", "100"))
+PROFILE_ARM_TTL_S = float(os.getenv("PROFILE_ARM_TTL_S", "3600"))
+
+_ROOT = str(Path(__file__).resolve().parent.parent)
+
+# Thread ident -> ledger of the job the thread is working on. Maintained
+# whether or not anything is being profiled (one dict write per task), so a
+# job can be profiled from the moment it is armed, even mid-run.
+_thread_ledgers: Dict[int, Any] = {}
+
+
+@contextmanager
+def job_thread(ledger: Any) -> Iterator[None]:
+    """Attribute this thread's samples to `ledger`'s job while the block runs."""
+    if ledger is None:
+        yield
+        return
+    ident = threading.get_ident()
+    previous = _thread_ledgers.get(ident)
+    _thread_ledgers[ident] = ledger
+    try:
+        yield
+    finally:
+        if previous is None:
+            _thread_ledgers.pop(ident, None)
+        else:
+            _thread_ledgers[ident] = previous
+
+
+_labels: Dict[Any, str] = {}
+
+
+def _module_name(path: str) -> str:
+    # Longest sys.path entry containing the file gives its dotted module name
+    bases = [b for b in (_ROOT, *sys.path) if b and path.startswith(os.path.join(b, ""))]
+    if not bases:
+        return os.path.splitext(os.path.basename(path))[0]
+    module = os.path.splitext(os.path.relpath(path, max(bases, key=len)))[0].replace(os.sep, ".")
+    return module[: -len(".__init__")] if module.endswith(".__init__") else module
+
+
+def _label(code: Any) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{_module_name(code.co_filename)}.{getattr(code, 'co_qualname', code.co_name)}"
+    return label
+
+
+def _thread_group(name: str) -> str:
+    # "scene-render_3" and "scene-render_0" are the same pool
+    return re.sub(r"[_-]\d+$", "", name) or "thread"
+
+
+class Profile:
+    """Stack samples collected for one time window or one job."""
+
+    def __init__(self, kind: str, job_id: Optional[str] = None, seconds: Optional[float] = None, ledger: Any = None):
+        self.profile_id = f"{kind}-{job_id or time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.kind = kind
+        self.job_id = job_id
+        self.ledger = ledger
+        self.started_at = time.time()
+        self.ends_at = self.started_at + seconds if seconds else None
+        self.finished_at: Optional[float] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.self_samples: Counter = Counter()
+        self.total_samples: Counter = Counter()
+
+    def wants(self, ident: int) -> bool:
+        return self.ledger is None or _thread_ledgers.get(ident) is self.ledger
+
+    def add(self, thread_name: str, labels: List[str]) -> None:
+        self.stacks[";".join([thread_name, *labels])] += 1
+        self.self_samples[labels[-1]] += 1
+        for label in set(labels):
+            self.total_samples[label] += 1
+
+    def ms_per_sample(self) -> float:
+        # Measured rather than PROFILE_INTERVAL_MS: each tick also pays for walking the stacks
+        if not self.samples:
+            return PROFILE_INTERVAL_MS
+        return ((self.finished_at or time.time()) - self.started_at) * 1000 / self.samples
+
+    def functions(self, top: int = PROFILE_TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+        """Per-function self and total (inclusive) time, estimated from sample counts."""
+        ms = self.ms_per_sample()
+        return [
+            {"function": label, "self_ms": round(n * ms, 1), "total_ms": round(self.total_samples[label] * ms, 1)}
+            for label, n in self.self_samples.most_common(top)
+        ]
+
+    def folded(self) -> str:
+        """Collapsed stacks ("thread;outer;...;inner count"), for flamegraph.pl, speedscope or inferno."""
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "profile_id": self.profile_id,
+            "kind": self.kind,
+            "job_id": self.job_id,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "interval_ms": round(self.ms_per_sample(), 2),
+            "samples": self.samples,
+            "folded": str(PROFILE_DIR / f"{self.profile_id}.folded"),
+            "functions": self.functions(),
+        }
+
+
+class Profiler:
+    """
+    Sampling profiler: while at least one profile is active, a background
+    thread snapshots every thread's Python stack each PROFILE_INTERVAL_MS
+    (sys._current_frames) and hands it to the profiles that want it. With
+    nothing active there is no sampling thread and no tracing hook at all.
+    Profiles cover this process only; with several uvicorn workers each
+    worker profiles the jobs it runs.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: Dict[str, Profile] = {}
+        self._armed: "OrderedDict[str, float]" = OrderedDict()  # id or kind -> expires at
+        self._done: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- starting and stopping ----
+
+    def _start(self, profile: Profile) -> Profile:
+        with self._lock:
+            self._active[profile.profile_id] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+                self._thread.start()
+        logger.info(f"Profiling started: {profile.profile_id}")
+        return profile
+
+    def start_window(self, seconds: float) -> Dict[str, Any]:
+        """Profile every thread in this process for the next `seconds`."""
+        seconds = max(0.1, min(seconds, PROFILE_MAX_WINDOW_S))
+        return self._start(Profile("window", seconds=seconds)).summary()
+
+    def arm_job(self, job_id: str) -> Dict[str, Any]:
+        """Profile job `job_id`: from now if it is running, else from when it starts."""
+        from backend.accounting import get_accounting
+
+        ledger = get_accounting().running(job_id)
+        if ledger is not None:
+            self.start_job(ledger)
+            return {"status": "profiling", "job_id": job_id}
+        with self._lock:
+            self._expire_armed()
+            self._armed.pop(job_id, None)
+            self._armed[job_id] = time.time() + PROFILE_ARM_TTL_S
+            while len(self._armed) > PROFILE_MAX_ARMED:
+                self._armed.popitem(last=False)
+        return {"status": "armed", "job_id": job_id}
+
+    def _expire_armed(self) -> None:
+        now = time.time()
+        for key in [k for k, expires_at in self._armed.items() if expires_at <= now]:
+            del self._armed[key]
+
+    def job_started(self, ledger: Any) -> None:
+        """Called as a ledger opens or gets its job id; starts a profile if the job is selected."""
+        ids = {ledger.ledger_id, ledger.job_id, ledger.kind}
+        with self._lock:
+            self._expire_armed()
+            armed = bool(self._armed.keys() & ids)
+            for key in ids & self._armed.keys():
+                del self._armed[key]
+        # The random draw happens once, when the ledger opens (before it has a job id)
+        sampled = ledger.job_id is None and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE
+        if armed or sampled or "all" in PROFILE_JOBS or PROFILE_JOBS & ids:
+            self.start_job(ledger)
+
+    def start_job(self, ledger: Any) -> Optional[Profile]:
+        with self._lock:
+            if any(p.ledger is ledger for p in self._active.values()):
+                return None
+        return self._start(Profile("job", job_id=ledger.ledger_id, ledger=ledger))
+
+    def job_finished(self, ledger: Any) -> Optional[Dict[str, Any]]:
+        """Stop the job's profile, if any; returns its summary for the job record."""
+        with self._lock:
+            profile = next((p for p in self._active.values() if p.ledger is ledger), None)
+            if profile is None:
+                return None
+            del self._active[profile.profile_id]
+        profile.job_id = ledger.ledger_id
+        return self._finish(profile)
+
+    def _finish(self, profile: Profile) -> Dict[str, Any]:
+        profile.finished_at = time.time()
+        profile.ledger = None
+        summary = profile.summary()
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            (PROFILE_DIR / f"{profile.profile_id}.folded").write_text(profile.folded(), encoding="utf-8")
+            (PROFILE_DIR / f"{profile.profile_id}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not write profile {profile.profile_id}: {e}")
+        with self._lock:
+            self._done[profile.profile_id] = summary
+            while len(self._done) > PROFILE_KEEP:
+                self._done.popitem(last=False)
+        logger.info(f"Profiling finished: {profile.profile_id} ({profile.samples} samples)")
+        return summary
+
+    # ---- sampling ----
+
+    def _loop(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        me = threading.get_ident()
+        while True:
+            now = time.time()
+            with self._lock:
+                expired = [p for p in self._active.values() if p.ends_at is not None and now >= p.ends_at]
+                for p in expired:
+                    del self._active[p.profile_id]
+                profiles = list(self._active.values())
+                if not profiles:
+                    self._thread = None
+            for p in expired:
+                self._finish(p)
+            if not profiles:
+                return
+            self._sample(profiles, me)
+            time.sleep(interval)
+
+    def _sample(self, profiles: List[Profile], me: int) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            wanting = [p for p in profiles if p.wants(ident)]
+            if not wanting:
+                continue
+            labels: List[str] = []
+            f: Any = frame
+            while f is not None:
+                labels.append(_label(f.f_code))
+                f = f.f_back
+            labels.reverse()
+            group = _thread_group(names.get(ident, "thread"))
+            for p in wanting:
+                p.add(group, labels)
+        for p in profiles:
+            p.samples += 1
+
+    # ---- inspection ----
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire_armed()
+            return {
+                "active": [p.summary() | {"functions": []} for p in self._active.values()],
+                "armed": sorted(self._armed),
+                "recent": [
+                    {k: v for k, v in s.items() if k != "functions"} for s in reversed(self._done.values())
+                ],
+            }
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._done.get(profile_id)
+
+    def folded_path(self, profile_id: str) -> Optional[Path]:
+        with self._lock:
+            known = profile_id in self._done
+        path = PROFILE_DIR / f"{profile_id}.folded"
+        # Only ids this process finished: never a path built from arbitrary input
+        return path if known and path.exists() else None
+
+
+@process_singleton
+def get_profiler() -> Profiler:
+    return Profiler()
@@ -0,0 +1,208 @@
+# backend/scheduler.py
+import contextvars
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from backend.config import env_flag, process_singleton
+from backend.deadline import DeadlineExceeded, time_left
+from backend.pipelines.media_workers import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    current_priority,
+)
+
+logger = logging.getLogger(__name__)
+
+# Concurrent calls per stage in this process. "llm" covers every planner call,
+# "render" every provider clip request (reused clips skip it).
+SCHED_LLM_SLOTS = int(os.getenv("SCHED_LLM_SLOTS", "4"))
+SCHED_RENDER_SLOTS = int(os.getenv("SCHED_RENDER_SLOTS", "8"))
+# Starting guesses for how long one call holds a slot, refined as calls finish.
+SCHED_LLM_SERVICE_S = float(os.getenv("SCHED_LLM_SERVICE_S", "20"))
+SCHED_RENDER_SERVICE_S = float(os.getenv("SCHED_RENDER_SERVICE_S", "60"))
+# Reject work up front when its projected queue wait is longer than its deadline.
+SCHED_ADMISSION = env_flag("SCHED_ADMISSION", "1")
+
+PRIORITY_CLASSES = {"interactive": PRIORITY_INTERACTIVE, "normal": PRIORITY_NORMAL, "batch": PRIORITY_BATCH}
+
+DEFAULT_TENANT = "default"
+
+_tenant: "contextvars.ContextVar[str]" = contextvars.ContextVar("velocity2_tenant", default=DEFAULT_TENANT)
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str]) -> Iterator[None]:
+    """Work started inside the block is accounted to `tenant` for fair sharing."""
+    token = _tenant.set(tenant or DEFAULT_TENANT)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def current_tenant() -> str:
+    return _tenant.get()
+
+
+class AdmissionRejected(DeadlineExceeded):
+    """The projected wait for `stage` is longer than the job has left."""
+
+    def __init__(self, stage: str, projected_wait_s: float):
+        super().__init__(stage)
+        self.args = (f"{stage} is busy: projected wait {projected_wait_s:.0f}s exceeds the job deadline",)
+        self.projected_wait_s = projected_wait_s
+
+
+class _Waiter:
+    __slots__ = ("priority", "tenant", "event", "granted")
+
+    def __init__(self, priority: int, tenant: str):
+        self.priority = priority
+        self.tenant = tenant
+        self.event = threading.Event()
+        self.granted = False
+
+
+class StageScheduler:
+    """
+    Slots for one stage, handed out by priority class, then fairly between
+    tenants within a class (the tenant with the fewest calls running, then
+    the one served longest ago), then FIFO. Work that is queued but not yet
+    started is preempted by any higher class that arrives later, so a large
+    batch run only uses the slots interactive users leave free.
+
+    A new call is rejected with AdmissionRejected if the projected wait
+    (calls ahead of it / slots * average hold time) exceeds its deadline.
+    """
+
+    def __init__(self, name: str, capacity: int, service_s: float):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.running = 0
+        self._lock = threading.Lock()
+        self._queues: Dict[int, Dict[str, Deque[_Waiter]]] = {}
+        self._running_by_tenant: Counter = Counter()
+        self._last_grant: Dict[str, int] = {}
+        self._grants = itertools.count()
+        self._avg_service_s = service_s
+        self._stats: Counter = Counter()
+
+    def _queued_ahead(self, priority: int) -> int:
+        return sum(len(q) for p, tenants in self._queues.items() if p <= priority for q in tenants.values())
+
+    def projected_wait(self, priority: Optional[int] = None) -> float:
+        """Seconds a call at `priority` arriving now would wait for a slot."""
+        priority = current_priority() if priority is None else priority
+        with self._lock:
+            excess = self.running + self._queued_ahead(priority) + 1 - self.capacity
+            avg = self._avg_service_s
+        return 0.0 if excess <= 0 else math.ceil(excess / self.capacity) * avg
+
+    def acquire(self, priority: int, tenant: str, timeout: Optional[float] = None) -> bool:
+        remaining = time_left()
+        if SCHED_ADMISSION and remaining != float("inf"):
+            projected = self.projected_wait(priority)
+            if projected > remaining:
+                with self._lock:
+                    self._stats["rejected"] += 1
+                raise AdmissionRejected(self.name, projected)
+
+        waiter = _Waiter(priority, tenant)
+        with self._lock:
+            # Everything queued in a lower class now waits behind this call
+            self._stats["preempted"] += sum(
+                len(q) for p, tenants in self._queues.items() if p > priority for q in tenants.values()
+            )
+            self._queues.setdefault(priority, {}).setdefault(tenant, deque()).append(waiter)
+            self._grant()
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queues[priority][tenant].remove(waiter)
+            self._stats["timeouts"] += 1
+            return False
+
+    def release(self, tenant: str, held_s: float) -> None:
+        with self._lock:
+            self.running -= 1
+            self._running_by_tenant[tenant] -= 1
+            self._avg_service_s = 0.8 * self._avg_service_s + 0.2 * held_s
+            self._grant()
+
+    def _grant(self) -> None:
+        while self.running < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            waiter.granted = True
+            self.running += 1
+            self._running_by_tenant[waiter.tenant] += 1
+            self._last_grant[waiter.tenant] = next(self._grants)
+            self._stats[f"granted_p{waiter.priority}"] += 1
+            waiter.event.set()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            tenants = [t for t, q in self._queues[priority].items() if q]
+            if tenants:
+                tenant = min(tenants, key=lambda t: (self._running_by_tenant[t], self._last_grant.get(t, -1)))
+                return self._queues[priority][tenant].popleft()
+        return None
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one slot at the current priority and tenant; waits at most until the job deadline."""
+        priority, tenant = current_priority(), current_tenant()
+        remaining = time_left()
+        if not self.acquire(priority, tenant, None if remaining == float("inf") else remaining):
+            raise DeadlineExceeded(self.name)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(tenant, time.monotonic() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "running": self.running,
+                "running_by_tenant": {t: n for t, n in self._running_by_tenant.items() if n},
+                "queued": {
+                    str(p): {t: len(q) for t, q in tenants.items() if q}
+                    for p, tenants in sorted(self._queues.items())
+                    if any(tenants.values())
+                },
+                "avg_service_s": round(self._avg_service_s, 2),
+                "stats": dict(self._stats),
+            }
+
+
+_STAGE_DEFAULTS = {
+    "llm": (SCHED_LLM_SLOTS, SCHED_LLM_SERVICE_S),
+    "render": (SCHED_RENDER_SLOTS, SCHED_RENDER_SERVICE_S),
+}
+
+
+@process_singleton
+def get_scheduler(stage: str) -> StageScheduler:
+    capacity, service_s = _STAGE_DEFAULTS[stage]
+    return StageScheduler(stage, capacity, service_s)
+
+
+def projected_wait(stages: List[str], priority: Optional[int] = None) -> float:
+    """Projected queue wait across the stages a request will go through."""
+    return sum(get_scheduler(stage).projected_wait(priority) for stage in stages)
+
+
+def snapshot() -> Dict[str, Any]:
+    return {stage: get_scheduler(stage).snapshot() for stage in _STAGE_DEFAULTS}
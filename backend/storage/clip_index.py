@@ -0,0 +1,170 @@
+# backend/storage/clip_index.py
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.config import process_singleton
+from backend.storage.media_store import MEDIA_ROOT
+
+logger = logging.getLogger(__name__)
+
+REUSE_OFF = "off"
+REUSE_EXACT = "exact"      # identical canonical scene
+REUSE_SIMILAR = "similar"  # same type/camera/caption/setting, near-duplicate context and focus
+REUSE_MODES = (REUSE_OFF, REUSE_EXACT, REUSE_SIMILAR)
+
+# Default reuse mode when a request doesn't choose one.
+CLIP_REUSE = os.getenv("CLIP_REUSE", REUSE_EXACT)
+# Minimum estimated Jaccard similarity of context+focus words and word pairs for
+# REUSE_SIMILAR; 0.6 accepts one added or reworded adjective in a short description.
+CLIP_REUSE_THRESHOLD = float(os.getenv("CLIP_REUSE_THRESHOLD", "0.6"))
+CLIP_INDEX_MAX_ENTRIES = int(os.getenv("CLIP_INDEX_MAX_ENTRIES", "50000"))
+
+# MinHash: 64 permutations in 16 LSH bands of 4 rows; pairs above ~0.5 similarity
+# usually share a band, and the exact threshold is checked on the full signature.
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(_NUM_PERM)]
+
+
+def _shingles(text: str) -> List[str]:
+    words = text.split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of the words and word pairs in `text`."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in set(_shingles(text))
+    ] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / _NUM_PERM
+
+
+class ClipIndex:
+    """
+    Rendered clips by canonical scene. Exact lookups go by the scene key;
+    similar lookups are restricted to the scene's "group" (everything but
+    context/focus must match) and use MinHash LSH over context+focus.
+    Entries are appended to a JSONL file and reloaded on start; entries whose
+    clip has since been deleted are dropped when looked up.
+    """
+
+    def __init__(self, path: Path = MEDIA_ROOT / "clip_index.jsonl", max_entries: int = CLIP_INDEX_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bands: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        self._loaded = False
+
+    def _band_keys(self, group: str, sig: List[int]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+        return [(group, b, tuple(sig[b * _ROWS:(b + 1) * _ROWS])) for b in range(_BANDS)]
+
+    def _insert(self, entry: Dict[str, Any]) -> None:
+        key = entry["key"]
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._unindex(old)
+        self._entries[key] = entry
+        for band in self._band_keys(entry["group"], entry["sig"]):
+            self._bands.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._unindex(evicted)
+
+    def _unindex(self, entry: Dict[str, Any]) -> None:
+        for band in self._band_keys(entry["group"], entry["sig"]):
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(entry["key"])
+                if not keys:
+                    del self._bands[band]
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path.exists():
+                with self.path.open(encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if os.path.exists(entry["path"]):
+                            self._insert(entry)
+                # Compact: one line per live entry
+                tmp = self.path.with_suffix(".jsonl.tmp")
+                with tmp.open("w", encoding="utf-8") as f:
+                    for entry in self._entries.values():
+                        f.write(json.dumps(entry) + "\n")
+                os.replace(tmp, self.path)
+            self._loaded = True
+
+    def add(self, key: str, group: str, text: str, path: str) -> None:
+        self._ensure_loaded()
+        entry = {"key": key, "group": group, "sig": minhash(text), "path": str(path)}
+        with self._lock:
+            self._insert(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def lookup(self, key: str, group: str, text: str, mode: str = REUSE_EXACT) -> Optional[Tuple[str, float]]:
+        """(clip path, similarity) of the best reusable clip, or None."""
+        if mode == REUSE_OFF:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            candidates = [(self._entries.get(key), 1.0)]
+            if mode == REUSE_SIMILAR and candidates[0][0] is None:
+                sig = minhash(text)
+                keys = set()
+                for band in self._band_keys(group, sig):
+                    keys |= self._bands.get(band, set())
+                scored = [(self._entries[k], similarity(sig, self._entries[k]["sig"])) for k in keys]
+                candidates = sorted(
+                    (c for c in scored if c[1] >= CLIP_REUSE_THRESHOLD), key=lambda c: -c[1]
+                )
+            for entry, score in candidates:
+                if entry is None:
+                    continue
+                if os.path.exists(entry["path"]):
+                    self._entries.move_to_end(entry["key"])
+                    return entry["path"], score
+                self._unindex(self._entries.pop(entry["key"]))
+        return None
+
+
+def link_or_copy(src: str, dst: Path) -> None:
+    """Hard-link `src` to `dst` (copy across filesystems), so the reuser keeps its clip if the source job is GC'd."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".part")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+@process_singleton
+def get_clip_index() -> ClipIndex:
+    return ClipIndex()
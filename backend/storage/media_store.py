@@ -0,0 +1,353 @@
+# backend/storage/media_store.py
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from backend.config import process_singleton
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", "media"))
+
+STATE_TEMP = "temp"
+STATE_COMMITTED = "committed"
+
+_META_FILE = "job.json"
+
+
+@dataclass
+class RetentionPolicy:
+    """How long job media lives and how much disk it may use (0 = unlimited)."""
+    committed_ttl_s: float = float(os.getenv("MEDIA_RETENTION_HOURS", "72")) * 3600
+    temp_ttl_s: float = float(os.getenv("MEDIA_TEMP_TTL_HOURS", "6")) * 3600
+    quota_bytes: int = int(float(os.getenv("MEDIA_QUOTA_GB", "0")) * 1024 ** 3)
+    gc_interval_s: float = float(os.getenv("MEDIA_GC_INTERVAL_S", "300"))
+
+
+@dataclass
+class JobMedia:
+    job_id: str
+    state: str = STATE_TEMP
+    created_at: float = field(default_factory=time.time)
+    committed_at: Optional[float] = None
+    bytes: int = 0
+    pins: int = 0  # in-memory only; clip caches hold a reference while they point here
+
+
+class MediaStore:
+    """
+    Job-scoped media layout:
+
+        <root>/jobs/<shard>/<job_id>/{clips/, final/, job.json}
+
+    <shard> is the first two characters of the job id, so no directory grows
+    past a few thousand entries. Jobs start as "temp" and become "committed"
+    once their final video is written. Committed jobs are kept in commit
+    order so retention and quota eviction only touch the oldest entries
+    instead of walking the whole tree.
+    """
+
+    def __init__(self, root: Path = MEDIA_ROOT, policy: Optional[RetentionPolicy] = None):
+        self.root = Path(root)
+        self.jobs_root = self.root / "jobs"
+        self.policy = policy or RetentionPolicy()
+        self._lock = threading.Lock()
+        self._temp: Dict[str, JobMedia] = {}
+        self._committed: "OrderedDict[str, JobMedia]" = OrderedDict()
+        self._loaded = False
+        self._gc_thread: Optional[threading.Thread] = None
+        self._gc_stop = threading.Event()
+
+    # ---- layout -------------------------------------------------------
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.jobs_root / job_id[:2] / job_id
+
+    def clip_path(self, job_id: str, index: int) -> Path:
+        self.begin_job(job_id)
+        return self.job_dir(job_id) / "clips" / f"scene_{index}.mp4"
+
+    def scene_clip_path(self, job_id: str, scene: Dict[str, Any]) -> Path:
+        """
+        Clip path for a scene dict. Scenes re-rendered for another rendition
+        carry a "variant" (e.g. "9x16") so they don't overwrite the master clip.
+        """
+        variant = scene.get("variant")
+        if not variant:
+            return self.clip_path(job_id, scene["index"])
+        self.begin_job(job_id)
+        return self.job_dir(job_id) / "clips" / f"scene_{scene['index']}_{variant}.mp4"
+
+    def keyframe_path(self, job_id: str, scene: Dict[str, Any]) -> Path:
+        """Last frame of a scene's clip, handed to the next scene as its first frame."""
+        self.begin_job(job_id)
+        return self.job_dir(job_id) / "keyframes" / self.scene_clip_path(job_id, scene).with_suffix(".jpg").name
+
+    def keyframe_file(self, job_id: str, name: str) -> Optional[Path]:
+        """
+        An extracted keyframe of a job, committed or still rendering (providers
+        fetch them mid-job), or None. Never creates directories.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if job_id not in self._committed and job_id not in self._temp:
+                return None
+        base = (self.job_dir(job_id) / "keyframes").resolve()
+        path = (base / name).resolve()
+        if path.parent != base or not path.is_file():
+            return None
+        return path
+
+    def final_path(self, job_id: str, name: str = "final.mp4") -> Path:
+        self.begin_job(job_id)
+        return self.job_dir(job_id) / "final" / name
+
+    # ---- lifecycle ----------------------------------------------------
+
+    def begin_job(self, job_id: str) -> None:
+        """Register a job in the temp state and create its directories (idempotent)."""
+        self._ensure_loaded()
+        with self._lock:
+            if job_id in self._temp or job_id in self._committed:
+                return
+            record = JobMedia(job_id=job_id)
+            self._temp[job_id] = record
+        job_dir = self.job_dir(job_id)
+        (job_dir / "clips").mkdir(parents=True, exist_ok=True)
+        (job_dir / "final").mkdir(parents=True, exist_ok=True)
+        self._write_meta(record)
+
+    def commit_job(self, job_id: str) -> None:
+        """Mark a job's media as complete; it is now subject to retention, not temp TTL."""
+        self._ensure_loaded()
+        size = _dir_size(self.job_dir(job_id))
+        with self._lock:
+            record = self._temp.pop(job_id, None) or self._committed.pop(job_id, None)
+            if record is None:
+                record = JobMedia(job_id=job_id)
+            record.state = STATE_COMMITTED
+            record.committed_at = time.time()
+            record.bytes = size
+            self._committed[job_id] = record
+        self._write_meta(record)
+
+    def committed_final(self, job_id: str, name: str = "final.mp4") -> Optional[Path]:
+        """Final video of a committed job, or None. Never creates directories."""
+        return self.committed_file(job_id, name)
+
+    def committed_file(self, job_id: str, relpath: str) -> Optional[Path]:
+        """
+        A file under a committed job's final/ directory (videos, posters,
+        HLS playlists and segments), or None. Paths escaping final/ are refused.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if job_id not in self._committed:
+                return None
+        base = (self.job_dir(job_id) / "final").resolve()
+        path = (base / relpath).resolve()
+        if base not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def delete_job(self, job_id: str) -> bool:
+        """Remove a job's media now, unless it is pinned."""
+        with self._lock:
+            record = self._temp.get(job_id) or self._committed.get(job_id)
+            if record is not None and record.pins > 0:
+                return False
+            self._temp.pop(job_id, None)
+            self._committed.pop(job_id, None)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return True
+
+    # ---- pinning ------------------------------------------------------
+
+    def pin(self, job_id: str) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            record = self._temp.get(job_id) or self._committed.get(job_id)
+            if record is None:
+                raise KeyError(f"Unknown media job: {job_id}")
+            record.pins += 1
+
+    def unpin(self, job_id: str) -> None:
+        with self._lock:
+            record = self._temp.get(job_id) or self._committed.get(job_id)
+            if record is not None and record.pins > 0:
+                record.pins -= 1
+
+    @contextmanager
+    def pinned(self, job_id: str) -> Iterator[None]:
+        self.pin(job_id)
+        try:
+            yield
+        finally:
+            self.unpin(job_id)
+
+    # ---- GC -----------------------------------------------------------
+
+    def usage_bytes(self) -> int:
+        with self._lock:
+            return sum(r.bytes for r in self._committed.values()) + sum(
+                r.bytes for r in self._temp.values()
+            )
+
+    def gc(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        One collection pass: expire stale temp jobs, expire committed jobs past
+        retention, then evict oldest committed jobs until under quota.
+        Pinned jobs are never removed.
+        """
+        self._ensure_loaded()
+        now = now or time.time()
+        policy = self.policy
+        victims = []
+
+        with self._lock:
+            for job_id, record in list(self._temp.items()):
+                if record.pins == 0 and now - record.created_at > policy.temp_ttl_s:
+                    victims.append(job_id)
+                    del self._temp[job_id]
+            live = list(self._temp.items())
+
+        # Temp sizes change while rendering; refresh them without holding the
+        # lock, which every request takes, for the length of a disk walk
+        sizes = {job_id: _dir_size(self.job_dir(job_id)) for job_id, _ in live}
+
+        with self._lock:
+            for job_id, record in live:
+                if self._temp.get(job_id) is record:
+                    record.bytes = sizes[job_id]
+
+            # Commit order == age order, so stop at the first job still in retention.
+            for job_id, record in list(self._committed.items()):
+                if now - (record.committed_at or record.created_at) <= policy.committed_ttl_s:
+                    break
+                if record.pins == 0:
+                    victims.append(job_id)
+                    del self._committed[job_id]
+
+            if policy.quota_bytes > 0:
+                usage = sum(r.bytes for r in self._committed.values()) + sum(
+                    r.bytes for r in self._temp.values()
+                )
+                for job_id, record in list(self._committed.items()):
+                    if usage <= policy.quota_bytes:
+                        break
+                    if record.pins == 0:
+                        usage -= record.bytes
+                        victims.append(job_id)
+                        del self._committed[job_id]
+
+        for job_id in victims:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if victims:
+            logger.info(f"Media GC removed {len(victims)} job(s)")
+        return {"removed": len(victims), "usage_bytes": self.usage_bytes()}
+
+    def start_gc(self) -> None:
+        """Run gc() every policy.gc_interval_s on a daemon thread."""
+        if self._gc_thread and self._gc_thread.is_alive():
+            return
+        self._gc_stop.clear()
+
+        def _loop() -> None:
+            while not self._gc_stop.wait(self.policy.gc_interval_s):
+                try:
+                    self.gc()
+                except Exception as e:
+                    logger.error(f"Media GC failed: {e}")
+
+        self._gc_thread = threading.Thread(target=_loop, name="media-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self) -> None:
+        self._gc_stop.set()
+
+    # ---- persistence --------------------------------------------------
+
+    def _write_meta(self, record: JobMedia) -> None:
+        meta = {
+            "job_id": record.job_id,
+            "state": record.state,
+            "created_at": record.created_at,
+            "committed_at": record.committed_at,
+            "bytes": record.bytes,
+        }
+        path = self.job_dir(record.job_id) / _META_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, path)
+
+    def _ensure_loaded(self) -> None:
+        """Rebuild the in-memory index from job.json files once per process."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            temp: Dict[str, JobMedia] = {}
+            committed = []
+            if self.jobs_root.exists():
+                for shard in os.scandir(self.jobs_root):
+                    if not shard.is_dir():
+                        continue
+                    for entry in os.scandir(shard.path):
+                        record = _read_meta(Path(entry.path))
+                        if record is None:
+                            continue
+                        if record.state == STATE_COMMITTED:
+                            committed.append(record)
+                        else:
+                            temp[record.job_id] = record
+            committed.sort(key=lambda r: r.committed_at or r.created_at)
+            self._temp = temp
+            self._committed = OrderedDict((r.job_id, r) for r in committed)
+            self._loaded = True
+
+
+def _read_meta(job_dir: Path) -> Optional[JobMedia]:
+    try:
+        meta = json.loads((job_dir / _META_FILE).read_text())
+    except (OSError, ValueError):
+        # No metadata: treat as an abandoned temp job so the temp TTL reclaims it
+        if not job_dir.is_dir():
+            return None
+        return JobMedia(job_id=job_dir.name, created_at=job_dir.stat().st_mtime)
+    return JobMedia(
+        job_id=meta["job_id"],
+        state=meta.get("state", STATE_TEMP),
+        created_at=meta.get("created_at", 0.0),
+        committed_at=meta.get("committed_at"),
+        bytes=meta.get("bytes", 0),
+    )
+
+
+def _dir_size(path: Path) -> int:
+    """Bytes of a job's media. job.json is left out: its size changes with what it records."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            if name == _META_FILE and dirpath == str(path):
+                continue
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+@process_singleton
+def get_media_store() -> MediaStore:
+    """Process-wide MediaStore, created on first use."""
+    return MediaStore()
@@ -0,0 +1,151 @@
+# backend/storage/object_store.py
+import logging
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict
+
+from backend.config import process_singleton
+
+logger = logging.getLogger(__name__)
+
+# Where clips and final outputs are shared between nodes in distributed mode:
+# "local" (a directory, for one box or a shared mount) or "s3" (AWS or any
+# S3-compatible store such as MinIO).
+OBJECT_STORE = os.getenv("OBJECT_STORE", "local")
+OBJECT_STORE_ROOT = Path(os.getenv("OBJECT_STORE_ROOT", os.path.join(os.getenv("MEDIA_ROOT", "media"), "objects")))
+OBJECT_STORE_BUCKET = os.getenv("OBJECT_STORE_BUCKET", "velocity2")
+# Endpoint of an S3-compatible service, e.g. http://127.0.0.1:9000; empty = AWS.
+OBJECT_STORE_ENDPOINT = os.getenv("OBJECT_STORE_ENDPOINT", "")
+
+
+def _check_key(key: str) -> str:
+    parts = key.split("/")
+    if not key or key.startswith("/") or any(p in ("", ".", "..") for p in parts):
+        raise ValueError(f"Bad object key: {key!r}")
+    return key
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Atomically place a copy of `src` at `dst`, hard-linking when both are on one filesystem."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ObjectStore(ABC):
+    """Flat keys ("jobs/<job_id>/clips/scene_0.mp4") mapped to files."""
+
+    @abstractmethod
+    def put_file(self, key: str, path: Path) -> None:
+        ...
+
+    @abstractmethod
+    def get_file(self, key: str, dst: Path) -> Path:
+        """Download `key` to `dst`; raises FileNotFoundError if there is no such object."""
+
+    @abstractmethod
+    def list(self, prefix: str) -> Dict[str, int]:
+        """Keys under `prefix` with their sizes in bytes."""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        ...
+
+
+class LocalObjectStore(ObjectStore):
+    """Objects as files under `root`; objects are hard links to the media files when possible, so no extra disk."""
+
+    def __init__(self, root: Path = OBJECT_STORE_ROOT):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def put_file(self, key: str, path: Path) -> None:
+        _link_or_copy(Path(path), self._path(key))
+
+    def get_file(self, key: str, dst: Path) -> Path:
+        src = self._path(key)
+        if not src.is_file():
+            raise FileNotFoundError(key)
+        _link_or_copy(src, Path(dst))
+        return Path(dst)
+
+    def list(self, prefix: str) -> Dict[str, int]:
+        base = self.root / _check_key(prefix.rstrip("/"))
+        if not base.is_dir():
+            return {}
+        return {
+            p.relative_to(self.root).as_posix(): p.stat().st_size
+            for p in base.rglob("*")
+            if p.is_file() and not p.name.endswith(".part")
+        }
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = self.list(prefix)
+        shutil.rmtree(self.root / _check_key(prefix.rstrip("/")), ignore_errors=True)
+        return len(keys)
+
+
+class S3ObjectStore(ObjectStore):
+    """Objects in an S3 bucket (or MinIO/LocalStack via OBJECT_STORE_ENDPOINT). Needs boto3."""
+
+    def __init__(self, bucket: str = OBJECT_STORE_BUCKET, endpoint: str = OBJECT_STORE_ENDPOINT):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("OBJECT_STORE=s3 needs boto3 (pip install boto3)") from e
+        self.bucket = bucket
+        # Credentials come from the usual AWS_* env vars / config files
+        self._client = boto3.client("s3", endpoint_url=endpoint or None)
+
+    def put_file(self, key: str, path: Path) -> None:
+        self._client.upload_file(str(path), self.bucket, _check_key(key))
+
+    def get_file(self, key: str, dst: Path) -> Path:
+        from botocore.exceptions import ClientError
+
+        dst = Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.part")
+        try:
+            self._client.download_file(self.bucket, _check_key(key), str(tmp))
+        except ClientError as e:
+            tmp.unlink(missing_ok=True)
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                raise FileNotFoundError(key) from e
+            raise
+        os.replace(tmp, dst)
+        return dst
+
+    def list(self, prefix: str) -> Dict[str, int]:
+        keys: Dict[str, int] = {}
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=_check_key(prefix.rstrip("/")) + "/"):
+            for obj in page.get("Contents", []):
+                keys[obj["Key"]] = obj["Size"]
+        return keys
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = list(self.list(prefix))
+        for i in range(0, len(keys), 1000):
+            self._client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]]}
+            )
+        return len(keys)
+
+
+@process_singleton
+def get_object_store() -> ObjectStore:
+    if OBJECT_STORE == "s3":
+        return S3ObjectStore()
+    if OBJECT_STORE == "local":
+        return LocalObjectStore()
+    raise ValueError(f"Unknown OBJECT_STORE: {OBJECT_STORE!r} (local | s3)")
@@ -0,0 +1,92 @@
+# backend/tests/bench_import_time.py
+"""
+Import-time benchmark for cold starts.
+
+Imports each module in a fresh interpreter (python -X importtime), from an
+empty temporary working directory, and reports the median wall time, the
+slowest imported modules, and any files the import created (there should be
+none: filesystem setup belongs to backend.config.startup()).
+
+    python backend/tests/bench_import_time.py --runs 5 --max-ms 800
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MODULES = [
+    "backend.config",
+    "backend.agents.planner",
+    "backend.pipelines.video_pipeline",
+    "backend.api.main",
+]
+
+
+def _import_once(module: str) -> Tuple[float, List[Tuple[int, str]], List[str]]:
+    with tempfile.TemporaryDirectory(prefix="velocity2_import_") as cwd:
+        env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        created = sorted(os.listdir(cwd))
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    cumulative: List[Tuple[int, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        cumulative.append((int(cum), name.strip()))
+    return elapsed_ms, cumulative, created
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per module")
+    parser.add_argument("--max-ms", type=float, default=0, help="fail if a median exceeds this (0 = off)")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        times: List[float] = []
+        slowest: Dict[str, int] = {}
+        created: List[str] = []
+        for _ in range(args.runs):
+            elapsed_ms, cumulative, created = _import_once(module)
+            times.append(elapsed_ms)
+            for cum, name in cumulative:
+                slowest[name] = min(slowest.get(name, cum), cum)
+
+        median = statistics.median(times)
+        print(f"\n{module}: median {median:.0f} ms (min {min(times):.0f}, max {max(times):.0f}, runs {args.runs})")
+        for name, cum in sorted(slowest.items(), key=lambda kv: -kv[1])[1:args.top + 1]:
+            print(f"  {cum / 1000:8.1f} ms  {name}")
+        if created:
+            print(f"  !! import created files: {created}")
+            failed = True
+        if args.max_ms and median > args.max_ms:
+            print(f"  !! median above --max-ms {args.max_ms:.0f}")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
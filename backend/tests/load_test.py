@@ -0,0 +1,581 @@
+# backend/tests/load_test.py
+"""
+Load and soak harness for the FastAPI service.
+
+Starts local stand-ins for Ollama and the video provider (PiAPI-shaped, so
+the real Luma submit/poll/download path runs), starts the app under
+uvicorn with several workers against them, drives /generate/storyboard and
+/generate/video open-loop (fixed arrival rate) or closed-loop (N users),
+and samples the server's memory, open file descriptors and media/ size
+throughout. Each run writes a JSON report; `compare` tabulates reports.
+
+    python backend/tests/load_test.py run --name open5 --mode open --rate 5 --duration 120
+    python backend/tests/load_test.py run --name closed16 --mode closed --users 16 --duration 120
+    python backend/tests/load_test.py run --name soak --mode open --rate 1 --duration 14400 --sample-s 60
+    python backend/tests/load_test.py compare loadtest_runs/open5.json loadtest_runs/closed16.json
+
+`--provider local` renders clips with ffmpeg in the workers instead of the
+provider stand-in (CPU-bound rather than wait-bound renders).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_STORYBOARD = {
+    "shots": [
+        {"type": "close-up", "duration": 2, "camera": "slow push in", "context": "studio tabletop", "focus": "product logo"},
+        {"type": "lifestyle", "duration": 3, "camera": "tracking", "context": "sunny kitchen", "focus": "hands using product"},
+        {"type": "wide", "duration": 2, "camera": "static", "context": "sunny kitchen", "focus": "product on counter"},
+        {"type": "cta", "duration": 2, "camera": "static", "context": "studio tabletop", "focus": "product",
+         "overlay": "Shop now", "cta_position": "center"},
+    ]
+}
+
+
+# ---- stand-ins --------------------------------------------------------------
+
+class StandIns:
+    """
+    One HTTP server playing both Ollama (/api/chat, /api/tags) and PiAPI
+    (/api/v1/task, plus /clips/ for the rendered files), with configurable
+    latencies so the service sees realistic waits without GPUs or API keys.
+    """
+
+    def __init__(self, llm_latency_s: float, render_latency_s: float, work_dir: str):
+        self.llm_latency_s = llm_latency_s
+        self.render_latency_s = render_latency_s
+        self.work_dir = work_dir
+        self.tasks: Dict[str, Tuple[float, int]] = {}
+        self.counts: Dict[str, int] = {"chat": 0, "task": 0, "poll": 0, "download": 0}
+        self._lock = threading.Lock()
+        self._clips: Dict[int, bytes] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def _clip(self, duration: int) -> bytes:
+        if duration not in self._clips:
+            sys.path.insert(0, ROOT)
+            from backend.integrations.local_render import render_scene_clip
+
+            path = Path(self.work_dir) / f"standin_{duration}.mp4"
+            render_scene_clip({"index": 0, "prompt": "stand-in", "duration": duration, "aspect_ratio": "16:9"}, path)
+            with open(path, "rb") as f:
+                self._clips[duration] = f.read()
+        return self._clips[duration]
+
+    def start(self) -> str:
+        for duration in (5, 10):
+            self._clip(duration)
+        standins = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, value: Any, status: int = 200) -> None:
+                self._send(status, json.dumps(value).encode("utf-8"))
+
+            def _body(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self) -> None:
+                if self.path == "/api/tags":
+                    return self._json({"models": []})
+                if self.path.startswith("/api/v1/task/"):
+                    with standins._lock:
+                        standins.counts["poll"] += 1
+                        task = standins.tasks.get(self.path.rsplit("/", 1)[-1])
+                    if task is None:
+                        return self._json({"data": {"status": "Failed", "error": "unknown task"}}, 404)
+                    ready_at, duration = task
+                    if time.time() < ready_at:
+                        return self._json({"data": {"status": "Processing"}})
+                    host = f"http://{self.headers['Host']}"
+                    return self._json({"data": {"status": "Completed", "output": {"video": f"{host}/clips/{duration}.mp4"}}})
+                if self.path.startswith("/clips/"):
+                    with standins._lock:
+                        standins.counts["download"] += 1
+                    duration = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                    return self._send(200, standins._clip(duration), "video/mp4")
+                self._json({"error": "not found"}, 404)
+
+            def do_POST(self) -> None:
+                body = self._body()
+                if self.path == "/api/chat":
+                    with standins._lock:
+                        standins.counts["chat"] += 1
+                    latency = random.uniform(0.5, 1.5) * standins.llm_latency_s
+                    time.sleep(latency)
+                    prompt = json.dumps(body.get("messages", []))
+                    return self._json({
+                        "message": {"role": "assistant", "content": json.dumps(_STORYBOARD)},
+                        "prompt_eval_count": len(prompt) // 4,
+                        "prompt_eval_duration": int(latency * 0.3e9),
+                        "eval_count": 180,
+                        "eval_duration": int(latency * 0.7e9),
+                        "load_duration": 0,
+                    })
+                if self.path == "/api/v1/task":
+                    task_id = uuid.uuid4().hex
+                    duration = 5 if int(body.get("input", {}).get("duration", 5)) <= 5 else 10
+                    with standins._lock:
+                        standins.counts["task"] += 1
+                        standins.tasks[task_id] = (time.time() + random.uniform(0.5, 1.5) * standins.render_latency_s, duration)
+                    return self._json({"data": {"task_id": task_id}})
+                self._json({"error": "not found"}, 404)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+
+
+# ---- server under test ------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args: argparse.Namespace, standin_url: str, media_root: str) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        MEDIA_ROOT=media_root,
+        LLM_BACKENDS=json.dumps([{"kind": "ollama", "url": standin_url, "model": "standin"}]),
+        VIDEO_PROVIDER="luma" if args.provider == "standin" else args.provider,
+        PIAPI_BASE_URL=standin_url,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=open(os.path.join(os.path.dirname(media_root), "server.log"), "ab"),
+        stderr=subprocess.STDOUT,
+    )
+    base = f"http://127.0.0.1:{port}"
+    import requests
+
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}; see server.log")
+        try:
+            if requests.get(f"{base}/llm/backends", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become ready")
+
+
+# ---- resource sampling ------------------------------------------------------
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and its descendants, from /proc (Linux only)."""
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            for task in os.listdir(f"/proc/{pids[i]}/task"):
+                with open(f"/proc/{pids[i]}/task/{task}/children") as f:
+                    pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _fd_count(pid: int) -> int:
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return 0
+
+
+def _dir_mb(path: str) -> float:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+class Sampler:
+    """Samples RSS, open fds and threads of the server process tree, and media/ size, every `interval` seconds."""
+
+    def __init__(self, pid: int, media_root: str, interval: float):
+        self.pid = pid
+        self.media_root = media_root
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._start = time.time()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def sample(self) -> None:
+        pids = _process_tree(self.pid)
+        self.samples.append({
+            "t": round(time.time() - self._start, 1),
+            "processes": len(pids),
+            "rss_mb": round(sum(_rss_mb(p) for p in pids), 1),
+            "fds": sum(_fd_count(p) for p in pids),
+            "media_mb": round(_dir_mb(self.media_root), 2),
+        })
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        self.sample()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def _slope_per_hour(points: List[Tuple[float, float]]) -> Optional[float]:
+    """Least-squares growth rate, so one spike doesn't read as a leak."""
+    if len(points) < 3:
+        return None
+    mean_t = statistics.fmean(t for t, _ in points)
+    mean_v = statistics.fmean(v for _, v in points)
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var:
+        return None
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var * 3600
+
+
+def summarize_resources(samples: List[Dict[str, float]], warmup_s: float) -> Dict[str, Any]:
+    steady = [s for s in samples if s["t"] >= warmup_s] or samples
+    out: Dict[str, Any] = {}
+    for metric in ("rss_mb", "fds", "media_mb"):
+        values = [s[metric] for s in steady]
+        slope = _slope_per_hour([(s["t"], s[metric]) for s in steady])
+        out[metric] = {
+            "start": values[0],
+            "end": values[-1],
+            "max": max(values),
+            "growth_per_hour": round(slope, 2) if slope is not None else None,
+        }
+    return out
+
+
+# ---- load generation --------------------------------------------------------
+
+class Recorder:
+    def __init__(self) -> None:
+        self.results: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, latency_s: float, status: int, cache: str = "") -> None:
+        with self._lock:
+            self.results.append({"kind": kind, "latency_s": latency_s, "status": status, "cache": cache})
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoadGenerator:
+    def __init__(self, base: str, args: argparse.Namespace):
+        self.base = base
+        self.args = args
+        self.recorder = Recorder()
+        self._local = threading.local()
+        self._rng = random.Random(args.seed)
+        self._rng_lock = threading.Lock()
+        self.mix = [(kind, float(weight)) for kind, weight in (p.split("=") for p in args.mix.split(","))]
+
+    def _session(self) -> Any:
+        if not hasattr(self._local, "session"):
+            import requests
+
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _pick(self) -> Tuple[str, Dict[str, Any]]:
+        with self._rng_lock:
+            kind = self._rng.choices([k for k, _ in self.mix], weights=[w for _, w in self.mix])[0]
+            # A share of requests repeat a small set of products, to exercise the response cache
+            if self._rng.random() < self.args.repeat_ratio:
+                product = f"load test product {self._rng.randrange(8)}"
+            else:
+                product = f"load test product {uuid.uuid4().hex[:12]}"
+        body: Dict[str, Any] = {"product_description": product, "max_scenes": self.args.max_scenes, "best_of": 1}
+        if self.args.deadline_s:
+            body["deadline_s"] = self.args.deadline_s
+        return kind, body
+
+    def fire(self, scheduled_at: float) -> None:
+        """One request; latency counts from when it was *scheduled*, so client backlog isn't hidden."""
+        kind, body = self._pick()
+        try:
+            resp = self._session().post(
+                f"{self.base}/generate/{kind}", json=body, headers={"X-Tenant": "loadtest"}, timeout=self.args.timeout
+            )
+            status, cache = resp.status_code, resp.headers.get("X-Cache", "")
+        except Exception:
+            status, cache = 0, ""
+        self.recorder.add(kind, time.monotonic() - scheduled_at, status, cache)
+
+    def run_open(self, duration: float) -> None:
+        """Fixed arrival rate (Poisson with --poisson) regardless of how fast the server answers."""
+        with ThreadPoolExecutor(max_workers=self.args.max_outstanding) as pool:
+            start = next_at = time.monotonic()
+            while next_at - start < duration:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.fire, next_at)
+                gap = 1.0 / self.args.rate
+                next_at += self._rng.expovariate(self.args.rate) if self.args.poisson else gap
+
+    def run_closed(self, duration: float) -> None:
+        """`--users` clients, each sending its next request when the last one returns (plus think time)."""
+        end = time.monotonic() + duration
+
+        def _user() -> None:
+            while time.monotonic() < end:
+                self.fire(time.monotonic())
+                if self.args.think_s:
+                    time.sleep(self.args.think_s)
+
+        threads = [threading.Thread(target=_user, daemon=True) for _ in range(self.args.users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for kind in sorted({r["kind"] for r in self.recorder.results}):
+            rows = [r for r in self.recorder.results if r["kind"] == kind]
+            ok = [r["latency_s"] * 1000 for r in rows if r["status"] == 200]
+            codes: Dict[str, int] = {}
+            for r in rows:
+                codes[str(r["status"])] = codes.get(str(r["status"]), 0) + 1
+            out[kind] = {
+                "requests": len(rows),
+                "ok": len(ok),
+                "error_rate": round(1 - len(ok) / len(rows), 4),
+                "status_codes": codes,
+                "cache_hits": sum(1 for r in rows if r["cache"] == "HIT"),
+                "throughput_rps": round(len(ok) / elapsed, 3),
+                "latency_ms": {
+                    "mean": round(statistics.fmean(ok), 1),
+                    "p50": round(_percentile(ok, 50), 1),
+                    "p90": round(_percentile(ok, 90), 1),
+                    "p99": round(_percentile(ok, 99), 1),
+                    "max": round(max(ok), 1),
+                } if ok else None,
+            }
+        return out
+
+
+# ---- commands ---------------------------------------------------------------
+
+def cmd_run(args: argparse.Namespace) -> int:
+    work = tempfile.mkdtemp(prefix="velocity2_load_")
+    media_root = os.path.join(work, "media")
+    standins = StandIns(args.llm_latency_s, args.render_latency_s, work)
+    standin_url = standins.start()
+    proc, base = start_server(args, standin_url, media_root)
+    sampler = Sampler(proc.pid, media_root, args.sample_s)
+    gen = LoadGenerator(base, args)
+    print(f"server {base} (pid {proc.pid}, {args.workers} workers), stand-ins {standin_url}, work dir {work}")
+    sampler.start()
+    started_at = time.time()
+    start = time.monotonic()
+    try:
+        if args.mode == "open":
+            gen.run_open(args.duration)
+        else:
+            gen.run_closed(args.duration)
+    finally:
+        elapsed = time.monotonic() - start
+        sampler.stop()
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        standins.stop()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("func", "out")}
+    report = {
+        "name": args.name,
+        "config": config,
+        "config_hash": hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12],
+        "started_at": started_at,
+        "elapsed_s": round(elapsed, 1),
+        "endpoints": gen.summary(elapsed),
+        "standin_calls": dict(standins.counts),
+        "resources": summarize_resources(sampler.samples, args.warmup_s),
+        "samples": sampler.samples,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{args.name}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({k: report[k] for k in ("endpoints", "resources")}, indent=2))
+    print(f"report: {path}")
+    if not args.keep:
+        shutil.rmtree(work, ignore_errors=True)
+    return 0
+
+
+def _fmt(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.1f}" if abs(value) >= 10 else f"{value:.3g}"
+    return str(value)
+
+
+def cmd_compare(args: argparse.Namespace) -> int:
+    """One row per run and endpoint; percentages are relative to the first report."""
+    reports = []
+    for path in args.reports:
+        with open(path) as f:
+            reports.append(json.load(f))
+
+    columns = ["run", "endpoint", "req", "err%", "rps", "p50 ms", "p99 ms", "rss MB/h", "fds/h", "media MB/h"]
+    rows: List[List[str]] = []
+    base: Dict[str, Dict[str, float]] = {}
+    for i, report in enumerate(reports):
+        res = report["resources"]
+        for kind, ep in sorted(report["endpoints"].items()):
+            lat = ep["latency_ms"] or {}
+            values = {"rps": ep["throughput_rps"], "p50": lat.get("p50"), "p99": lat.get("p99")}
+            if i == 0:
+                base[kind] = values
+
+            def rel(key: str) -> str:
+                v, b = values[key], base.get(kind, {}).get(key)
+                if i == 0 or v is None or not b:
+                    return _fmt(v)
+                return f"{_fmt(v)} ({(v - b) / b * 100:+.0f}%)"
+
+            rows.append([
+                report["name"], kind, str(ep["requests"]), _fmt(ep["error_rate"] * 100),
+                rel("rps"), rel("p50"), rel("p99"),
+                _fmt(res["rss_mb"]["growth_per_hour"]), _fmt(res["fds"]["growth_per_hour"]),
+                _fmt(res["media_mb"]["growth_per_hour"]),
+            ])
+
+    widths = [max(len(c), *(len(r[j]) for r in rows)) for j, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+    # Resource growth that keeps climbing after warm-up is what a soak is for
+    leaking = False
+    for report in reports:
+        res = report["resources"]
+        fd_growth = res["fds"]["growth_per_hour"]
+        if fd_growth is not None and fd_growth > args.max_fd_growth:
+            print(f"!! {report['name']}: open fds growing {fd_growth:.1f}/h (possible descriptor leak)")
+            leaking = True
+        rss_growth = res["rss_mb"]["growth_per_hour"]
+        if rss_growth is not None and rss_growth > args.max_rss_growth_mb:
+            print(f"!! {report['name']}: RSS growing {rss_growth:.1f} MB/h (possible memory leak)")
+            leaking = True
+    # Non-zero so CI can gate on a soak run
+    return 1 if leaking else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="start stand-ins + uvicorn, apply load, write a report")
+    run.add_argument("--name", default=time.strftime("run_%Y%m%d_%H%M%S"))
+    run.add_argument("--out", default="loadtest_runs", help="directory for JSON reports")
+    run.add_argument("--mode", choices=["open", "closed"], default="open")
+    run.add_argument("--duration", type=float, default=60, help="seconds of load (hours for a soak)")
+    run.add_argument("--rate", type=float, default=2.0, help="open loop: requests per second")
+    run.add_argument("--poisson", action="store_true", help="open loop: exponential inter-arrival times")
+    run.add_argument("--max-outstanding", type=int, default=512, help="open loop: client-side concurrency cap")
+    run.add_argument("--users", type=int, default=8, help="closed loop: concurrent clients")
+    run.add_argument("--think-s", type=float, default=0.0, help="closed loop: pause between a user's requests")
+    run.add_argument("--mix", default="storyboard=0.7,video=0.3", help="endpoint weights")
+    run.add_argument("--repeat-ratio", type=float, default=0.2, help="share of requests for a small set of repeated products")
+    run.add_argument("--max-scenes", type=int, default=3)
+    run.add_argument("--deadline-s", type=float, help="deadline_s sent with each request")
+    run.add_argument("--timeout", type=float, default=900, help="client timeout per request")
+    run.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    run.add_argument("--provider", choices=["standin", "local", "mock"], default="standin")
+    run.add_argument("--llm-latency-s", type=float, default=1.0, help="mean stand-in LLM call time")
+    run.add_argument("--render-latency-s", type=float, default=8.0, help="mean stand-in provider render time")
+    run.add_argument("--sample-s", type=float, default=5.0, help="resource sampling interval")
+    run.add_argument("--warmup-s", type=float, default=30.0, help="ignored when computing growth rates")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--keep", action="store_true", help="keep the work dir (media/, server.log)")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="tabulate reports; the first is the baseline")
+    compare.add_argument("reports", nargs="+")
+    compare.add_argument("--max-fd-growth", type=float, default=10.0, help="flag fd growth above this per hour")
+    compare.add_argument("--max-rss-growth-mb", type=float, default=50.0, help="flag RSS growth above this MB per hour")
+    compare.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
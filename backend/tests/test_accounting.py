@@ -0,0 +1,149 @@
+# backend/tests/test_accounting.py
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+from backend import accounting
+from backend.accounting import (
+    AccountingStore,
+    Ledger,
+    current_ledger,
+    job_ledger,
+    record_clip,
+    record_llm,
+    set_job_id,
+    stage_timer,
+)
+from backend.deadline import run_in_context
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AccountingStore:
+    store = AccountingStore(tmp_path / "accounting")
+    monkeypatch.setattr(accounting, "get_accounting", lambda: store)
+    return store
+
+
+def test_clip_costs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(accounting, "PROVIDER_PRICES", {"luma": 0.1})
+    ledger = Ledger("video")
+    ledger.add_clip("luma", requested_s=3, billed_s=5, wall_s=40)
+    ledger.add_clip("luma", requested_s=7, billed_s=10, wall_s=60)
+    ledger.add_clip("luma", requested_s=5, billed_s=0, wall_s=0.1, reused=True)
+    ledger.add_clip("local", requested_s=5, billed_s=5, wall_s=2)
+    luma = ledger.to_dict()["providers"]["luma"]
+    assert luma["clips"] == 2
+    assert luma["reused_clips"] == 1
+    assert luma["billed_s"] == 15
+    assert luma["excess_s"] == 5
+    assert luma["cost"] == pytest.approx(1.5)
+    assert ledger.to_dict()["providers"]["local"]["cost"] == 0
+
+
+def test_recording_without_a_job_is_a_no_op() -> None:
+    assert current_ledger() is None
+    record_llm("ollama", {"eval_count": 10})
+    record_clip("luma", {"duration": 5}, 1.0)
+    with stage_timer("plan"):
+        pass
+
+
+def test_job_ledger_records_on_exit(store: AccountingStore) -> None:
+    with job_ledger("video") as ledger:
+        with job_ledger("inner") as inner:
+            assert inner is ledger  # nested blocks share the outer ledger
+        record_llm(None, {"prompt_eval_count": 100, "eval_count": 20, "eval_ms": 50.0})
+        record_clip("luma", {"duration": 5, "requested_duration": 3}, 30.0)
+        with stage_timer("render"):
+            pass
+        assert store.get(ledger.ledger_id)["status"] == "running"
+
+    record = store.get(ledger.ledger_id)
+    assert record["status"] == "ok"
+    assert record["kind"] == "video"
+    assert record["llm"]["mock"]["prompt_tokens"] == 100
+    assert record["providers"]["luma"]["excess_s"] == 2
+    assert record["stages"]["render"]["calls"] == 1
+    assert current_ledger() is None
+
+    written = list(store.root.glob("ledger-*.jsonl"))
+    assert len(written) == 1
+    assert json.loads(written[0].read_text())["ledger_id"] == ledger.ledger_id
+
+
+def test_failed_job_is_recorded_as_error(store: AccountingStore) -> None:
+    with pytest.raises(RuntimeError):
+        with job_ledger("video") as ledger:
+            raise RuntimeError("boom")
+    assert store.get(ledger.ledger_id)["status"] == "error"
+
+
+def test_set_job_id_rekeys_running_ledger(store: AccountingStore) -> None:
+    with job_ledger("video") as ledger:
+        old_id = ledger.ledger_id
+        set_job_id("job-42")
+        set_job_id("job-43")  # only the first id sticks
+        assert store.running("job-42") is ledger
+        assert store.running(old_id) is None
+    assert store.get("job-42")["job_id"] == "job-42"
+
+
+def test_ledger_follows_work_into_pool_threads(store: AccountingStore) -> None:
+    with job_ledger("video") as ledger:
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(run_in_context(lambda i: record_clip("mock", {"duration": 1}, 0.1)), range(8)))
+    assert store.get(ledger.ledger_id)["providers"]["mock"]["clips"] == 8
+
+
+def test_summary_and_export(store: AccountingStore) -> None:
+    for _ in range(2):
+        with job_ledger("video"):
+            record_clip("luma", {"duration": 5}, 10.0)
+    summary = store.summary()
+    assert summary["jobs"] == 2
+    assert summary["providers"]["luma"]["billed_s"] == 10
+
+    lines = store.export("jsonl").splitlines()
+    assert len(lines) == 2
+    rows = list(csv.DictReader(io.StringIO(store.export("csv"))))
+    billed = [r for r in rows if r["section"] == "providers" and r["metric"] == "billed_s"]
+    assert [float(r["value"]) for r in billed] == [5.0, 5.0]
+
+
+def test_recent_ledgers_are_capped(tmp_path: Path) -> None:
+    store = AccountingStore(tmp_path, max_jobs=2)
+    ledgers = [Ledger("video") for _ in range(3)]
+    for ledger in ledgers:
+        ledger.finished_at = ledger.started_at
+        store.finished(ledger)
+    assert store.get(ledgers[0].ledger_id) is None
+    assert store.get(ledgers[2].ledger_id) is not None
+    assert len(store.export("jsonl").splitlines()) == 3  # the files keep everything
+
+
+def test_storyboard_response_links_its_ledger(store: AccountingStore, monkeypatch: pytest.MonkeyPatch) -> None:
+    from fastapi.testclient import TestClient
+
+    from backend.agents import planner
+    from backend.api import main
+    from backend.api.cache import ResultCache
+
+    def _plan(desc: str, max_scenes: int, best_of: Optional[int]) -> Dict[str, Any]:
+        record_llm("ollama", {"prompt_eval_count": 100, "eval_count": 20})
+        return {"shots": []}
+
+    monkeypatch.setattr(planner, "extract_product_attributes_from_text", lambda text: text)
+    monkeypatch.setattr(planner, "plan_storyboard", _plan)
+    monkeypatch.setattr(main, "storyboard_cache", ResultCache())
+    monkeypatch.setattr(main, "get_accounting", lambda: store)
+    client = TestClient(main.app)
+
+    body = client.post("/generate/storyboard", json={"product_description": "sneakers"}).json()
+    record = client.get(f"/accounting/jobs/{body['ledger_id']}").json()
+    assert (record["kind"], record["status"]) == ("storyboard", "ok")
+    assert record["llm"]["ollama"]["calls"] == 1
@@ -0,0 +1,128 @@
+# backend/tests/test_batch.py
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from backend import accounting
+from backend.accounting import AccountingStore
+from backend.pipelines import keyframes, video_pipeline
+from backend.pipelines.batch import BatchRunner, load_manifest
+
+
+@pytest.fixture(autouse=True)
+def ledgers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = AccountingStore(tmp_path / "accounting")
+    monkeypatch.setattr(accounting, "get_accounting", lambda: store)
+
+
+def _records(path: Path) -> Dict[str, Dict[str, Any]]:
+    return {rec["id"]: rec for rec in map(json.loads, path.read_text().splitlines())}
+
+
+def _run(runner: BatchRunner, items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """runner.run on a thread, so a hung run fails the test instead of blocking it."""
+    out: Dict[str, Any] = {}
+    thread = threading.Thread(target=lambda: out.update(runner.run(iter(items))), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "batch run hung"
+    return out
+
+
+@pytest.fixture
+def pipeline(monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """
+    Stand-in plan/render/concat stages. Each item plans into scenes chained per
+    its "parents"; scenes listed in its "fail" raise when rendered.
+    """
+    calls: Dict[str, Any] = {"rendered": [], "lock": threading.Lock()}
+
+    def _plan(self: BatchRunner, item: Dict[str, Any]) -> Dict[str, Any]:
+        parents: List[Optional[int]] = item.get("parents", [None])
+        scenes = [{"index": i, "item": item["id"], "fail": i in item.get("fail", ())} for i in range(len(parents))]
+        return {"job_id": f"job-{item['id']}", "scenes": scenes, "parents": parents}
+
+    def _render(scene: Dict[str, Any], job_id: str, parent: Any = None, parent_clip: Optional[str] = None) -> str:
+        with calls["lock"]:
+            calls["rendered"].append((scene["item"], scene["index"], parent_clip))
+        if scene["fail"]:
+            raise RuntimeError(f"scene {scene['index']} failed")
+        return f"{job_id}/scene_{scene['index']}.mp4"
+
+    def _finalize(job_id: str, scenes: List[Dict[str, Any]], paths: List[str], renditions: Any) -> Dict[str, Any]:
+        return {"final_video_path": f"{job_id}/final.mp4", "scene_count": len(paths)}
+
+    monkeypatch.setattr(BatchRunner, "_plan", _plan)
+    monkeypatch.setattr(keyframes, "render_chained_clip", _render)
+    monkeypatch.setattr(video_pipeline, "finalize_job", _finalize)
+    return calls
+
+
+def test_load_manifest_keeps_ok_ids_and_skips_a_torn_line(tmp_path: Path) -> None:
+    manifest = tmp_path / "manifest.jsonl"
+    assert load_manifest(str(manifest)) == set()
+    manifest.write_text(
+        '{"id": "a", "status": "ok"}\n'
+        '{"id": "b", "status": "error"}\n'
+        '{"id": "c", "status": "ok"}\n'
+        '{"id": "d", "sta'
+    )
+    assert load_manifest(str(manifest)) == {"a", "c"}
+
+
+def test_resume_skips_finished_items(tmp_path: Path, pipeline: Dict[str, Any]) -> None:
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text('{"id": "a", "status": "ok"}\n{"id": "b", "status": "error"}\n{"id": "c", "sta')
+    items = [{"id": i, "product_description": i} for i in ("a", "b", "c")]
+
+    stats = _run(BatchRunner(str(manifest), max_in_flight=2), items)
+    assert stats == {"ok": 2, "error": 0, "skipped": 1}
+    assert sorted(item for item, _, _ in pipeline["rendered"]) == ["b", "c"]
+    lines = manifest.read_text().splitlines()
+    assert lines[2] == '{"id": "c", "sta'  # the torn line is left alone, not joined to the next record
+    new = {rec["id"]: rec for rec in map(json.loads, lines[3:])}
+    assert {i: r["status"] for i, r in new.items()} == {"b": "ok", "c": "ok"}
+    assert new["b"]["final_video_path"] == "job-b/final.mp4" and new["b"]["ledger_id"]
+    assert load_manifest(str(manifest)) == {"a", "b", "c"}
+
+
+def test_chained_scenes_render_after_their_parent(tmp_path: Path, pipeline: Dict[str, Any]) -> None:
+    manifest = tmp_path / "manifest.jsonl"
+    items = [{"id": "a", "product_description": "a", "parents": [None, 0, None, 2]}]
+
+    assert _run(BatchRunner(str(manifest)), items)["ok"] == 1
+    rendered = {index: clip for _, index, clip in pipeline["rendered"]}
+    assert rendered == {0: None, 1: "job-a/scene_0.mp4", 2: None, 3: "job-a/scene_2.mp4"}
+    assert _records(manifest)["a"]["scene_count"] == 4
+
+
+def test_failed_scene_drops_its_descendants(tmp_path: Path, pipeline: Dict[str, Any]) -> None:
+    manifest = tmp_path / "manifest.jsonl"
+    items = [
+        {"id": "a", "product_description": "a", "parents": [None, 0, 1, None], "fail": [0]},
+        {"id": "b", "product_description": "b"},
+    ]
+
+    assert _run(BatchRunner(str(manifest), max_in_flight=1), items) == {"ok": 1, "error": 1, "skipped": 0}
+    assert sorted(index for item, index, _ in pipeline["rendered"] if item == "a") == [0, 3]
+    record = _records(manifest)["a"]
+    assert (record["status"], record["error"]) == ("error", "RuntimeError: scene 0 failed")
+
+
+def test_callback_error_fails_the_item_instead_of_hanging(
+    tmp_path: Path, pipeline: Dict[str, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def _broken(self: BatchRunner, *args: Any) -> None:
+        raise KeyError("scenes")
+
+    monkeypatch.setattr(BatchRunner, "_submit_scene", _broken)
+    manifest = tmp_path / "manifest.jsonl"
+    items = [{"id": i, "product_description": i, "parents": [None, None]} for i in ("a", "b", "c")]
+
+    assert _run(BatchRunner(str(manifest), max_in_flight=1), items) == {"ok": 0, "error": 3, "skipped": 0}
+    records = manifest.read_text().splitlines()
+    assert len(records) == 3  # one record per item, however many callbacks failed
+    assert _records(manifest)["a"]["error"] == "KeyError: 'scenes'"
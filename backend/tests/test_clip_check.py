@@ -0,0 +1,151 @@
+# backend/tests/test_clip_check.py
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from backend.pipelines import clip_check
+from backend.pipelines.clip_check import ClipInfo, ClipValidationError, concat_compatible, generate_valid_clip
+
+FFMPEG_I = b"""Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'scene_0.mp4':
+  Duration: 00:00:05.04, start: 0.000000, bitrate: 1205 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1280x720 [SAR 1:1 DAR 16:9], 1198 kb/s, 24 fps, 24 tbr, 12288 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 2 kb/s (default)
+At least one output file must be specified
+"""
+
+
+def _clip(**fields: Any) -> ClipInfo:
+    base = dict(path="c.mp4", size=10_000, duration=5.0, width=1280, height=720, vcodec="h264", pix_fmt="yuv420p")
+    return ClipInfo(**{**base, **fields})
+
+
+def test_probe_parses_ffmpeg_output(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        clip_check.subprocess, "run", lambda *a, **k: subprocess.CompletedProcess(a, 1, stderr=FFMPEG_I)
+    )
+    info = clip_check._probe_ffmpeg("scene_0.mp4", 760_000)
+    assert info == ClipInfo(
+        "scene_0.mp4", 760_000, duration=5.04, width=1280, height=720, vcodec="h264", pix_fmt="yuv420p",
+        fps=24.0, has_audio=True,
+    )
+    assert info.ok
+
+
+def test_probe_without_video_stream(monkeypatch: pytest.MonkeyPatch) -> None:
+    err = b"scene_0.mp4: Invalid data found when processing input\n"
+    monkeypatch.setattr(clip_check.subprocess, "run", lambda *a, **k: subprocess.CompletedProcess(a, 1, stderr=err))
+    info = clip_check._probe_ffmpeg("scene_0.mp4", 5000)
+    assert info.error == "scene_0.mp4: Invalid data found when processing input"
+    assert not info.ok
+
+
+def test_probe_rejects_small_and_missing_files(tmp_path: Path) -> None:
+    small = tmp_path / "small.mp4"
+    small.write_bytes(b"x" * 10)
+    assert clip_check.probe_clip(str(small)).error == "too small (10 bytes)"
+    assert clip_check.probe_clip(str(tmp_path / "nope.mp4")).error == "missing"
+
+
+def test_validate_checks_duration_and_tail(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(clip_check, "CLIP_DECODE_TAIL", True)
+    monkeypatch.setattr(clip_check, "probe_clip", lambda path: _clip(duration=2.0))
+    monkeypatch.setattr(clip_check, "_decodes_to_end", lambda path: None)
+    assert clip_check.validate_clip("c.mp4", {"duration": 4}).ok
+    assert clip_check.validate_clip("c.mp4", {"duration": 5}).error == "too short (2.00s of 5s)"
+
+    monkeypatch.setattr(clip_check, "_decodes_to_end", lambda path: "tail does not decode: moov atom not found")
+    assert clip_check.validate_clip("c.mp4", {"duration": 2}).error == "tail does not decode: moov atom not found"
+
+
+def test_concat_compatible() -> None:
+    assert concat_compatible([])
+    assert concat_compatible([_clip(), _clip(duration=3.0)])
+    assert not concat_compatible([_clip(), _clip(width=720, height=1280)])
+    assert not concat_compatible([_clip(), _clip(vcodec="hevc")])
+    assert not concat_compatible([_clip(), _clip(has_audio=True)])
+
+
+@pytest.fixture
+def provider(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> List[Path]:
+    """Stand-in provider: each call writes a new clip file and returns its path."""
+    calls: List[Path] = []
+
+    def _generate(scene: Dict[str, Any], job_id: str, provider: str) -> str:
+        path = tmp_path / f"scene_{scene['index']}_{len(calls)}.mp4"
+        path.write_bytes(b"clip")
+        calls.append(path)
+        return str(path)
+
+    monkeypatch.setattr(clip_check, "select_provider", lambda: "mock")
+    monkeypatch.setattr(clip_check, "generate_clip", _generate)
+    monkeypatch.setattr(clip_check, "CLIP_MAX_ATTEMPTS", 2)
+    return calls
+
+
+def test_bad_clip_is_rendered_again(monkeypatch: pytest.MonkeyPatch, provider: List[Path]) -> None:
+    results = iter([_clip(error="no video stream"), _clip()])
+    monkeypatch.setattr(clip_check, "validate_clip", lambda path, scene: next(results))
+
+    path = generate_valid_clip({"index": 0, "duration": 5}, "job1")
+    assert path == str(provider[1])
+    assert not provider[0].exists()  # the rejected clip is deleted
+
+
+def test_gives_up_after_max_attempts(monkeypatch: pytest.MonkeyPatch, provider: List[Path]) -> None:
+    monkeypatch.setattr(clip_check, "validate_clip", lambda path, scene: _clip(error="too short (1.00s of 5s)"))
+
+    with pytest.raises(ClipValidationError) as info:
+        generate_valid_clip({"index": 3, "duration": 5}, "job1")
+    assert (info.value.scene_index, info.value.reason) == (3, "too short (1.00s of 5s)")
+    assert len(provider) == 2
+    assert not any(p.exists() for p in provider)
+
+
+def test_damaged_download_is_fetched_again_not_rendered(
+    monkeypatch: pytest.MonkeyPatch, provider: List[Path]
+) -> None:
+    results = iter([_clip(error="tail does not decode: moov atom not found"), _clip()])
+    monkeypatch.setattr(clip_check, "validate_clip", lambda path, scene: next(results))
+    fetched: List[str] = []
+    monkeypatch.setattr(clip_check, "redownload_clip", lambda path: fetched.append(path) or True)
+
+    path = generate_valid_clip({"index": 0, "duration": 5}, "job1")
+    assert path == str(provider[0]) and fetched == [path]
+    assert len(provider) == 1  # no second (billed) render
+
+
+def test_content_failure_is_rendered_again(monkeypatch: pytest.MonkeyPatch, provider: List[Path]) -> None:
+    results = iter([_clip(error="too short (1.00s of 5s)"), _clip()])
+    monkeypatch.setattr(clip_check, "validate_clip", lambda path, scene: next(results))
+    fetched: List[str] = []
+    monkeypatch.setattr(clip_check, "redownload_clip", lambda path: fetched.append(path) or True)
+
+    assert generate_valid_clip({"index": 0, "duration": 5}, "job1") == str(provider[1])
+    assert fetched == []
+
+
+def test_redownload_uses_the_recorded_url(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    import requests
+
+    from backend.integrations import video_client
+
+    class _Response:
+        def __init__(self, content: bytes):
+            self.content = content
+
+        def raise_for_status(self) -> None:
+            if not self.content:
+                raise requests.HTTPError("410 Gone")
+
+    bodies = iter([b"cut", b"whole clip", b""])
+    urls: List[str] = []
+    monkeypatch.setattr(requests, "get", lambda url, timeout: urls.append(url) or _Response(next(bodies)))
+    clip = tmp_path / "scene_0.mp4"
+
+    assert not video_client.redownload_clip(str(clip))  # never downloaded
+    video_client.download_clip("https://cdn/out.mp4", clip)
+    assert video_client.redownload_clip(str(clip))
+    assert clip.read_bytes() == b"whole clip" and urls == ["https://cdn/out.mp4"] * 2
+    assert not video_client.redownload_clip(str(clip))  # expired URL
@@ -0,0 +1,101 @@
+# backend/tests/test_clip_index.py
+from pathlib import Path
+
+import pytest
+
+from backend.storage import clip_index
+from backend.storage.clip_index import REUSE_EXACT, REUSE_OFF, REUSE_SIMILAR, ClipIndex, minhash, similarity
+
+TEXT = "red sneaker marble kitchen counter morning light"
+# One added adjective: Jaccard of words and word pairs is 11/14
+REWORDED = "red sneaker white marble kitchen counter morning light"
+UNRELATED = "beach sunset surfboard wave"
+
+
+@pytest.fixture
+def clip(tmp_path: Path) -> Path:
+    path = tmp_path / "clips" / "scene_0.mp4"
+    path.parent.mkdir()
+    path.write_bytes(b"clip")
+    return path
+
+
+@pytest.fixture
+def index(tmp_path: Path) -> ClipIndex:
+    return ClipIndex(tmp_path / "clip_index.jsonl")
+
+
+def test_minhash_estimates_jaccard() -> None:
+    assert minhash(TEXT) == minhash(TEXT)
+    assert similarity(minhash(TEXT), minhash(TEXT)) == 1.0
+    assert 0.65 <= similarity(minhash(TEXT), minhash(REWORDED)) <= 0.9
+    assert similarity(minhash(TEXT), minhash(UNRELATED)) < 0.1
+
+
+def test_exact_lookup(index: ClipIndex, clip: Path) -> None:
+    index.add("k1", "g1", TEXT, str(clip))
+    assert index.lookup("k1", "g1", TEXT) == (str(clip), 1.0)
+    assert index.lookup("k2", "g1", TEXT, mode=REUSE_EXACT) is None
+    assert index.lookup("k1", "g1", TEXT, mode=REUSE_OFF) is None
+
+
+def test_similar_lookup_within_group(index: ClipIndex, clip: Path) -> None:
+    index.add("k1", "g1", TEXT, str(clip))
+    # Exact mode never matches on text
+    assert index.lookup("k2", "g1", REWORDED, mode=REUSE_EXACT) is None
+
+    path, score = index.lookup("k2", "g1", REWORDED, mode=REUSE_SIMILAR)
+    assert path == str(clip)
+    assert score >= clip_index.CLIP_REUSE_THRESHOLD
+    assert index.lookup("k2", "g1", UNRELATED, mode=REUSE_SIMILAR) is None
+    # Same text, different type/camera/caption/product: never reused
+    assert index.lookup("k2", "g2", TEXT, mode=REUSE_SIMILAR) is None
+
+
+def test_similar_lookup_respects_threshold(index: ClipIndex, clip: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    index.add("k1", "g1", TEXT, str(clip))
+    monkeypatch.setattr(clip_index, "CLIP_REUSE_THRESHOLD", 0.95)
+    assert index.lookup("k2", "g1", REWORDED, mode=REUSE_SIMILAR) is None
+    assert index.lookup("k2", "g1", TEXT, mode=REUSE_SIMILAR) == (str(clip), 1.0)
+
+
+def test_similar_lookup_prefers_closest(index: ClipIndex, tmp_path: Path) -> None:
+    near, far = tmp_path / "near.mp4", tmp_path / "far.mp4"
+    near.write_bytes(b"near")
+    far.write_bytes(b"far")
+    index.add("far", "g1", "red sneaker white marble kitchen counter evening light", str(far))
+    index.add("near", "g1", REWORDED, str(near))
+    assert index.lookup("new", "g1", TEXT, mode=REUSE_SIMILAR)[0] == str(near)
+
+
+def test_deleted_clips_are_dropped(index: ClipIndex, clip: Path) -> None:
+    index.add("k1", "g1", TEXT, str(clip))
+    clip.unlink()
+    assert index.lookup("k1", "g1", TEXT, mode=REUSE_SIMILAR) is None
+    assert "k1" not in index._entries
+    assert not index._bands
+
+
+def test_reload_from_disk(tmp_path: Path, clip: Path) -> None:
+    gone = tmp_path / "gone.mp4"
+    gone.write_bytes(b"gone")
+    first = ClipIndex(tmp_path / "clip_index.jsonl")
+    first.add("k1", "g1", TEXT, str(clip))
+    first.add("k2", "g1", UNRELATED, str(gone))
+    first.add("k1", "g1", TEXT, str(clip))  # re-added: one line after compaction
+    gone.unlink()
+
+    second = ClipIndex(tmp_path / "clip_index.jsonl")
+    assert second.lookup("k1", "g1", TEXT) == (str(clip), 1.0)
+    assert second.lookup("k3", "g1", REWORDED, mode=REUSE_SIMILAR)[0] == str(clip)
+    assert len((tmp_path / "clip_index.jsonl").read_text().splitlines()) == 1
+
+
+def test_oldest_entries_are_evicted(tmp_path: Path, clip: Path) -> None:
+    index = ClipIndex(tmp_path / "clip_index.jsonl", max_entries=2)
+    index.add("k1", "g1", TEXT, str(clip))
+    index.add("k2", "g1", UNRELATED, str(clip))
+    index.lookup("k1", "g1", TEXT)  # k1 is now the most recently used
+    index.add("k3", "g1", "blue bottle", str(clip))
+    assert list(index._entries) == ["k1", "k3"]
+    assert index.lookup("k2", "g1", UNRELATED) is None
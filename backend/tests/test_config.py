@@ -0,0 +1,78 @@
+# backend/tests/test_config.py
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from backend.config import env_flag, process_singleton
+
+
+def test_env_flag(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("VELOCITY2_TEST_FLAG", raising=False)
+    assert not env_flag("VELOCITY2_TEST_FLAG")
+    assert env_flag("VELOCITY2_TEST_FLAG", "1")
+    for value, expected in (("On", True), ("YES", True), ("true", True), ("0", False), ("off", False), ("", False)):
+        monkeypatch.setenv("VELOCITY2_TEST_FLAG", value)
+        assert env_flag("VELOCITY2_TEST_FLAG", "1") is expected
+
+
+def test_process_singleton_builds_once_under_contention() -> None:
+    calls: List[int] = []
+    gate = threading.Event()
+
+    @process_singleton
+    def get_thing() -> object:
+        calls.append(1)
+        gate.wait(5)
+        time.sleep(0.01)
+        return object()
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(get_thing) for _ in range(8)]
+        gate.set()
+        things = {id(f.result(5)) for f in futures}
+    assert len(calls) == 1
+    assert len(things) == 1
+
+
+def test_process_singleton_per_args_and_cache_clear() -> None:
+    @process_singleton
+    def get_named(name: str) -> List[str]:
+        return [name]
+
+    llm = get_named("llm")
+    assert get_named("llm") is llm
+    assert get_named("render") == ["render"]
+
+    get_named.cache_clear()  # type: ignore[attr-defined]
+    assert get_named("llm") is not llm
+
+
+def test_failed_build_is_retried() -> None:
+    attempts: List[int] = []
+
+    @process_singleton
+    def get_flaky() -> int:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("not configured")
+        return len(attempts)
+
+    with pytest.raises(ValueError):
+        get_flaky()
+    assert get_flaky() == 2
+    assert get_flaky() == 2
+
+
+def test_provider_modules_import_without_http_clients() -> None:
+    # Fresh interpreter: other tests may already have imported requests here
+    code = (
+        "import sys, backend.integrations.video_client, backend.integrations.pika_client; "
+        "print(sorted(m for m in ('requests', 'backend.integrations.local_render') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
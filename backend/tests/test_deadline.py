@@ -0,0 +1,124 @@
+# backend/tests/test_deadline.py
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+import pytest
+
+from backend.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    check_deadline,
+    current_deadline,
+    deadline_scope,
+    degraded_scope,
+    new_deadline,
+    note_degraded,
+    raise_timeout,
+    run_in_context,
+    stage_timeout,
+    time_left,
+)
+from backend.integrations import video_client
+from backend.pipelines import video_pipeline
+from backend.pipelines.clip_check import ClipInfo
+
+
+def test_deadline_scope_nests_and_resets() -> None:
+    outer, inner = Deadline(60), Deadline(5)
+    assert current_deadline() is None and time_left() == float("inf")
+    with deadline_scope(outer):
+        with deadline_scope(inner):
+            assert current_deadline() is inner
+        assert current_deadline() is outer
+        with deadline_scope(None):
+            assert time_left() == float("inf")  # a job without a deadline inside one with
+    assert current_deadline() is None
+
+
+def test_new_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert new_deadline(None) is None
+    assert new_deadline(0) is None
+    assert new_deadline(30).budget_s == 30
+    monkeypatch.setattr("backend.deadline.DEFAULT_JOB_DEADLINE_S", 90.0)
+    assert new_deadline(None).budget_s == 90
+    assert new_deadline(10).budget_s == 10
+
+
+def test_stage_timeout_is_capped_by_time_left() -> None:
+    assert stage_timeout("render", 300) == 300
+    with deadline_scope(Deadline(10)):
+        assert 9 < stage_timeout("render", 300) <= 10
+        assert stage_timeout("render", 2) == 2
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded, match="render"):
+            stage_timeout("render", 300)
+        with pytest.raises(DeadlineExceeded) as info:
+            check_deadline("plan")
+        assert info.value.stage == "plan"
+
+
+def test_run_in_context_carries_deadline_and_degradation_into_pool_threads() -> None:
+    deadline = Deadline(60)
+
+    def _work(i: int) -> Any:
+        note_degraded("fast_tier")
+        return current_deadline()
+
+    with ThreadPoolExecutor(2) as pool:
+        with deadline_scope(deadline), degraded_scope() as degraded:
+            assert list(pool.map(run_in_context(_work), range(4))) == [deadline] * 4
+            assert pool.submit(current_deadline).result() is None  # not without run_in_context
+    assert degraded == ["fast_tier"]
+    note_degraded("refine_skipped")  # outside a scope: no-op
+
+
+def test_raise_timeout() -> None:
+    timeout = subprocess.TimeoutExpired(["ffmpeg"], 300)
+    with pytest.raises(subprocess.TimeoutExpired):
+        raise_timeout("concat", timeout)  # no deadline: only the stage cap ran out
+    with deadline_scope(Deadline(60)):
+        with pytest.raises(subprocess.TimeoutExpired):
+            raise_timeout("concat", timeout)  # deadline not reached
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded, match="concat"):
+            raise_timeout("concat", timeout)
+
+
+def test_select_provider_switches_to_fast_tier(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(video_client, "VIDEO_PROVIDER", "Luma")
+    monkeypatch.setattr(video_client, "VIDEO_FAST_TIER_BELOW_S", 120.0)
+    monkeypatch.setattr(video_client, "VIDEO_PROVIDER_FAST", "")
+    with degraded_scope() as degraded:
+        with deadline_scope(Deadline(60)):
+            assert video_client.select_provider() == "luma"  # no fast tier configured
+        monkeypatch.setattr(video_client, "VIDEO_PROVIDER_FAST", "Local")
+        assert video_client.select_provider() == "luma"  # no deadline
+        with deadline_scope(Deadline(600)):
+            assert video_client.select_provider() == "luma"
+        assert degraded == []
+        with deadline_scope(Deadline(60)):
+            assert video_client.select_provider() == "local"
+    assert degraded == ["fast_tier"]
+
+
+def test_concat_timeout_is_not_a_deadline(monkeypatch: pytest.MonkeyPatch, tmp_path: Any) -> None:
+    def _timeout(args: List[str], timeout: float) -> None:
+        time.sleep(min(timeout, 0.1))
+        raise subprocess.TimeoutExpired(["ffmpeg"], timeout)
+
+    clip = ClipInfo("c.mp4", 10_000, duration=5.0, width=1280, height=720, vcodec="h264", pix_fmt="yuv420p")
+    monkeypatch.setattr(video_pipeline, "probe_clip", lambda path: clip)
+    monkeypatch.setattr(video_pipeline, "run_ffmpeg", _timeout)
+    out = str(tmp_path / "final.mp4")
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        video_pipeline.concat_videos_ffmpeg(["a.mp4", "b.mp4"], out)
+    assert not (tmp_path / "final.txt").exists()
+
+    # A trimmed (re-encoded) assembly whose ffmpeg runs out the job's deadline
+    with deadline_scope(Deadline(0.05)), pytest.raises(DeadlineExceeded, match="concat"):
+        video_pipeline.assemble_clips(["a.mp4"], [{"duration": 3.0}], out)
+    with pytest.raises(subprocess.TimeoutExpired):
+        video_pipeline.assemble_clips(["a.mp4"], [{"duration": 3.0}], out)
@@ -0,0 +1,100 @@
+# backend/tests/test_job_runner.py
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+
+import pytest
+
+from backend import accounting, job_runner
+from backend.accounting import AccountingStore
+from backend.deadline import time_left
+from backend.job_runner import STATUS_DONE, STATUS_ERROR, STATUS_RUNNING, JobRecord, JobRunner
+from backend.pipelines.media_workers import PRIORITY_INTERACTIVE, current_priority
+from backend.scheduler import current_tenant
+
+
+@pytest.fixture
+def runner(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[JobRunner]:
+    store = AccountingStore(tmp_path / "accounting")
+    monkeypatch.setattr(accounting, "get_accounting", lambda: store)
+    runner = JobRunner(tmp_path / "jobs", workers=2, tenant="ui")
+    yield runner
+    runner._pool.shutdown(wait=True)  # before the ledger store is unpatched
+
+
+def _wait(runner: JobRunner, job_id: str) -> JobRecord:
+    deadline = time.time() + 5
+    record = runner.get(job_id)
+    while record is not None and not record.finished and time.time() < deadline:
+        time.sleep(0.01)
+    return record
+
+
+def test_same_key_shares_the_job(runner: JobRunner) -> None:
+    release = threading.Event()
+    calls = []
+
+    def _render(product: str) -> str:
+        calls.append(product)
+        release.wait(5)
+        return f"{product}.mp4"
+
+    first = runner.submit("ui_video", _render, "sneakers", key="k1")
+    assert runner.submit("ui_video", _render, "sneakers", key="k1") == first  # while running
+    other = runner.submit("ui_video", _render, "boots", key="k2")
+    assert other != first
+    release.set()
+
+    assert _wait(runner, first).result == "sneakers.mp4"
+    assert runner.submit("ui_video", _render, "sneakers", key="k1") == first  # once done
+    unkeyed = runner.submit("ui_video", _render, "sneakers")
+    assert unkeyed != first  # no key: never shared
+    _wait(runner, unkeyed)
+    _wait(runner, other)
+    assert calls.count("sneakers") == 2
+
+
+def test_failed_job_is_retried_under_the_same_key(runner: JobRunner) -> None:
+    def _boom() -> None:
+        raise ValueError("no clips")
+
+    failed = runner.submit("ui_video", _boom, key="k")
+    record = _wait(runner, failed)
+    assert (record.status, record.error) == (STATUS_ERROR, "ValueError: no clips")
+    assert runner.submit("ui_video", lambda: "ok", key="k") != failed
+
+
+def test_jobs_run_interactive_with_the_runner_tenant(runner: JobRunner) -> None:
+    def _context() -> Tuple[Any, ...]:
+        return current_priority(), current_tenant(), time_left() < 60
+
+    job_id = runner.submit("ui_storyboard", _context, deadline_s=60)
+    assert _wait(runner, job_id).result == (PRIORITY_INTERACTIVE, "ui", True)
+
+
+def test_records_persist_across_restarts(runner: JobRunner, tmp_path: Path) -> None:
+    done = runner.submit("ui_storyboard", lambda: {"shots": []})
+    _wait(runner, done)
+    state_dir = tmp_path / "jobs"
+    stuck = JobRecord(job_id="abc123", kind="ui_video", status=STATUS_RUNNING)
+    (state_dir / "abc123.json").write_text(json.dumps(stuck.__dict__))
+
+    restarted = JobRunner(state_dir)
+    record = restarted.get(done)
+    assert (record.status, record.result) == (STATUS_DONE, {"shots": []})
+    interrupted = restarted.get("abc123")
+    assert (interrupted.status, interrupted.error) == (STATUS_ERROR, "Interrupted by a server restart")
+    assert restarted.get("../jobs/abc123") is None
+    assert restarted.get("missing") is None
+
+
+def test_finished_jobs_expire(runner: JobRunner, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    old = runner.submit("ui_video", lambda: "ok", key="k")
+    _wait(runner, old)
+    monkeypatch.setattr(job_runner, "JOB_RUNNER_RETENTION_S", -1.0)
+    new = runner.submit("ui_video", lambda: "ok", key="other")
+    assert not (tmp_path / "jobs" / f"{old}.json").exists()
+    assert runner.get(old) is None
+    assert runner.submit("ui_video", lambda: "ok", key="k") not in (old, new)
@@ -0,0 +1,146 @@
+# backend/tests/test_keyframes.py
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from backend.pipelines import keyframes
+from backend.pipelines.clip_check import ClipInfo
+from backend.pipelines.keyframes import (
+    KEYFRAMES_ALL,
+    KEYFRAMES_OFF,
+    KEYFRAMES_SETTING,
+    chain_parents,
+    extract_last_frame,
+    render_scenes,
+    render_waves,
+)
+from backend.storage import media_store
+from backend.storage.media_store import MediaStore
+
+
+def _scene(index: int, context: Optional[str] = None) -> Dict[str, Any]:
+    return {"index": index, "duration": 5, "canon": {"context": context} if context is not None else {}}
+
+
+def test_chain_parents_by_mode() -> None:
+    scenes = [_scene(0, "kitchen"), _scene(1, "kitchen"), _scene(2, "street"), _scene(3, "street")]
+    assert chain_parents(scenes, KEYFRAMES_OFF) == [None, None, None, None]
+    assert chain_parents(scenes, KEYFRAMES_ALL) == [None, 0, 1, 2]
+    assert chain_parents(scenes, KEYFRAMES_SETTING) == [None, 0, None, 2]
+    assert chain_parents([], KEYFRAMES_ALL) == []
+
+
+def test_same_setting_compares_the_packed_boundary() -> None:
+    # Packed scenes join their shots' settings; the cut is between the last and the first
+    scenes = [_scene(0, "kitchen / street"), _scene(1, "street / park"), _scene(2, "kitchen")]
+    assert chain_parents(scenes, KEYFRAMES_SETTING) == [None, 0, None]
+
+
+def test_unknown_settings_are_not_chained() -> None:
+    scenes = [_scene(0), _scene(1), _scene(2, ""), _scene(3, "")]
+    assert chain_parents(scenes, KEYFRAMES_SETTING) == [None, None, None, None]
+    assert chain_parents(scenes, KEYFRAMES_ALL) == [None, 0, 1, 2]
+
+
+def test_render_waves_group_by_chain_depth() -> None:
+    assert render_waves([]) == []
+    assert render_waves([None, None, None]) == [[0, 1, 2]]
+    assert render_waves([None, 0, 1, 2]) == [[0], [1], [2], [3]]
+    # Three chains side by side: 0-1, 2-3-4, 5
+    assert render_waves([None, 0, None, 2, 3, None]) == [[0, 2, 5], [1, 3], [4]]
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch: pytest.MonkeyPatch) -> List[List[str]]:
+    """Stand-in ffmpeg: records its arguments and writes the output image."""
+    calls: List[List[str]] = []
+
+    def _run(args: List[str], timeout: float) -> None:
+        calls.append(args)
+        Path(args[-1]).write_bytes(b"jpeg:" + args[args.index("-i") + 1].encode())
+
+    monkeypatch.setattr(keyframes, "run_ffmpeg", _run)
+    monkeypatch.setattr(keyframes, "probe_clip", lambda path: ClipInfo(path, 10_000, duration=5.0))
+    return calls
+
+
+def _seek(args: List[str]) -> List[str]:
+    return args[: args.index("-i")]
+
+
+def test_extract_last_frame_seeks_to_the_kept_end(tmp_path: Path, ffmpeg: List[List[str]]) -> None:
+    clip = tmp_path / "scene_0.mp4"
+    clip.write_bytes(b"clip")
+
+    # The final cut keeps 1.0-3.0s: take the frame at 3.0s, not the clip's end
+    scene = {"index": 0, "duration": 5, "segments": [{"start": 0, "duration": 0.5}, {"start": 1.0, "duration": 2.0}]}
+    frame = extract_last_frame(str(clip), scene, tmp_path / "a" / "scene_0.jpg")
+    assert frame is not None and frame.read_bytes() == b"jpeg:" + str(clip).encode()
+    assert _seek(ffmpeg[-1]) == ["-ss", "2.750", "-t", "0.250"]
+    assert not list(frame.parent.glob("*.part.jpg"))
+
+    # A scene asking for more than the clip holds ends at the clip's end
+    extract_last_frame(str(clip), {"index": 0, "duration": 8}, tmp_path / "b.jpg")
+    assert _seek(ffmpeg[-1]) == ["-ss", "4.750", "-t", "0.250"]
+
+
+def test_extract_last_frame_is_cached_per_clip(tmp_path: Path, ffmpeg: List[List[str]]) -> None:
+    clip = tmp_path / "scene_1.mp4"
+    clip.write_bytes(b"clip")
+    scene = {"index": 1, "duration": 5}
+
+    first = extract_last_frame(str(clip), scene, tmp_path / "job1.jpg")
+    reused = extract_last_frame(str(clip), scene, tmp_path / "job2.jpg")
+    assert len(ffmpeg) == 1
+    assert reused == tmp_path / "job2.jpg" and reused.read_bytes() == first.read_bytes()
+
+    time.sleep(0.01)
+    clip.write_bytes(b"re-rendered clip")  # new file identity: extracted again
+    extract_last_frame(str(clip), scene, tmp_path / "job1.jpg")
+    assert len(ffmpeg) == 2
+
+
+def test_extract_last_frame_failure(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def _fail(args: List[str], timeout: float) -> None:
+        Path(args[-1]).write_bytes(b"partial")
+        raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(keyframes, "run_ffmpeg", _fail)
+    monkeypatch.setattr(keyframes, "probe_clip", lambda path: ClipInfo(path, 10_000, error="no video stream"))
+    clip = tmp_path / "scene_2.mp4"
+    clip.write_bytes(b"clip")
+
+    assert extract_last_frame(str(clip), {"index": 2, "duration": 5}, tmp_path / "scene_2.jpg") is None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["scene_2.mp4"]
+
+
+def test_render_scenes_chains_each_wave_onto_the_last(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, ffmpeg: List[List[str]]
+) -> None:
+    store = MediaStore(tmp_path)
+    monkeypatch.setattr(media_store, "get_media_store", lambda: store)
+    monkeypatch.setattr(keyframes, "get_media_store", lambda: store)
+    rendered: Dict[int, Dict[str, Any]] = {}
+    lock = threading.Lock()
+
+    def _generate(scene: Dict[str, Any], job_id: str) -> str:
+        path = store.scene_clip_path(job_id, scene)
+        path.write_bytes(f"clip {scene['index']}".encode())
+        with lock:
+            rendered[scene["index"]] = scene
+        return str(path)
+
+    monkeypatch.setattr(keyframes, "generate_valid_clip", _generate)
+    scenes = [_scene(0, "kitchen"), _scene(1, "kitchen"), _scene(2, "street")]
+
+    paths = render_scenes(scenes, "job1", KEYFRAMES_SETTING)
+    assert paths == [str(store.scene_clip_path("job1", s)) for s in scenes]
+    assert "frame0" not in rendered[0] and "frame0" not in rendered[2]  # chain heads
+    frame = Path(rendered[1]["frame0"])
+    assert frame == store.keyframe_path("job1", scenes[0])
+    assert frame.read_bytes() == b"jpeg:" + paths[0].encode()  # the parent's clip
+    assert rendered[1]["frame0_sha"] == hashlib.sha256(frame.read_bytes()).hexdigest()
@@ -0,0 +1,109 @@
+# backend/tests/test_llm_backends.py
+from typing import Any, Dict, List
+
+import pytest
+import requests
+
+from backend.agents import llm_backends, llm_client
+from backend.agents.llm_backends import KIND_OLLAMA, Backend, BackendPool
+
+
+def _pool(n: int) -> BackendPool:
+    return BackendPool([Backend(KIND_OLLAMA, f"http://gpu{i}:11434", "phi3", name=f"gpu{i}") for i in range(n)])
+
+
+def test_pick_least_outstanding_and_release() -> None:
+    pool = _pool(2)
+    first = pool.pick()
+    second = pool.pick()
+    assert {first.name, second.name} == {"gpu0", "gpu1"}  # one each before doubling up
+    assert pool.pick(exclude=[first, second]) is None
+
+    pool.release(first, ok=True)
+    assert first.outstanding == 0
+    assert pool.pick() is first
+
+
+def test_breaker_opens_and_half_open_trial(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(llm_backends, "BREAKER_FAILURES", 2)
+    now = [1000.0]
+    monkeypatch.setattr(llm_backends.time, "time", lambda: now[0])
+    pool = _pool(1)
+    backend = pool.backends[0]
+
+    for _ in range(2):
+        pool.release(pool.pick(), ok=False)
+    assert backend.open_until == 1000.0 + llm_backends.BREAKER_COOLDOWN_S
+    assert pool.pick() is None
+    assert pool.snapshot()[0]["breaker"] == "open"
+
+    now[0] = backend.open_until
+    assert pool.pick() is backend  # the one trial request
+    assert pool.pick() is None
+    pool.release(backend, ok=False)  # trial failed: open again
+    assert pool.pick() is None
+
+    now[0] = backend.open_until
+    pool.release(pool.pick(), ok=True)
+    assert (backend.failures, backend.open_until) == (0, 0.0)
+    assert pool.snapshot()[0]["breaker"] == "closed"
+
+
+def test_release_without_verdict_keeps_breaker() -> None:
+    pool = _pool(1)
+    backend = pool.pick()
+    pool.release(backend, ok=None)
+    assert (backend.outstanding, backend.failures) == (0, 0)
+
+
+def _http_error(status: int) -> requests.exceptions.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status} error", response=response)
+
+
+@pytest.fixture
+def backends(monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """Two stand-in backends; map a backend name to a status (error) or content (reply)."""
+    pool = _pool(2)
+    replies: Dict[str, Any] = {}
+
+    def _post(backend: Backend, *args: Any) -> Dict[str, Any]:
+        reply = replies[backend.name]
+        if isinstance(reply, int):
+            raise _http_error(reply)
+        return {"content": reply}
+
+    monkeypatch.setattr(llm_client, "get_pool", lambda: pool)
+    monkeypatch.setattr(llm_client, "_post_ollama", _post)
+    monkeypatch.setattr(llm_backends.random, "choice", lambda items: items[0])  # gpu0 first
+    return replies
+
+
+MESSAGES: List[Dict[str, str]] = [{"role": "user", "content": "hi"}]
+
+
+@pytest.mark.parametrize("status", [401, 403, 404, 429, 503])
+def test_fails_over_on_backend_specific_errors(backends: Dict[str, Any], status: int) -> None:
+    backends.update(gpu0=status, gpu1="hello")
+    result = llm_client._chat_with_stats(MESSAGES, 0.3, None, None)
+    assert (result["content"], result["backend"], result["mock"]) == ("hello", "gpu1", False)
+
+
+@pytest.mark.parametrize("status", [400, 422])
+def test_bad_request_is_not_retried(backends: Dict[str, Any], status: int) -> None:
+    backends.update(gpu0=status, gpu1="hello")
+    with pytest.raises(requests.exceptions.HTTPError):
+        llm_client._chat_with_stats(MESSAGES, 0.3, None, None)
+
+
+def test_same_4xx_from_every_backend_is_raised(backends: Dict[str, Any]) -> None:
+    backends.update(gpu0=404, gpu1=404)
+    with pytest.raises(requests.exceptions.HTTPError, match="404"):
+        llm_client._chat_with_stats(MESSAGES, 0.3, None, None)
+
+
+def test_mock_when_every_backend_fails(backends: Dict[str, Any]) -> None:
+    backends.update(gpu0=401, gpu1=503)
+    result = llm_client._chat_with_stats(MESSAGES, 0.3, None, None)
+    assert result["mock"] and result["backend"] is None
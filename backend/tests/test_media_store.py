@@ -0,0 +1,129 @@
+# backend/tests/test_media_store.py
+import time
+from pathlib import Path
+
+import pytest
+
+from backend.storage import media_store
+from backend.storage.media_store import MediaStore, RetentionPolicy
+
+HOUR = 3600.0
+
+
+def _store(root: Path) -> MediaStore:
+    return MediaStore(root, RetentionPolicy(committed_ttl_s=10 * HOUR, temp_ttl_s=HOUR, quota_bytes=0))
+
+
+def _finish(store: MediaStore, job_id: str, size: int = 100) -> None:
+    store.final_path(job_id).write_bytes(b"x" * size)
+    store.commit_job(job_id)
+
+
+def test_layout_and_commit(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    store.begin_job("abc123")
+    assert store.job_dir("abc123") == tmp_path / "jobs" / "ab" / "abc123"
+    assert (store.job_dir("abc123") / "clips").is_dir()
+    assert store.committed_final("abc123") is None  # not committed yet
+
+    _finish(store, "abc123")
+    assert store.committed_final("abc123") == store.final_path("abc123").resolve()
+    assert store.committed_file("abc123", "../job.json") is None
+    assert store.committed_file("abc123", "missing.mp4") is None
+    assert store.usage_bytes() >= 100
+
+
+def test_pinned_jobs_survive_delete_and_retention(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    _finish(store, "job1")
+    later = time.time() + 11 * HOUR
+
+    with store.pinned("job1"):
+        assert not store.delete_job("job1")
+        assert store.gc(now=later)["removed"] == 0
+        assert store.committed_final("job1") is not None
+
+    assert store.gc(now=later)["removed"] == 1
+    assert store.committed_final("job1") is None
+    assert not store.job_dir("job1").exists()
+
+
+def test_pins_nest(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    _finish(store, "job1")
+    store.pin("job1")
+    store.pin("job1")
+    store.unpin("job1")
+    assert not store.delete_job("job1")
+    store.unpin("job1")
+    store.unpin("job1")  # extra unpins are harmless
+    assert store.delete_job("job1")
+
+
+def test_pin_unknown_job(tmp_path: Path) -> None:
+    with pytest.raises(KeyError):
+        _store(tmp_path).pin("nope")
+
+
+def test_gc_expires_stale_temp_jobs(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    store.begin_job("fresh")
+    store.begin_job("stale")
+    store._temp["stale"].created_at -= 2 * HOUR
+    assert store.gc()["removed"] == 1
+    assert store.job_dir("fresh").exists()
+    assert not store.job_dir("stale").exists()
+
+
+def test_gc_keeps_committed_jobs_in_retention(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    _finish(store, "old")
+    _finish(store, "new")
+    store._committed["old"].committed_at -= 11 * HOUR
+    assert store.gc()["removed"] == 1
+    assert store.committed_final("old") is None
+    assert store.committed_final("new") is not None
+
+
+def test_quota_evicts_oldest_unpinned_first(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    for job_id in ("job1", "job2", "job3", "job4"):
+        _finish(store, job_id, size=1000)
+    assert store._committed["job1"].bytes == 1000  # job.json isn't counted
+    kept = store._committed["job1"].bytes + store._committed["job4"].bytes
+    store.policy.quota_bytes = kept
+
+    with store.pinned("job1"):
+        result = store.gc()
+    assert result["removed"] == 2
+    assert result["usage_bytes"] == kept
+    assert [j for j in ("job1", "job2", "job3", "job4") if store.committed_final(j)] == ["job1", "job4"]
+
+
+def test_index_reloads_from_disk(tmp_path: Path) -> None:
+    store = _store(tmp_path)
+    _finish(store, "first")
+    _finish(store, "second")
+    store.begin_job("pending")
+    (tmp_path / "jobs" / "or" / "orphan").mkdir(parents=True)  # no job.json
+
+    reloaded = _store(tmp_path)
+    assert reloaded.committed_final("first") is not None
+    assert list(reloaded._committed) == ["first", "second"]
+    assert set(reloaded._temp) == {"pending", "orphan"}
+
+
+def test_gc_walks_temp_jobs_outside_the_lock(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = _store(tmp_path)
+    store.begin_job("rendering")
+    (store.job_dir("rendering") / "clips" / "scene_0.mp4").write_bytes(b"x" * 500)
+    walked = []
+
+    def _size(path: Path) -> int:
+        walked.append(store._lock.locked())
+        return 500
+
+    monkeypatch.setattr(media_store, "_dir_size", _size)
+    store.gc()
+    assert walked == [False]
+    assert store._temp["rendering"].bytes == 500
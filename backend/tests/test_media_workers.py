@@ -0,0 +1,79 @@
+# backend/tests/test_media_workers.py
+import threading
+import time
+from typing import List
+
+import pytest
+
+from backend.pipelines import media_workers
+from backend.pipelines.media_workers import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    SlotPool,
+    _parse_cpus,
+    media_slot,
+    priority_scope,
+)
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch) -> SlotPool:
+    pool = SlotPool(1)
+    monkeypatch.setattr(media_workers, "get_slot_pool", lambda: pool)
+    monkeypatch.setattr(media_workers, "_gating", True)
+    return pool
+
+
+def test_media_slot_yields_remaining_timeout(pool: SlotPool) -> None:
+    with media_slot() as left:
+        assert left is None
+        assert pool.busy == 1
+    assert pool.busy == 0
+
+    assert pool.acquire(PRIORITY_BATCH)
+    threading.Timer(0.1, pool.release).start()
+    with media_slot(timeout=5) as left:
+        assert 4.0 < left < 4.95  # the wait for the slot counts against the timeout
+
+
+def test_media_slot_times_out(pool: SlotPool) -> None:
+    assert pool.acquire(PRIORITY_BATCH)
+    with pytest.raises(TimeoutError):
+        with media_slot(timeout=0.01):
+            pass
+    assert pool.busy == 1
+
+
+def test_media_slot_queues_at_context_priority(pool: SlotPool) -> None:
+    assert pool.acquire(PRIORITY_BATCH)
+    order: List[str] = []
+
+    def _run(label: str, priority: int) -> None:
+        with priority_scope(priority), media_slot(timeout=5):
+            order.append(label)
+
+    batch = threading.Thread(target=_run, args=("batch", PRIORITY_BATCH))
+    batch.start()
+    while not pool.snapshot()["queued"]:
+        time.sleep(0.005)
+    interactive = threading.Thread(target=_run, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    while sum(pool.snapshot()["queued"].values()) < 2:
+        time.sleep(0.005)
+
+    pool.release()
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_children_skip_gating(pool: SlotPool, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(media_workers, "_gating", False)
+    assert pool.acquire(PRIORITY_BATCH)
+    with media_slot(timeout=0.01) as left:
+        assert left == 0.01
+
+
+def test_parse_cpus() -> None:
+    assert _parse_cpus("2-4, 7,") == {2, 3, 4, 7}
+    assert _parse_cpus("") == set()
@@ -0,0 +1,90 @@
+# backend/tests/test_packaging.py
+import shutil
+import subprocess
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from backend.deadline import Deadline, DeadlineExceeded, deadline_scope
+from backend.pipelines import packaging
+from backend.pipelines.ffmpeg_tools import FFMPEG_BIN, run_ffmpeg
+from backend.pipelines.packaging import _rung_size, package_video, parse_ladder
+
+SCENES = [{"index": 0, "duration": 1.0}, {"index": 1, "duration": 1.0}]
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which(FFMPEG_BIN) is None, reason="ffmpeg not installed")
+
+
+def test_parse_ladder() -> None:
+    assert parse_ladder("480:1200k, 1080:5000K,,720:2800") == [(1080, 5000), (720, 2800), (480, 1200)]
+
+
+def test_rung_size_keeps_aspect_and_even_sides() -> None:
+    assert _rung_size((1920, 1080), 720) == (1280, 720)
+    assert _rung_size((1080, 1920), 480) == (480, 854)
+    assert _rung_size((1000, 1000), 360) == (360, 360)
+
+
+def _faststart(path: Path) -> bool:
+    data = path.read_bytes()
+    return 0 <= data.find(b"moov") < data.find(b"mdat")
+
+
+@needs_ffmpeg
+def test_package_video(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    src = tmp_path / "final.mp4"
+    run_ffmpeg([
+        "-f", "lavfi", "-i", "testsrc=size=640x360:rate=24:duration=2",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=2",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", str(src),
+    ], timeout=60)
+    monkeypatch.setattr(packaging, "video_dimensions", lambda path: (640, 360))
+    monkeypatch.setattr(packaging, "PACKAGING_HLS_SEGMENT_S", 1)
+
+    out = tmp_path / "package"
+    result = package_video(str(src), str(out), SCENES, hls=True, ladder=[(720, 2000), (360, 700), (240, 300)])
+
+    # No upscaling: the 720p rung is skipped for a 360p source
+    assert [(r["short_side"], r["width"], r["height"]) for r in result["ladder"]] == [(360, 640, 360), (240, 426, 240)]
+    for rung in result["ladder"]:
+        path = Path(rung["path"])
+        assert path.exists() and _faststart(path)
+        playlist = out / "hls" / f"{rung['short_side']}p" / "index.m3u8"
+        assert "#EXT-X-ENDLIST" in playlist.read_text()
+        assert list(playlist.parent.glob("seg_*.ts"))
+    assert not list(out.glob("ladder/*.part.mp4"))
+
+    master = Path(result["hls"]).read_text().splitlines()
+    assert master[0] == "#EXTM3U"
+    assert master[3] == "360p/index.m3u8" and master[5] == "240p/index.m3u8"
+    assert "RESOLUTION=640x360" in master[2]
+
+    assert Path(result["poster"]).stat().st_size > 0
+    assert [Path(p).name for p in result["thumbnails"]] == ["scene_0.jpg", "scene_1.jpg"]
+    assert all(Path(p).exists() for p in result["thumbnails"])
+
+
+class _SlowTimeoutPool:
+    """Stands in for the process pool: each task takes 0.1s, then times out."""
+
+    def submit(self, fn: Any, *args: Any) -> Future:
+        time.sleep(0.1)
+        fut: Future = Future()
+        fut.set_exception(subprocess.TimeoutExpired(["ffmpeg"], 0.1))
+        return fut
+
+
+def test_timeouts_are_deadline_exceeded_only_past_the_deadline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(packaging, "get_packaging_pool", lambda: _SlowTimeoutPool())
+    monkeypatch.setattr(packaging, "video_dimensions", lambda path: (640, 360))
+    ladder: List[Any] = [(360, 700)]
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        package_video("final.mp4", str(tmp_path), SCENES, hls=False, ladder=ladder)
+    with deadline_scope(Deadline(0.05)), pytest.raises(DeadlineExceeded, match="packaging"):
+        package_video("final.mp4", str(tmp_path), SCENES, hls=False, ladder=ladder)
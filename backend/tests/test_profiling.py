@@ -0,0 +1,102 @@
+# backend/tests/test_profiling.py
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import accounting, profiling
+from backend.accounting import Ledger
+from backend.api import main
+from backend.profiling import Profiler, job_thread
+
+
+class _NoRunningJobs:
+    def running(self, job_id: str) -> Optional[Ledger]:
+        return None
+
+
+@pytest.fixture
+def profiler(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Profiler:
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(accounting, "get_accounting", lambda: _NoRunningJobs())
+    return Profiler()
+
+
+def _busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_armed_job_is_profiled_when_it_starts(profiler: Profiler) -> None:
+    assert profiler.arm_job("job-1") == {"status": "armed", "job_id": "job-1"}
+    assert profiler.status()["armed"] == ["job-1"]
+
+    ledger = Ledger("video", job_id="job-1")
+    profiler.job_started(ledger)
+    assert profiler.status()["armed"] == []
+
+    stop = threading.Event()
+
+    def _work() -> None:
+        with job_thread(ledger):
+            _busy(stop)
+
+    worker = threading.Thread(target=_work, name="scene-render_0")
+    other = threading.Thread(target=_busy, args=(stop,))  # not the job's thread
+    worker.start()
+    other.start()
+    time.sleep(0.2)
+    summary = profiler.job_finished(ledger)
+    stop.set()
+    worker.join()
+    other.join()
+
+    assert summary is not None and summary["samples"] > 0
+    folded = (profiler.folded_path(summary["profile_id"]) or Path()).read_text()
+    assert folded.startswith("scene-render;")  # only the job's thread, grouped by pool name
+    assert "backend.tests.test_profiling._busy" in {f["function"] for f in summary["functions"]}
+    assert profiler.get(summary["profile_id"]) == summary
+    assert profiler.job_finished(ledger) is None
+
+
+def test_unprofiled_job_and_unknown_profile(profiler: Profiler) -> None:
+    ledger = Ledger("video", job_id="job-2")
+    profiler.job_started(ledger)
+    assert profiler.job_finished(ledger) is None
+    assert profiler.folded_path("../../etc/passwd") is None
+
+
+def test_armed_set_is_capped_and_expires(profiler: Profiler, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILE_MAX_ARMED", 2)
+    for job_id in ("a", "b", "c"):
+        profiler.arm_job(job_id)
+    assert profiler.status()["armed"] == ["b", "c"]  # oldest dropped
+
+    now = time.time()
+    monkeypatch.setattr(profiling.time, "time", lambda: now + profiling.PROFILE_ARM_TTL_S + 1)
+    assert profiler.status()["armed"] == []
+
+
+def test_window_profile_finishes_by_itself(profiler: Profiler) -> None:
+    started = profiler.start_window(0.05)
+    deadline = time.time() + 5
+    while profiler.get(started["profile_id"]) is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert profiler.get(started["profile_id"])["samples"] > 0
+
+
+def test_admin_routes_need_the_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = TestClient(main.app)
+    assert client.get("/admin/profile").status_code == 404  # off without ADMIN_TOKEN
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/admin/profile").status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.post("/admin/profile/jobs/job-1").status_code == 403
+    response = client.get("/admin/profile", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert set(response.json()) == {"active", "armed", "recent"}
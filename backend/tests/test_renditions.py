@@ -0,0 +1,88 @@
+# backend/tests/test_renditions.py
+import subprocess
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from backend.api import main
+from backend.deadline import Deadline, DeadlineExceeded, deadline_scope
+from backend.pipelines import renditions
+from backend.pipelines.renditions import (
+    FIT_AUTO,
+    FIT_CROP,
+    FIT_PAD,
+    FIT_RENDER,
+    Rendition,
+    _plan_fit,
+    encode_rendition,
+    parse_rendition,
+)
+from backend.storage import media_store
+from backend.storage.media_store import MediaStore
+
+
+def test_parse_rendition() -> None:
+    assert parse_rendition("9:16") == Rendition("9:16", 720, "h264", FIT_AUTO)
+    assert parse_rendition(" 1x1@1080:HEVC ", fit=FIT_PAD) == Rendition("1:1", 1080, "hevc", FIT_PAD)
+    assert parse_rendition("16:9@480").name == "16x9_480_h264"
+    for bad in ("", "9:16@", "9/16", "0:16", "9:16@720:vp9", "portrait"):
+        with pytest.raises(ValueError):
+            parse_rendition(bad)
+    with pytest.raises(ValueError):
+        parse_rendition("9:16", fit="stretch")
+
+
+def test_explicit_fit_is_kept() -> None:
+    for fit in (FIT_CROP, FIT_PAD, FIT_RENDER):
+        assert _plan_fit(Rendition("9:16", fit=fit), (1920, 1080), 16 / 9) == fit
+
+
+def test_auto_fit_crops_when_enough_frame_is_kept() -> None:
+    # 1:1 from 16:9 keeps 56% of the frame and downscales 1080 -> 720
+    assert _plan_fit(Rendition("1:1", 720), (1920, 1080), 16 / 9) == FIT_CROP
+    # Same aspect: a no-op crop
+    assert _plan_fit(Rendition("16:9", 480), (1920, 1080), 16 / 9) == FIT_CROP
+    # Size unknown (probe failed): judged from the planned aspect alone
+    assert _plan_fit(Rendition("4:3", 1080), None, 16 / 9) == FIT_CROP
+
+
+def test_auto_fit_renders_when_crop_loses_too_much() -> None:
+    # 9:16 from 16:9 would keep only 32% of the frame
+    assert _plan_fit(Rendition("9:16", 720), (1920, 1080), 16 / 9) == FIT_RENDER
+    assert _plan_fit(Rendition("9:16", 720), None, 16 / 9) == FIT_RENDER
+
+
+def test_auto_fit_renders_when_crop_needs_upscaling(monkeypatch: pytest.MonkeyPatch) -> None:
+    # A 360x360 crop blown up to 1080x1080 is 3x
+    assert _plan_fit(Rendition("1:1", 1080), (640, 360), 16 / 9) == FIT_RENDER
+    monkeypatch.setattr(renditions, "RENDITION_MAX_UPSCALE", 4.0)
+    assert _plan_fit(Rendition("1:1", 1080), (640, 360), 16 / 9) == FIT_CROP
+
+
+def test_encode_timeout_is_deadline_exceeded_only_past_the_deadline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def _timeout(args: List[str], timeout: float) -> None:
+        Path(args[-1]).write_bytes(b"partial")
+        raise subprocess.TimeoutExpired(["ffmpeg"], timeout)
+
+    monkeypatch.setattr(renditions, "run_ffmpeg", _timeout)
+    dst = str(tmp_path / "final_9x16.mp4")
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        encode_rendition("final.mp4", dst, Rendition("9:16"), FIT_PAD)
+    assert not list(tmp_path.iterdir())  # the partial output is removed
+
+    with deadline_scope(Deadline(0)), pytest.raises(DeadlineExceeded):
+        # Spent before the encode starts
+        encode_rendition("final.mp4", dst, Rendition("9:16"), FIT_PAD)
+
+
+def test_media_url(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store = MediaStore(tmp_path)
+    monkeypatch.setattr(media_store, "get_media_store", lambda: store)
+    final = store.final_path("job1", "ladder/720p.mp4")
+    assert main._media_url("job1", str(final)) == "/jobs/job1/media/ladder/720p.mp4"
+    assert main._media_url("job1", str(store.job_dir("job1") / "clips" / "scene_0.mp4")) is None
+    assert main._media_url("job1", "/elsewhere/final/x.mp4") is None
@@ -0,0 +1,185 @@
+# backend/tests/test_result_cache.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from backend.api.cache import ResultCache, etag_for, etag_matches, request_key
+from backend.deadline import DeadlineExceeded
+
+
+class Body(BaseModel):
+    product_description: str
+    max_scenes: int = 4
+    deadline_s: Optional[float] = None
+
+
+def test_request_key_ignores_deadline() -> None:
+    key = request_key("video", Body(product_description="sneakers"))
+    assert key == request_key("video", Body(product_description="sneakers", deadline_s=30))
+    assert key != request_key("video", Body(product_description="sneakers", max_scenes=3))
+    assert key != request_key("storyboard", Body(product_description="sneakers"))
+
+
+def test_etags() -> None:
+    etag = etag_for({"b": 1, "a": [1, 2]})
+    assert etag == etag_for({"a": [1, 2], "b": 1})
+    assert etag != etag_for({"a": [2, 1], "b": 1})
+    assert etag.startswith('"') and etag.endswith('"')
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_miss_then_hit() -> None:
+    cache = ResultCache()
+    calls: List[int] = []
+
+    def compute() -> Any:
+        calls.append(1)
+        return {"video": "final.mp4"}
+
+    value, etag, hit = cache.get_or_compute("k", compute)
+    assert (value, hit) == ({"video": "final.mp4"}, False)
+    assert etag == etag_for(value)
+    assert cache.get_or_compute("k", compute) == (value, etag, True)
+    assert len(calls) == 1
+
+
+def test_concurrent_requests_compute_once() -> None:
+    cache = ResultCache()
+    started, release = threading.Event(), threading.Event()
+    calls: List[int] = []
+
+    def compute() -> Any:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"n": len(calls)}
+
+    with ThreadPoolExecutor(8) as pool:
+        first = pool.submit(cache.get_or_compute, "k", compute)
+        assert started.wait(5)
+        rest = [pool.submit(cache.get_or_compute, "k", compute) for _ in range(7)]
+        # Let the waiters reach the in-flight future before the owner finishes
+        time.sleep(0.05)
+        release.set()
+        results = [first.result(5), *(f.result(5) for f in rest)]
+
+    assert len(calls) == 1
+    assert {(r[0]["n"], r[1]) for r in results} == {(1, etag_for({"n": 1}))}
+    assert [r[2] for r in results] == [False] + [True] * 7
+
+
+def test_failure_reaches_waiters_and_is_not_cached() -> None:
+    cache = ResultCache()
+    started, release = threading.Event(), threading.Event()
+
+    def compute() -> Any:
+        started.set()
+        release.wait(5)
+        raise RuntimeError("render failed")
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_compute, "k", compute)
+        assert started.wait(5)
+        waiter = pool.submit(cache.get_or_compute, "k", compute)
+        time.sleep(0.05)
+        release.set()
+        for fut in (owner, waiter):
+            with pytest.raises(RuntimeError, match="render failed"):
+                fut.result(5)
+
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", lambda: "ok")[:2] == ("ok", etag_for("ok"))
+
+
+def test_ttl_and_lru_eviction_call_on_evict() -> None:
+    evicted: List[Any] = []
+    cache = ResultCache(max_entries=2, ttl_s=3600, on_evict=evicted.append)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")  # a is now the most recently used
+    cache.put("c", "C")
+    assert evicted == ["B"]
+    assert cache.get("b") is None
+
+    cache.put("a", "A2")  # replacing an entry evicts the old value
+    assert evicted == ["B", "A"]
+
+    cache.invalidate("c")
+    assert evicted == ["B", "A", "C"]
+
+    cache.ttl_s = 0
+    time.sleep(0.01)
+    assert cache.get("a") is None
+    assert evicted == ["B", "A", "C", "A2"]
+
+
+def test_on_evict_errors_are_ignored() -> None:
+    def boom(value: Any) -> None:
+        raise OSError("unpin failed")
+
+    cache = ResultCache(max_entries=1, on_evict=boom)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("b") == ("B", etag_for("B"))
+
+
+def test_uncacheable_result_is_not_shared() -> None:
+    cache = ResultCache()
+    started, release = threading.Event(), threading.Event()
+    calls: List[int] = []
+
+    def compute() -> Any:
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            return {"degraded": ["refine_skipped"]}
+        return {"n": len(calls)}
+
+    def cacheable(value: Any) -> bool:
+        return not value.get("degraded")
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_compute, "k", compute, cacheable)
+        assert started.wait(5)
+        waiter = pool.submit(cache.get_or_compute, "k", compute, cacheable)
+        time.sleep(0.05)
+        release.set()
+        assert owner.result(5)[0] == {"degraded": ["refine_skipped"]}
+        assert waiter.result(5) == ({"n": 2}, etag_for({"n": 2}), False)  # computed its own
+
+    assert cache.get("k") == ({"n": 2}, etag_for({"n": 2}))
+
+
+def test_waiters_recompute_after_owner_deadline() -> None:
+    cache = ResultCache()
+    started, release = threading.Event(), threading.Event()
+    calls: List[int] = []
+
+    def compute() -> Any:
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            raise DeadlineExceeded("plan")
+        return "ok"
+
+    with ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(cache.get_or_compute, "k", compute)
+        assert started.wait(5)
+        waiter = pool.submit(cache.get_or_compute, "k", compute)
+        time.sleep(0.05)
+        release.set()
+        with pytest.raises(DeadlineExceeded):
+            owner.result(5)
+        assert waiter.result(5) == ("ok", etag_for("ok"), False)
+    assert len(calls) == 2
@@ -0,0 +1,189 @@
+# backend/tests/test_scheduler.py
+import threading
+import time
+from typing import Callable, List, Tuple
+
+import pytest
+
+from backend import scheduler
+from backend.deadline import Deadline, DeadlineExceeded, deadline_scope
+from backend.pipelines.media_workers import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, SlotPool, priority_scope
+from backend.scheduler import AdmissionRejected, StageScheduler, tenant_scope
+
+
+def _wait_for(cond: Callable[[], bool], timeout: float = 5.0) -> None:
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "timed out waiting"
+        time.sleep(0.005)
+
+
+def _queued(sched: StageScheduler) -> int:
+    return sum(n for tenants in sched.snapshot()["queued"].values() for n in tenants.values())
+
+
+def _enqueue(sched: StageScheduler, order: List[Tuple[str, str]], label: str, priority: int, tenant: str) -> None:
+    """Start a call that records `label` once granted; returns once it is queued."""
+    before = _queued(sched)
+
+    def _run() -> None:
+        if sched.acquire(priority, tenant, timeout=5):
+            order.append((label, tenant))
+
+    threading.Thread(target=_run, daemon=True).start()
+    _wait_for(lambda: _queued(sched) == before + 1)
+
+
+def _drain(sched: StageScheduler, order: List[Tuple[str, str]], holder: str, calls: int) -> List[str]:
+    """Release the held slot, then each granted call's slot in turn; returns the grant order."""
+    sched.release(holder, 1.0)
+    for n in range(1, calls + 1):
+        _wait_for(lambda: len(order) >= n)
+        sched.release(order[n - 1][1], 1.0)
+    return [label for label, _ in order]
+
+
+def test_higher_class_goes_first() -> None:
+    sched = StageScheduler("render", capacity=1, service_s=1.0)
+    assert sched.acquire(PRIORITY_BATCH, "holder")
+    order: List[Tuple[str, str]] = []
+    _enqueue(sched, order, "batch1", PRIORITY_BATCH, "t")
+    _enqueue(sched, order, "normal", PRIORITY_NORMAL, "t")
+    _enqueue(sched, order, "interactive", PRIORITY_INTERACTIVE, "t")
+    _enqueue(sched, order, "batch2", PRIORITY_BATCH, "t")
+
+    assert _drain(sched, order, "holder", 4) == ["interactive", "normal", "batch1", "batch2"]
+    stats = sched.snapshot()["stats"]
+    # normal arrived after one batch call, interactive after it and normal
+    assert stats["preempted"] == 3
+    assert sched.running == 0
+
+
+def test_tenants_take_turns_within_a_class() -> None:
+    sched = StageScheduler("llm", capacity=1, service_s=1.0)
+    assert sched.acquire(PRIORITY_NORMAL, "holder")
+    order: List[Tuple[str, str]] = []
+    for i in range(3):
+        _enqueue(sched, order, f"a{i}", PRIORITY_NORMAL, "a")
+    for i in range(2):
+        _enqueue(sched, order, f"b{i}", PRIORITY_NORMAL, "b")
+
+    # FIFO would run all of a first
+    assert _drain(sched, order, "holder", 5) == ["a0", "b0", "a1", "b1", "a2"]
+
+
+def test_tenant_with_fewest_running_is_served() -> None:
+    sched = StageScheduler("render", capacity=2, service_s=1.0)
+    assert sched.acquire(PRIORITY_NORMAL, "a")
+    assert sched.acquire(PRIORITY_NORMAL, "a")
+    order: List[Tuple[str, str]] = []
+    _enqueue(sched, order, "a", PRIORITY_NORMAL, "a")
+    _enqueue(sched, order, "b", PRIORITY_NORMAL, "b")
+
+    sched.release("a", 1.0)
+    _wait_for(lambda: len(order) == 1)
+    # a still has a call running, b has none
+    assert order == [("b", "b")]
+
+
+def test_projected_wait_counts_only_calls_ahead() -> None:
+    sched = StageScheduler("render", capacity=1, service_s=10.0)
+    assert sched.projected_wait(PRIORITY_BATCH) == 0.0
+    assert sched.acquire(PRIORITY_BATCH, "holder")
+    order: List[Tuple[str, str]] = []
+    for i in range(3):
+        _enqueue(sched, order, f"batch{i}", PRIORITY_BATCH, "t")
+
+    assert sched.projected_wait(PRIORITY_BATCH) == 40.0
+    # Queued batch work doesn't delay an interactive call
+    assert sched.projected_wait(PRIORITY_INTERACTIVE) == 10.0
+    _drain(sched, order, "holder", 3)
+
+
+def test_admission_rejects_when_wait_exceeds_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scheduler, "SCHED_ADMISSION", True)
+    sched = StageScheduler("render", capacity=1, service_s=10.0)
+    assert sched.acquire(PRIORITY_NORMAL, "holder")
+
+    with deadline_scope(Deadline(5.0)):
+        with pytest.raises(AdmissionRejected) as info:
+            sched.acquire(PRIORITY_NORMAL, "t", timeout=0.01)
+    assert info.value.projected_wait_s == 10.0
+    assert isinstance(info.value, DeadlineExceeded)
+    assert sched.snapshot()["stats"]["rejected"] == 1
+    assert _queued(sched) == 0
+
+    # Enough time left: the call queues (and here times out instead)
+    with deadline_scope(Deadline(30.0)):
+        assert not sched.acquire(PRIORITY_NORMAL, "t", timeout=0.01)
+    # No deadline: never rejected up front
+    assert not sched.acquire(PRIORITY_NORMAL, "t", timeout=0.01)
+    assert sched.snapshot()["stats"]["timeouts"] == 2
+
+    monkeypatch.setattr(scheduler, "SCHED_ADMISSION", False)
+    with deadline_scope(Deadline(5.0)):
+        assert not sched.acquire(PRIORITY_NORMAL, "t", timeout=0.01)
+
+
+def test_slot_uses_context_priority_and_tenant() -> None:
+    sched = StageScheduler("llm", capacity=1, service_s=1.0)
+    with priority_scope(PRIORITY_INTERACTIVE), tenant_scope("acme"):
+        with sched.slot():
+            snap = sched.snapshot()
+            assert snap["running_by_tenant"] == {"acme": 1}
+            assert snap["stats"][f"granted_p{PRIORITY_INTERACTIVE}"] == 1
+    assert sched.running == 0
+
+
+def test_slot_waits_at_most_until_the_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scheduler, "SCHED_ADMISSION", False)
+    sched = StageScheduler("llm", capacity=1, service_s=1.0)
+    assert sched.acquire(PRIORITY_NORMAL, "holder")
+    start = time.monotonic()
+    with deadline_scope(Deadline(0.05)):
+        with pytest.raises(DeadlineExceeded):
+            with sched.slot():
+                pass
+    assert time.monotonic() - start < 1.0
+
+
+# ---- SlotPool --------------------------------------------------------------
+
+
+def test_slot_pool_serves_by_priority_then_fifo() -> None:
+    pool = SlotPool(1)
+    assert pool.acquire(PRIORITY_BATCH)
+    order: List[str] = []
+
+    def _run(label: str, priority: int) -> None:
+        if pool.acquire(priority, timeout=5):
+            order.append(label)
+
+    calls = [
+        ("batch", PRIORITY_BATCH),
+        ("normal1", PRIORITY_NORMAL),
+        ("interactive", PRIORITY_INTERACTIVE),
+        ("normal2", PRIORITY_NORMAL),
+    ]
+    for label, priority in calls:
+        queued = sum(pool.snapshot()["queued"].values())
+        threading.Thread(target=_run, args=(label, priority), daemon=True).start()
+        _wait_for(lambda: sum(pool.snapshot()["queued"].values()) == queued + 1)
+
+    for n in range(1, 5):
+        pool.release()
+        _wait_for(lambda: len(order) == n)
+    assert order == ["interactive", "normal1", "normal2", "batch"]
+    pool.release()
+    assert pool.snapshot()["busy"] == 0
+
+
+def test_slot_pool_timeout_leaves_the_queue() -> None:
+    pool = SlotPool(1)
+    assert pool.acquire(PRIORITY_NORMAL)
+    assert not pool.acquire(PRIORITY_INTERACTIVE, timeout=0.01)
+    assert pool.snapshot()["queued"] == {}
+    # The timed-out waiter isn't handed the freed slot
+    pool.release()
+    assert pool.snapshot()["busy"] == 0
+    assert pool.acquire(PRIORITY_BATCH, timeout=0)
@@ -0,0 +1,75 @@
+# backend/tests/test_shot_canon.py
+from backend.agents.shot_canon import (
+    canonical_camera,
+    canonical_shot,
+    canonical_shot_type,
+    content_tokens,
+    shot_group,
+    shot_key,
+    shot_text,
+)
+
+
+def test_shot_types_map_to_vocabulary() -> None:
+    assert canonical_shot_type("Extreme Close-Up") == "extreme close-up"
+    assert canonical_shot_type("ECU") == "extreme close-up"
+    assert canonical_shot_type("close up") == "close-up"
+    assert canonical_shot_type("Establishing shot") == "wide"
+    # Unknown terms are kept, normalized
+    assert canonical_shot_type("Dutch  Angle!") == "dutch angle"
+    assert canonical_shot_type(None) == ""
+
+
+def test_camera_moves_prefer_longest_phrase() -> None:
+    assert canonical_camera("Slow zoom in") == "push in"
+    assert canonical_camera("slow pan left") == "pan left"
+    assert canonical_camera("gentle pan") == "pan"
+    assert canonical_camera("Locked-off") == "static"
+
+
+def test_content_tokens_drop_stopwords_and_fold_plurals() -> None:
+    assert content_tokens("The sneakers on a glass table") == ["sneaker", "glass", "table"]
+    assert content_tokens("class acts") == ["class", "act"]
+
+
+def test_paraphrased_shots_share_a_canonical_form() -> None:
+    a = canonical_shot(
+        {"type": "Close up", "camera": "dolly in", "context": "The sneakers on a marble counter",
+         "focus": "Laces", "caption": "50% OFF!"}
+    )
+    b = canonical_shot(
+        {"type": "closeup", "camera": "Slow push in", "context": "sneaker, marble counter",
+         "focus": "the laces", "overlay": "50% off"}
+    )
+    assert a == b == {
+        "type": "close-up",
+        "camera": "push in",
+        "context": "sneaker marble counter",
+        "focus": "lace",
+        "caption": "50 off",
+    }
+    assert shot_text(a) == "sneaker marble counter lace"
+
+
+def test_caption_differences_are_kept() -> None:
+    a = canonical_shot({"type": "cta", "caption": "Shop now"})
+    b = canonical_shot({"type": "cta", "caption": "Shop today"})
+    assert a != b
+
+
+def test_shot_key_covers_render_settings() -> None:
+    canon = canonical_shot({"type": "wide", "camera": "orbit", "context": "desert road"})
+    key = shot_key(canon, "The Trail Sneakers", 5, "16:9")
+    assert key == shot_key(canon, "trail sneaker", 5, "16:9")
+    assert key != shot_key(canon, "trail sneaker", 10, "16:9")
+    assert key != shot_key(canon, "trail sneaker", 5, "9:16")
+    assert key != shot_key(canon, "road bike", 5, "16:9")
+
+
+def test_shot_group_ignores_free_text() -> None:
+    a = canonical_shot({"type": "wide", "camera": "orbit", "context": "desert road", "focus": "sneaker"})
+    b = canonical_shot({"type": "wide", "camera": "orbit", "context": "desert highway at dusk", "focus": "shoe"})
+    c = canonical_shot({"type": "wide", "camera": "static", "context": "desert road", "focus": "sneaker"})
+    assert shot_group(a, "sneaker", 5, "16:9") == shot_group(b, "sneaker", 5, "16:9")
+    assert shot_group(a, "sneaker", 5, "16:9") != shot_group(c, "sneaker", 5, "16:9")
+    assert shot_key(a, "sneaker", 5, "16:9") != shot_key(b, "sneaker", 5, "16:9")
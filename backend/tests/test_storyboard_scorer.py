@@ -0,0 +1,139 @@
+# backend/tests/test_storyboard_scorer.py
+import json
+from typing import Any, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.agents import planner
+from backend.agents.storyboard_scorer import has_cta, score_storyboard
+from backend.api import main
+from backend.config import PLANNER_MAX_BEST_OF
+from backend.deadline import Deadline, deadline_scope, degraded_scope
+
+
+def _shot(camera: str, duration: float = 2, **fields: Any) -> Dict[str, Any]:
+    return {"camera": camera, "duration": duration, **fields}
+
+
+GOOD = {
+    "shots": [
+        _shot("orbit"),
+        _shot("push in"),
+        _shot("pan left"),
+        _shot("static", caption="Shop now"),
+    ]
+}
+
+
+def test_good_storyboard_scores_full_marks() -> None:
+    assert score_storyboard(GOOD, max_scenes=4) == 1.0
+
+
+def test_each_criterion_costs_a_quarter() -> None:
+    wrong_count = {"shots": [_shot("orbit", 4), _shot("push in", 4, caption="Buy today")]}
+    assert score_storyboard(wrong_count, max_scenes=4) == 0.875  # 2 of 4 shots: half credit
+
+    too_long = {"shots": [{**s, "duration": 5} for s in GOOD["shots"]]}
+    assert score_storyboard(too_long, max_scenes=4) == 0.75  # 20s is 100% over the 10s target
+
+    same_camera = {"shots": [{**s, "camera": "static"} for s in GOOD["shots"]]}
+    assert score_storyboard(same_camera, max_scenes=4) == pytest.approx(0.8125)
+
+    no_cta = {"shots": [{k: v for k, v in s.items() if k != "caption"} for s in GOOD["shots"]]}
+    assert score_storyboard(no_cta, max_scenes=4) == 0.75
+
+
+def test_ranking_prefers_complete_storyboards() -> None:
+    drafts = [
+        {"shots": [_shot("static", 1)]},
+        GOOD,
+        {"shots": [_shot("orbit", 3), _shot("orbit", 3), _shot("orbit", 3)]},
+    ]
+    scores = [score_storyboard(d, max_scenes=4) for d in drafts]
+    assert max(range(len(drafts)), key=lambda i: scores[i]) == 1
+    assert scores[2] > scores[0]
+
+
+@pytest.mark.parametrize("storyboard", [{}, {"shots": []}, {"shots": "none"}, {"shots": ["x"]}, []])
+def test_malformed_storyboards_score_zero(storyboard: Any) -> None:
+    assert score_storyboard(storyboard, max_scenes=4) == 0.0
+
+
+def test_has_cta() -> None:
+    assert has_cta([_shot("static", overlay="logo")])
+    assert has_cta([_shot("static", cta_position="bottom")])
+    assert has_cta([_shot("static", caption="x"), _shot("static", caption="Learn more at acme.com")])
+    assert not has_cta([_shot("static", caption="Shop now"), _shot("static", caption="Made in Italy")])
+    assert not has_cta([])
+
+
+def test_planner_keeps_best_scoring_draft(monkeypatch: pytest.MonkeyPatch) -> None:
+    drafts = [
+        "not json",
+        json.dumps({"shots": [_shot("static", 1)]}),
+        "Here you go:\n```json\n" + json.dumps(GOOD) + "\n```",
+    ]
+
+    def _fake_drafts(messages: List[Dict[str, str]], n: int) -> List[Dict[str, Any]]:
+        assert n == 3
+        stats = {"prompt_eval_count": 0, "prompt_eval_ms": 0.0, "eval_count": 0, "eval_ms": 0.0}
+        return [{"content": d, **stats} for d in drafts]
+
+    monkeypatch.setattr(planner, "_generate_drafts", _fake_drafts)
+    # Too little time left to refine, so the best draft comes back as is
+    with deadline_scope(Deadline(1.0)), degraded_scope() as degraded:
+        assert planner.plan_storyboard("sneakers", max_scenes=4, best_of=3) == GOOD
+    assert degraded == ["refine_skipped"]
+
+
+def test_planner_caps_best_of(monkeypatch: pytest.MonkeyPatch) -> None:
+    counts: List[int] = []
+
+    def _fake_drafts(messages: List[Dict[str, str]], n: int) -> List[Dict[str, Any]]:
+        counts.append(n)
+        return [{"content": ""}]  # -> mock storyboard, no critique/refine
+
+    monkeypatch.setattr(planner, "_generate_drafts", _fake_drafts)
+    monkeypatch.setattr(planner, "PLANNER_MAX_BEST_OF", 4)
+    planner.plan_storyboard("sneakers", best_of=10_000)
+    planner.plan_storyboard("sneakers", best_of=-3)
+    assert counts == [4, 1]
+
+
+def test_planner_steps_extend_one_shared_prefix(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: List[List[Dict[str, str]]] = []
+    replies = {"Reply with JSON only.": json.dumps(GOOD), "do not rewrite it yet.": "Vary the angles."}
+
+    def _fake_chat(messages: List[Dict[str, str]], temperature: float) -> Dict[str, Any]:
+        calls.append(json.loads(json.dumps(messages)))  # a copy, as sent
+        content = next((r for end, r in replies.items() if messages[-1]["content"].endswith(end)), json.dumps(GOOD))
+        return {"content": content, "prompt_eval_count": 0, "prompt_eval_ms": 0.0, "eval_count": 0, "eval_ms": 0.0}
+
+    monkeypatch.setattr(planner, "chat_with_stats", _fake_chat)
+    assert planner.plan_storyboard("sneakers", max_scenes=4, best_of=2) == GOOD
+    *drafts, critique, refine = calls
+
+    system = {"role": "system", "content": planner.PLANNER_SYSTEM_PROMPT}
+    prefix = [system, {"role": "user", "content": planner._draft_request("sneakers", 4)}]
+    assert drafts == [prefix, prefix]
+    # Each step sends the previous step's messages unchanged, then appends its turns
+    assert critique == prefix + [
+        {"role": "assistant", "content": json.dumps(GOOD)},
+        {"role": "user", "content": planner._CRITIQUE_REQUEST},
+    ]
+    assert refine == critique + [
+        {"role": "assistant", "content": "Vary the angles."},
+        {"role": "user", "content": planner._refine_request(4)},
+    ]
+
+    # The system message doesn't depend on the product, so it is shared across jobs too
+    planner.plan_storyboard("boots", max_scenes=3)
+    assert calls[-1][0] == system and "boots" not in planner.PLANNER_SYSTEM_PROMPT
+
+
+def test_api_rejects_out_of_range_best_of() -> None:
+    client = TestClient(main.app)
+    for best_of in (0, PLANNER_MAX_BEST_OF + 1):
+        response = client.post("/generate/storyboard", json={"product_description": "sneakers", "best_of": best_of})
+        assert response.status_code == 422
@@ -0,0 +1,109 @@
+# backend/tests/test_timing.py
+from typing import Any, Dict
+
+from backend.agents.timing import (
+    PACK_ANY,
+    PACK_OFF,
+    PACK_SETTING,
+    fit_durations,
+    needs_trim,
+    output_duration,
+    plan_timing,
+    render_length,
+)
+
+
+def _storyboard(*durations: float, **fields: Any) -> Dict[str, Any]:
+    return {"shots": [{"duration": d, "context": "kitchen counter", **fields} for d in durations]}
+
+
+def test_render_length_picks_shortest_covering_clip() -> None:
+    assert render_length(3, "luma") == 5
+    assert render_length(5, "luma") == 5
+    assert render_length(5.2, "luma") == 10
+    assert render_length(14, "luma") == 10  # longest available; the shot gets cut
+    assert render_length(3.456, "local") == 3.46  # exact-length providers
+
+
+def test_fit_durations_scales_into_target() -> None:
+    assert fit_durations([5, 5, 10], 6, 10) == [2.5, 2.5, 5.0]
+    assert fit_durations([1, 2], 6, 10) == [2.0, 4.0]
+    assert fit_durations([4, 4], 6, 10) == [4, 4]
+    # No shot below TIMING_MIN_SHOT_S (1s)
+    assert fit_durations([0.5, 19.5], 10, 10) == [1.0, 9.75]
+
+
+def test_each_shot_gets_the_next_clip_length_and_is_trimmed() -> None:
+    plan = plan_timing(_storyboard(3, 7), "luma", fit=False, pack=PACK_OFF)
+    assert plan == [
+        {"shots": [0], "render_s": 5, "segments": [{"shot": 0, "start": 0.0, "duration": 3.0}]},
+        {"shots": [1], "render_s": 10, "segments": [{"shot": 1, "start": 0.0, "duration": 7.0}]},
+    ]
+
+
+def test_shot_longer_than_longest_clip_is_cut() -> None:
+    plan = plan_timing(_storyboard(12), "luma", fit=False, pack=PACK_OFF)
+    assert plan == [{"shots": [0], "render_s": 10, "segments": [{"shot": 0, "start": 0.0, "duration": 10.0}]}]
+
+
+def test_short_shots_share_one_clip() -> None:
+    plan = plan_timing(_storyboard(2, 2, 2), "luma", fit=False, pack=PACK_ANY)
+    # Two 2s shots fit one 5s clip; adding the third would need a 10s clip instead of two 5s ones
+    assert plan == [
+        {
+            "shots": [0, 1],
+            "render_s": 5,
+            "segments": [{"shot": 0, "start": 0.0, "duration": 2.0}, {"shot": 1, "start": 2.0, "duration": 2.0}],
+        },
+        {"shots": [2], "render_s": 5, "segments": [{"shot": 2, "start": 0.0, "duration": 2.0}]},
+    ]
+
+
+def test_packing_needs_same_setting_and_no_caption() -> None:
+    same = {"shots": [{"duration": 2, "context": "Kitchen counters"}, {"duration": 2, "context": "kitchen counter."}]}
+    assert [p["shots"] for p in plan_timing(same, "luma", fit=False, pack=PACK_SETTING)] == [[0, 1]]
+
+    moved = {"shots": [{"duration": 2, "context": "kitchen"}, {"duration": 2, "context": "beach"}]}
+    assert [p["shots"] for p in plan_timing(moved, "luma", fit=False, pack=PACK_SETTING)] == [[0], [1]]
+    assert [p["shots"] for p in plan_timing(moved, "luma", fit=False, pack=PACK_ANY)] == [[0, 1]]
+
+    captioned = _storyboard(2, 2, caption="50% off")
+    assert [p["shots"] for p in plan_timing(captioned, "luma", fit=False, pack=PACK_ANY)] == [[0], [1]]
+
+
+def test_exact_length_providers_never_pack() -> None:
+    plan = plan_timing(_storyboard(2, 2), "local", fit=False, pack=PACK_ANY)
+    assert [(p["shots"], p["render_s"]) for p in plan] == [([0], 2), ([1], 2)]
+
+
+def test_target_duration_wins_over_fit() -> None:
+    storyboard = {**_storyboard(5, 5), "target_duration": 6}
+    plan = plan_timing(storyboard, "local", fit=False)
+    assert [p["render_s"] for p in plan] == [3, 3]
+
+
+def test_bad_durations_fall_back_to_default() -> None:
+    storyboard = {"shots": [{"duration": "soon"}, {"duration": -1}, {}]}
+    plan = plan_timing(storyboard, "local", default_duration=4, fit=False, pack=PACK_OFF)
+    assert [p["render_s"] for p in plan] == [4, 4, 4]
+
+
+def test_output_duration_and_needs_trim() -> None:
+    whole = {"duration": 5, "segments": [{"shot": 0, "start": 0.0, "duration": 5.0}]}
+    assert output_duration(whole) == 5.0
+    assert not needs_trim(whole, 5.02)
+    assert needs_trim(whole, 5.5)
+
+    head = {"duration": 5, "segments": [{"shot": 0, "start": 0.0, "duration": 3.0}]}
+    assert output_duration(head) == 3.0
+    assert needs_trim(head, None)
+
+    packed = {
+        "duration": 5,
+        "segments": [{"shot": 0, "start": 0.0, "duration": 2.0}, {"shot": 1, "start": 2.0, "duration": 2.0}],
+    }
+    assert output_duration(packed) == 4.0
+    assert needs_trim(packed, 5.0)
+
+    assert output_duration({"duration": 7}) == 7.0
+    assert not needs_trim({"duration": 7}, 9.0)
@@ -0,0 +1,271 @@
+# backend/tests/test_work_queue.py
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from backend.work_queue import (
+    JOB_DONE,
+    JOB_ERROR,
+    JOB_RUNNING,
+    TASK_BLOCKED,
+    TASK_CANCELLED,
+    TASK_DONE,
+    TASK_FAILED,
+    TASK_QUEUED,
+    SqliteQueue,
+)
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> SqliteQueue:
+    return SqliteQueue(tmp_path / "queue.db")
+
+
+def _status(queue: SqliteQueue, task_id: str) -> str:
+    return queue._db().execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()[0]
+
+
+def test_complete_unblocks_dependents(queue: SqliteQueue) -> None:
+    queue.create_job(
+        "j1",
+        "video",
+        {"product_description": "x"},
+        [
+            {"task_id": "a", "kind": "render"},
+            {"task_id": "b", "kind": "render"},
+            {"task_id": "c", "kind": "concat", "deps": ["a", "b"]},
+        ],
+    )
+    assert _status(queue, "c") == TASK_BLOCKED
+
+    first = queue.claim("w1")
+    second = queue.claim("w1")
+    assert [first["task_id"], second["task_id"]] == ["a", "b"]
+    assert first["request"] == {"product_description": "x"}
+    assert queue.get_job("j1")["status"] == JOB_RUNNING
+    assert queue.claim("w1") is None  # c still waits for b
+
+    assert queue.complete(task_id="a", worker="w1", result={"clip": "a"})
+    assert _status(queue, "c") == TASK_BLOCKED
+    assert queue.complete(task_id="b", worker="w1", result={"clip": "b"})
+    assert _status(queue, "c") == TASK_QUEUED
+
+    concat = queue.claim("w1")
+    assert concat["task_id"] == "c"
+    assert queue.complete(task_id="c", worker="w1", job_result={"video": "final.mp4"})
+    job = queue.get_job("j1")
+    assert job["status"] == JOB_DONE
+    assert job["result"] == {"video": "final.mp4"}
+    assert job["tasks"] == {"render": {TASK_DONE: 2}, "concat": {TASK_DONE: 1}}
+
+
+def test_complete_enqueues_follow_up_tasks(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "plan", "kind": "plan"}])
+    queue.claim("w1")
+    queue.complete(
+        task_id="plan",
+        worker="w1",
+        then=[
+            {"task_id": "r0", "kind": "render"},
+            {"task_id": "r1", "kind": "render", "deps": ["r0"]},
+            # Dependencies that are already done don't block
+            {"task_id": "after_plan", "kind": "render", "deps": ["plan"]},
+        ],
+    )
+    assert _status(queue, "r0") == TASK_QUEUED
+    assert _status(queue, "r1") == TASK_BLOCKED
+    assert _status(queue, "after_plan") == TASK_QUEUED
+
+
+def test_claim_filters_by_kind(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "p", "kind": "plan"}, {"task_id": "r", "kind": "render"}])
+    assert queue.claim("w1", kinds=["render"])["task_id"] == "r"
+    assert queue.claim("w1", kinds=["concat"]) is None
+
+
+def test_expired_lease_is_reclaimed(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "a", "kind": "render"}])
+    task = queue.claim("w1", lease_s=0.05)
+    assert task["attempts"] == 1
+    assert queue.claim("w2") is None  # still leased
+
+    time.sleep(0.1)
+    again = queue.claim("w2")
+    assert again["task_id"] == "a"
+    assert again["attempts"] == 2
+    assert again["lease_owner"] == "w2"
+
+
+def test_heartbeat_after_lost_lease(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "a", "kind": "render"}])
+    queue.claim("w1", lease_s=0.05)
+    assert queue.heartbeat(task_id="a", worker="w1", lease_s=0.05)
+
+    time.sleep(0.1)
+    queue.claim("w2")
+    assert not queue.heartbeat(task_id="a", worker="w1")
+    # The old worker's result is dropped; the new owner's counts
+    assert not queue.complete(task_id="a", worker="w1", job_result={"from": "w1"})
+    assert queue.complete(task_id="a", worker="w2", job_result={"from": "w2"})
+    assert queue.get_job("j1")["result"] == {"from": "w2"}
+
+
+def test_lease_expiring_on_last_attempt_fails_job(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "a", "kind": "render", "max_attempts": 1}])
+    queue.claim("w1", lease_s=0.05)
+    time.sleep(0.1)
+    assert queue.claim("w2") is None
+    assert _status(queue, "a") == TASK_FAILED
+    assert queue.get_job("j1")["status"] == JOB_ERROR
+
+
+def test_fail_retries_then_cancels_siblings(queue: SqliteQueue) -> None:
+    queue.create_job(
+        "j1",
+        "video",
+        {},
+        [
+            {"task_id": "a", "kind": "render", "max_attempts": 2},
+            {"task_id": "b", "kind": "render"},
+            {"task_id": "c", "kind": "concat", "deps": ["a", "b"]},
+        ],
+    )
+    assert queue.claim("w1")["task_id"] == "a"
+    assert queue.claim("w1")["task_id"] == "b"
+    assert queue.fail(task_id="a", worker="w1", error="boom")
+    assert _status(queue, "a") == TASK_QUEUED
+    assert queue.get_job("j1")["status"] == JOB_RUNNING
+
+    retry = queue.claim("w2")
+    assert (retry["task_id"], retry["attempts"]) == ("a", 2)
+    assert queue.fail(task_id="a", worker="w2", error="boom again")
+
+    job = queue.get_job("j1")
+    assert job["status"] == JOB_ERROR
+    assert job["error"] == "boom again"
+    assert _status(queue, "a") == TASK_FAILED
+    assert _status(queue, "c") == TASK_CANCELLED
+    # b was running when the job failed: its result doesn't revive the job
+    assert not queue.complete(task_id="b", worker="w1", job_result={"video": "x"})
+    assert _status(queue, "b") == TASK_CANCELLED
+    assert queue.get_job("j1")["status"] == JOB_ERROR
+
+
+def test_fail_without_retry(queue: SqliteQueue) -> None:
+    queue.create_job("j1", "video", {}, [{"task_id": "a", "kind": "render"}])
+    queue.claim("w1")
+    queue.fail(task_id="a", worker="w1", error="deadline", retry=False)
+    assert queue.get_job("j1")["status"] == JOB_ERROR
+
+
+def test_purge_drops_finished_jobs(queue: SqliteQueue) -> None:
+    queue.create_job("done", "video", {}, [{"task_id": "a", "kind": "render"}])
+    queue.create_job("open", "video", {}, [{"task_id": "b", "kind": "render"}])
+    queue.claim("w1", kinds=["render"])
+    queue.complete(task_id="a", worker="w1", job_result={})
+
+    assert queue.purge(older_than_s=3600) == 0
+    assert queue.purge(older_than_s=0) == 1
+    assert queue.get_job("done") is None
+    assert queue.get_job("open") is not None
+
+
+# ---- two worker processes ------------------------------------------------
+
+RENDERS = 8
+
+
+def _plan(task: Dict[str, Any]) -> Any:
+    job_id = task["job_id"]
+    renders = [{"task_id": f"{job_id}:render:{i}", "kind": "render", "payload": {"i": i}} for i in range(RENDERS)]
+    concat = {"task_id": f"{job_id}:concat", "kind": "concat", "deps": [r["task_id"] for r in renders]}
+    return {"renders": RENDERS}, [*renders, concat], None
+
+
+def _render(task: Dict[str, Any]) -> Any:
+    from backend.storage.object_store import get_object_store
+
+    time.sleep(0.1)
+    i = task["payload"]["i"]
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write(f"clip {i}\n")
+    get_object_store().put_file(f"jobs/{task['job_id']}/clips/{i}.txt", Path(f.name))
+    os.unlink(f.name)
+    return {"pid": os.getpid()}, None, None
+
+
+def _concat(task: Dict[str, Any]) -> Any:
+    from backend.storage.object_store import get_object_store
+
+    parts = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(RENDERS):
+            dst = Path(tmp) / f"{i}.txt"
+            get_object_store().get_file(f"jobs/{task['job_id']}/clips/{i}.txt", dst)
+            parts.append(dst.read_text())
+    return None, None, {"video": "".join(parts)}
+
+
+def _worker_process(job_id: str, ready: Any) -> None:
+    from backend.pipelines import distributed
+    from backend.work_queue import get_work_queue
+
+    distributed.HANDLERS.update(plan=_plan, render=_render, concat=_concat)
+    queue = get_work_queue()
+    stop = threading.Event()
+
+    def _watch() -> None:
+        while not stop.wait(0.05):
+            job = queue.get_job(job_id)
+            if job is not None and job["status"] in (JOB_DONE, JOB_ERROR):
+                stop.set()
+
+    threading.Thread(target=_watch, daemon=True).start()
+    ready.set()
+    distributed.run_worker(concurrency=2, stop=stop)
+
+
+def test_two_worker_processes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    db = tmp_path / "queue.db"
+    objects = tmp_path / "objects"
+    # Read at import by the spawned workers
+    monkeypatch.setenv("MEDIA_ROOT", str(tmp_path / "media"))
+    monkeypatch.setenv("QUEUE_URL", f"sqlite:///{db}")
+    monkeypatch.setenv("OBJECT_STORE", "local")
+    monkeypatch.setenv("OBJECT_STORE_ROOT", str(objects))
+    monkeypatch.setenv("WORKER_POLL_S", "0.05")
+
+    ctx = multiprocessing.get_context("spawn")
+    job_id = "e2e"
+    readies = [ctx.Event() for _ in range(2)]
+    procs = [ctx.Process(target=_worker_process, args=(job_id, r)) for r in readies]
+    for p in procs:
+        p.start()
+    try:
+        for r in readies:
+            assert r.wait(60)
+        queue = SqliteQueue(db)
+        queue.create_job(job_id, "video", {}, [{"task_id": f"{job_id}:plan", "kind": "plan"}])
+        for p in procs:
+            p.join(60)
+            assert p.exitcode == 0
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.kill()
+
+    job = queue.get_job(job_id)
+    assert job["status"] == JOB_DONE
+    assert job["result"] == {"video": "".join(f"clip {i}\n" for i in range(RENDERS))}
+    assert job["tasks"] == {"plan": {TASK_DONE: 1}, "render": {TASK_DONE: RENDERS}, "concat": {TASK_DONE: 1}}
+    pids = {
+        r[0] for r in queue._db().execute("SELECT result FROM tasks WHERE job_id = ? AND kind = 'render'", (job_id,))
+    }
+    assert len(pids) == 2  # both processes took renders
+    assert len(list((objects / "jobs" / job_id / "clips").iterdir())) == RENDERS
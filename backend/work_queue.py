@@ -0,0 +1,421 @@
+# backend/work_queue.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend.config import process_singleton
+
+logger = logging.getLogger(__name__)
+
+# Shared task queue for distributed mode. Default: a SQLite file under
+# MEDIA_ROOT, which every process on the box (API nodes and workers) opens.
+# Workers on other hosts point QUEUE_URL at an API node: http://api-host:8000.
+QUEUE_URL = os.getenv("QUEUE_URL", "") or "sqlite:///" + os.path.join(os.getenv("MEDIA_ROOT", "media"), "queue.db")
+# Shared secret for the /queue RPC endpoints; empty = the endpoints are off.
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN", "")
+# A claimed task belongs to its worker for this long; heartbeats extend it.
+QUEUE_LEASE_S = float(os.getenv("QUEUE_LEASE_S", "60"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+# Finished jobs and their tasks are deleted after this long.
+QUEUE_RETENTION_S = float(os.getenv("QUEUE_RETENTION_S", str(7 * 86400)))
+# How often each worker process purges them (0 = never).
+QUEUE_PURGE_INTERVAL_S = float(os.getenv("QUEUE_PURGE_INTERVAL_S", "3600"))
+
+TASK_BLOCKED = "blocked"      # waiting for the tasks it depends on
+TASK_QUEUED = "queued"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+TASK_CANCELLED = "cancelled"  # another task of the job failed
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    tenant TEXT NOT NULL,
+    deadline_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, priority, seq);
+CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id);
+CREATE TABLE IF NOT EXISTS task_deps (
+    dep_id TEXT NOT NULL,
+    task_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS task_deps_dep ON task_deps (dep_id);
+"""
+
+
+def _loads(value: Optional[str]) -> Any:
+    return json.loads(value) if value else None
+
+
+class SqliteQueue:
+    """
+    Jobs and their tasks in one SQLite database (WAL mode), safe to share
+    between processes on one host. A task runs once every task it depends
+    on is done; workers claim the highest-priority ready task with a lease
+    and keep it alive with heartbeats. A task whose lease runs out (worker
+    crashed or hung) is handed to the next claimer, up to max_attempts; when
+    a task fails for good its job fails and the job's other tasks are cancelled.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._db().executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so claim's select-then-update is atomic across processes
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # ---- jobs ----
+
+    def create_job(
+        self,
+        job_id: str,
+        kind: str,
+        request: Dict[str, Any],
+        tasks: List[Dict[str, Any]],
+        priority: int = 0,
+        tenant: str = "default",
+        deadline_at: Optional[float] = None,
+    ) -> str:
+        """
+        Create a job and its first tasks. Each task is {"kind", "payload",
+        optional "task_id", "deps": [task ids it waits for], "priority"}.
+        """
+        now = time.time()
+        with self._tx() as db:
+            db.execute(
+                "INSERT INTO jobs (job_id, kind, status, request, priority, tenant, deadline_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, json.dumps(request), priority, tenant, deadline_at, now),
+            )
+            self._insert_tasks(db, job_id, tasks, priority, now)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record with its task counts by kind and status."""
+        db = self._db()
+        row = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("request", "result"):
+            job[key] = _loads(job[key])
+        counts: Dict[str, Dict[str, int]] = {}
+        for r in db.execute(
+            "SELECT kind, status, COUNT(*) AS n FROM tasks WHERE job_id = ? GROUP BY kind, status", (job_id,)
+        ):
+            counts.setdefault(r["kind"], {})[r["status"]] = r["n"]
+        job["tasks"] = counts
+        return job
+
+    # ---- tasks ----
+
+    def _insert_tasks(self, db: sqlite3.Connection, job_id: str, tasks: List[Dict[str, Any]], priority: int, now: float) -> None:
+        for task in tasks:
+            task_id = task.get("task_id") or uuid.uuid4().hex
+            pending = []
+            for dep in task.get("deps") or []:
+                # Dependencies that already finished don't block
+                row = db.execute("SELECT status FROM tasks WHERE task_id = ?", (dep,)).fetchone()
+                if row is None:
+                    raise ValueError(f"Task {task_id} depends on unknown task {dep}")
+                if row["status"] != TASK_DONE:
+                    pending.append(dep)
+            seq = db.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM tasks").fetchone()[0]
+            db.execute(
+                "INSERT INTO tasks (task_id, job_id, kind, payload, status, blocked, priority, seq, max_attempts,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task_id,
+                    job_id,
+                    task["kind"],
+                    json.dumps(task.get("payload") or {}),
+                    TASK_BLOCKED if pending else TASK_QUEUED,
+                    len(pending),
+                    task.get("priority", priority),
+                    seq,
+                    task.get("max_attempts", QUEUE_MAX_ATTEMPTS),
+                    now,
+                    now,
+                ),
+            )
+            db.executemany(
+                "INSERT INTO task_deps (dep_id, task_id) VALUES (?, ?)",
+                [(d, task_id) for d in pending],
+            )
+
+    def _expire_leases(self, db: sqlite3.Connection, now: float) -> None:
+        for row in db.execute(
+            "SELECT task_id, job_id, attempts, max_attempts, lease_owner FROM tasks WHERE status = ? AND lease_expires < ?",
+            (TASK_LEASED, now),
+        ).fetchall():
+            logger.warning(f"Lease on task {row['task_id']} held by {row['lease_owner']} expired")
+            if row["attempts"] >= row["max_attempts"]:
+                self._fail_job(db, row["task_id"], row["job_id"], "lease expired on every attempt", now)
+            else:
+                db.execute(
+                    "UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE task_id = ?",
+                    (TASK_QUEUED, now, row["task_id"]),
+                )
+
+    def claim(self, worker: str, kinds: Optional[List[str]] = None, lease_s: float = QUEUE_LEASE_S) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next ready task (lowest priority value, then oldest) of one
+        of `kinds`, or None. The returned task includes its job's request,
+        tenant and deadline.
+        """
+        now = time.time()
+        kinds_sql = f" AND t.kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        with self._tx() as db:
+            self._expire_leases(db, now)
+            row = db.execute(
+                "SELECT t.task_id FROM tasks t WHERE t.status = ?" + kinds_sql + " ORDER BY t.priority, t.seq LIMIT 1",
+                (TASK_QUEUED, *(kinds or [])),
+            ).fetchone()
+            if row is None:
+                return None
+            task_id = row["task_id"]
+            db.execute(
+                "UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE task_id = ?",
+                (TASK_LEASED, worker, now + lease_s, now, task_id),
+            )
+            task = dict(db.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone())
+            job = db.execute(
+                "SELECT kind, request, tenant, deadline_at, status FROM jobs WHERE job_id = ?", (task["job_id"],)
+            ).fetchone()
+            if job["status"] == JOB_QUEUED:
+                db.execute(
+                    "UPDATE jobs SET status = ?, started_at = ? WHERE job_id = ?", (JOB_RUNNING, now, task["job_id"])
+                )
+        task["payload"] = _loads(task["payload"])
+        task.update(
+            job_kind=job["kind"], request=_loads(job["request"]), tenant=job["tenant"], deadline_at=job["deadline_at"]
+        )
+        return task
+
+    def _owned(self, db: sqlite3.Connection, task_id: str, worker: str) -> bool:
+        row = db.execute("SELECT status, lease_owner FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None and row["status"] == TASK_LEASED and row["lease_owner"] == worker
+
+    def heartbeat(self, task_id: str, worker: str, lease_s: float = QUEUE_LEASE_S) -> bool:
+        """Extend the lease; False if the worker no longer holds it (expired and re-claimed)."""
+        with self._tx() as db:
+            if not self._owned(db, task_id, worker):
+                return False
+            db.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE task_id = ?",
+                (time.time() + lease_s, time.time(), task_id),
+            )
+            return True
+
+    def complete(
+        self,
+        task_id: str,
+        worker: str,
+        result: Any = None,
+        then: Optional[List[Dict[str, Any]]] = None,
+        job_result: Any = None,
+    ) -> bool:
+        """
+        Mark a leased task done, unblock tasks waiting on it, enqueue `then`
+        (follow-up tasks of the same job), and with `job_result` finish the
+        job. All in one transaction; False (and no effect) if the lease was
+        lost. False too if the job failed meanwhile: the task is just marked
+        cancelled like its siblings, and the job stays failed.
+        """
+        now = time.time()
+        with self._tx() as db:
+            if not self._owned(db, task_id, worker):
+                return False
+            job_id, priority, job_status = db.execute(
+                "SELECT t.job_id, t.priority, j.status FROM tasks t JOIN jobs j ON j.job_id = t.job_id"
+                " WHERE t.task_id = ?",
+                (task_id,),
+            ).fetchone()
+            if job_status == JOB_ERROR:
+                db.execute(
+                    "UPDATE tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                    " WHERE task_id = ?",
+                    (TASK_CANCELLED, now, task_id),
+                )
+                return False
+            db.execute(
+                "UPDATE tasks SET status = ?, result = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE task_id = ?",
+                (TASK_DONE, json.dumps(result), now, task_id),
+            )
+            db.execute(
+                "UPDATE tasks SET blocked = blocked - 1, updated_at = ?"
+                " WHERE task_id IN (SELECT task_id FROM task_deps WHERE dep_id = ?)",
+                (now, task_id),
+            )
+            db.execute(
+                "UPDATE tasks SET status = ? WHERE status = ? AND blocked <= 0 AND job_id = ?",
+                (TASK_QUEUED, TASK_BLOCKED, job_id),
+            )
+            if then:
+                self._insert_tasks(db, job_id, then, priority, now)
+            if job_result is not None:
+                db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE job_id = ?",
+                    (JOB_DONE, json.dumps(job_result), now, job_id),
+                )
+            return True
+
+    def fail(self, task_id: str, worker: str, error: str, retry: bool = True) -> bool:
+        """Give up a leased task: back to the queue if `retry` and attempts remain, else fail its job."""
+        now = time.time()
+        with self._tx() as db:
+            if not self._owned(db, task_id, worker):
+                return False
+            row = db.execute("SELECT job_id, attempts, max_attempts FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if retry and row["attempts"] < row["max_attempts"]:
+                db.execute(
+                    "UPDATE tasks SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                    " WHERE task_id = ?",
+                    (TASK_QUEUED, error, now, task_id),
+                )
+            else:
+                self._fail_job(db, task_id, row["job_id"], error, now)
+            return True
+
+    def _fail_job(self, db: sqlite3.Connection, task_id: str, job_id: str, error: str, now: float) -> None:
+        db.execute(
+            "UPDATE tasks SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE task_id = ?",
+            (TASK_FAILED, error, now, task_id),
+        )
+        db.execute(
+            "UPDATE tasks SET status = ?, updated_at = ? WHERE job_id = ? AND status IN (?, ?)",
+            (TASK_CANCELLED, now, job_id, TASK_QUEUED, TASK_BLOCKED),
+        )
+        db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+            (JOB_ERROR, error, now, job_id),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Task counts by kind and status, and jobs by status."""
+        db = self._db()
+        tasks: Dict[str, Dict[str, int]] = {}
+        for r in db.execute("SELECT kind, status, COUNT(*) AS n FROM tasks GROUP BY kind, status"):
+            tasks.setdefault(r["kind"], {})[r["status"]] = r["n"]
+        jobs = {r["status"]: r["n"] for r in db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        workers = [
+            r["lease_owner"] for r in db.execute(
+                "SELECT DISTINCT lease_owner FROM tasks WHERE status = ? AND lease_expires >= ?", (TASK_LEASED, time.time())
+            )
+        ]
+        return {"jobs": jobs, "tasks": tasks, "active_workers": sorted(workers)}
+
+    def purge(self, older_than_s: float = QUEUE_RETENTION_S) -> int:
+        """Delete finished jobs (and their tasks) older than `older_than_s`."""
+        cutoff = time.time() - older_than_s
+        with self._tx() as db:
+            ids = [r[0] for r in db.execute("SELECT job_id FROM jobs WHERE finished_at < ?", (cutoff,))]
+            for job_id in ids:
+                db.execute(
+                    "DELETE FROM task_deps WHERE task_id IN (SELECT task_id FROM tasks WHERE job_id = ?)", (job_id,)
+                )
+                db.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return len(ids)
+
+
+# Methods a remote worker may call through an API node's /queue endpoints
+RPC_METHODS = ("create_job", "get_job", "claim", "heartbeat", "complete", "fail", "stats", "purge")
+
+
+class HttpQueue:
+    """SqliteQueue's interface over HTTP, for workers on hosts that can't open the queue file."""
+
+    def __init__(self, base_url: str, token: str = QUEUE_TOKEN):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self._local = threading.local()
+
+    def _call(self, method: str, **kwargs: Any) -> Any:
+        import requests
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        headers = {"X-Queue-Token": self.token} if self.token else {}
+        resp = session.post(f"{self.base_url}/queue/{method}", json=kwargs, headers=headers, timeout=30)
+        resp.raise_for_status()
+        return resp.json()["result"]
+
+    def __getattr__(self, method: str) -> Any:
+        if method not in RPC_METHODS:
+            raise AttributeError(method)
+        return lambda **kwargs: self._call(method, **kwargs)
+
+
+@process_singleton
+def get_work_queue() -> Any:
+    """The queue QUEUE_URL points at: sqlite:///path or http(s)://api-node."""
+    if QUEUE_URL.startswith("sqlite:///"):
+        return SqliteQueue(Path(QUEUE_URL[len("sqlite:///"):]))
+    if QUEUE_URL.startswith(("http://", "https://")):
+        return HttpQueue(QUEUE_URL)
+    raise ValueError(f"Unsupported QUEUE_URL: {QUEUE_URL!r}")
@@ -2,6 +2,7 @@ import streamlit as st
 import sys
 import os
 import json
+import hashlib
 import logging
 from pathlib import Path
 
@@ -20,21 +21,105 @@ project_root = str(Path(__file__).parent.parent.resolve())
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-# Import backend modules
-try:
-    from backend.agents.planner import plan_storyboard
-    from backend.pipelines.video_pipeline import generate_video_from_storyboard
-except ImportError as e:
-    st.error(f"Failed to import backend modules: {e}")
-    st.stop()
-
 st.set_page_config(
     page_title="Velocity2 - Agentic Video Ads",
     page_icon="🎬",
     layout="wide"
 )
 
+
+@st.cache_resource
+def load_backend():
+    """
+    Import backend modules and run the startup phase once per server process,
+    not on every Streamlit rerun.
+    """
+    from backend.config import startup
+    from backend.agents.planner import plan_storyboard
+    from backend.pipelines.video_pipeline import generate_video_from_storyboard
+
+    startup()
+    return plan_storyboard, generate_video_from_storyboard
+
+
+@st.cache_resource
+def get_runner():
+    """One background job runner shared by every session on this server."""
+    from backend.config import get_settings
+    from backend.job_runner import JobRunner
+
+    return JobRunner(get_settings().media_root / "ui_jobs")
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def job_result(job_id):
+    """Result of a finished job. Only call once the job is done: results never change after that."""
+    return get_runner().get(job_id).result
+
+
+def plan_job(plan_storyboard, product_description, max_scenes):
+    return {
+        "product_description": product_description,
+        "storyboard": plan_storyboard(product_description, max_scenes=max_scenes),
+    }
+
+
+def request_key(kind, *parts):
+    return hashlib.sha256(json.dumps([kind, *parts]).encode("utf-8")).hexdigest()
+
+
+def restore_jobs():
+    """Job ids live in the URL, so a reload or a new session picks the same jobs back up."""
+    for name in ("storyboard_job", "video_job"):
+        if name not in st.session_state and name in st.query_params:
+            st.session_state[name] = st.query_params[name]
+
+
+def track_job(name, job_id):
+    st.session_state[name] = job_id
+    st.query_params[name] = job_id
+
+
+def finished_job(name):
+    """The session's job `name` if it finished successfully, else None (showing progress or the error)."""
+    job_id = st.session_state.get(name)
+    if not job_id:
+        return None
+    record = get_runner().get(job_id)
+    if record is None:
+        st.session_state.pop(name, None)
+        st.query_params.pop(name, None)
+        return None
+    if not record.finished:
+        job_progress(name, job_id)
+        return None
+    if record.status == "error":
+        st.error(f"{record.kind.capitalize()} job failed: {record.error}")
+        return None
+    return record
+
+
+@st.fragment(run_every=2)
+def job_progress(name, job_id):
+    """Polls a running job without rerunning (or blocking) the rest of the page."""
+    record = get_runner().get(job_id)
+    if record is None or record.finished:
+        # Redraw the whole page with the result
+        st.rerun()
+    label = "🤖 Planning storyboard" if record.kind == "storyboard" else "🎥 Rendering video"
+    st.info(f"{label}… {record.status} for {record.elapsed_s():.0f}s. You can keep working or reload; the job keeps running.")
+
+
 def main():
+    try:
+        plan_storyboard, generate_video_from_storyboard = load_backend()
+    except ImportError as e:
+        st.error(f"Failed to import backend modules: {e}")
+        st.stop()
+
+    runner = get_runner()
+    restore_jobs()
+
     st.title("🎬 Velocity2: Agentic Video Ads")
     st.markdown("""
     Generate cinematic video ads from a simple product description using AI agents.
@@ -61,24 +146,31 @@ def main():
             if not product_description:
                 st.warning("Please enter a product description first.")
             else:
-                with st.spinner("🤖 Scene Agent is planning the storyboard..."):
-                    try:
-                        storyboard = plan_storyboard(product_description, max_scenes=max_scenes)
-                        st.session_state['storyboard'] = storyboard
-                        st.session_state['product_description'] = product_description
-                        st.success("Storyboard generated!")
-                    except Exception as e:
-                        st.error(f"Error generating storyboard: {e}")
+                # Identical requests from any session share one job (and its result)
+                job_id = runner.submit(
+                    "storyboard",
+                    plan_job,
+                    plan_storyboard,
+                    product_description,
+                    max_scenes,
+                    key=request_key("storyboard", product_description, max_scenes),
+                )
+                track_job("storyboard_job", job_id)
+                st.session_state.pop("video_job", None)
+                st.query_params.pop("video_job", None)
+
+    storyboard_job = finished_job("storyboard_job")
 
     # 2. Results Area (Below)
-    if 'storyboard' in st.session_state:
+    if storyboard_job is not None:
+        planned = job_result(storyboard_job.job_id)
+        storyboard = planned["storyboard"]
+        shots = storyboard.get("shots", [])
+
         st.divider()
         st.subheader("2. Review & Generate Video")
         
         col_preview, col_json = st.columns([3, 2])
-        
-        storyboard = st.session_state['storyboard']
-        shots = storyboard.get("shots", [])
 
         # Left Column: Visual Preview (Scrollable)
         with col_preview:
@@ -95,28 +187,27 @@ def main():
             
             # Generate Video Action
             if st.button("Generate Video", type="primary", use_container_width=True):
-                with st.spinner("🎥 Compiling scenes and rendering video..."):
-                    try:
-                        result = generate_video_from_storyboard(
-                            storyboard, 
-                            st.session_state['product_description']
-                        )
-                        st.session_state['video_result'] = result
-                        st.success("Video generated successfully!")
-                    except Exception as e:
-                        st.error(f"Error generating video: {e}")
+                job_id = runner.submit(
+                    "video",
+                    generate_video_from_storyboard,
+                    storyboard,
+                    planned["product_description"],
+                    key=request_key("video", storyboard_job.job_id),
+                )
+                track_job("video_job", job_id)
 
         # Right Column: JSON & Final Video
         with col_json:
             with st.expander("Raw Storyboard JSON", expanded=False):
                 st.json(storyboard)
-            
-            if 'video_result' in st.session_state:
-                result = st.session_state['video_result']
+
+            video_job = finished_job("video_job")
+            if video_job is not None:
+                result = job_result(video_job.job_id)
                 video_path = result.get('final_video_path')
                 
                 if video_path and os.path.exists(video_path):
-                    st.success("Final Video")
+                    st.success(f"Final Video (rendered in {video_job.elapsed_s():.0f}s)")
                     st.video(video_path)
                     st.markdown(f"**Job ID:** `{result.get('job_id')}`")
                 else: